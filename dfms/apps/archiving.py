@@ -60,7 +60,8 @@ class NgasArchivingApp(ExternalStoreApp):
 
     The archiving to NGAS occurs through the framework and not by spawning a
     new NGAS client process. This way we can read the different storage types
-    supported by the framework, and not only filesystem objects.
+    supported by the framework, and not only filesystem objects. Successive
+    archivings to the same server reuse the same keep-alive connections.
     '''
 
     def initialize(self, **kwargs):
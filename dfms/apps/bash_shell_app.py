@@ -42,14 +42,15 @@ import six
 
 from dfms import droputils, utils
 from dfms.ddap_protocol import AppDROPStates, DROPStates
-from dfms.drop import BarrierAppDROP, FileDROP, DirectoryContainer, AppDROP
+from dfms.drop import BarrierAppDROP, FileDROP, DirectoryContainer, AppDROP, \
+    SharedMemoryDROP
 from dfms.exceptions import InvalidDropException
 
 
 logger = logging.getLogger(__name__)
 
 def isFSBased(x):
-    return isinstance(x, (FileDROP, DirectoryContainer))
+    return isinstance(x, (FileDROP, DirectoryContainer, SharedMemoryDROP))
 
 def mesage_stdouts(prefix, stdout, stderr):
     msg = prefix
@@ -234,6 +235,8 @@ class StreamingInputBashAppBase(BashShellBase, AppDROP):
         self.notify_if_finished()
 
     def dataWritten(self, uid, data):
+        # data is only valid during this call, but we use it in another thread
+        data = bytes(data)
         threading.Thread(target=self.execute, args=(data,)).start()
 
     def execute(self, data):
@@ -24,6 +24,7 @@ Module containing an example application that calculates a CRC value
 """
 
 from dfms.drop import BarrierAppDROP
+from dfms.droputils import openWithBuffer
 
 
 try:
@@ -49,12 +50,15 @@ class CRCApp(BarrierAppDROP):
         outputDrop = self.outputs[0]
 
         bufsize = 4 * 1024 ** 2
-        desc = inputDrop.open()
-        buf = inputDrop.read(desc, bufsize)
-        crc = 0
-        while buf:
-            crc = crc32(buf, crc)
+        desc, buf = openWithBuffer(inputDrop)
+        if buf is not None:
+            crc = crc32(buf, 0)
+        else:
             buf = inputDrop.read(desc, bufsize)
+            crc = 0
+            while buf:
+                crc = crc32(buf, crc)
+                buf = inputDrop.read(desc, bufsize)
         inputDrop.close(desc)
 
         # Rely on whatever implementation we decide to use
@@ -36,7 +36,7 @@ from docker.client import AutoVersionClient
 
 from dfms import utils, droputils
 from dfms.drop import BarrierAppDROP, FileDROP, \
-    DirectoryContainer
+    DirectoryContainer, SharedMemoryDROP
 from dfms.exceptions import InvalidDropException
 
 
@@ -107,8 +107,8 @@ class DockerApp(BarrierAppDROP):
     UID of the input/output being referenced.
 
     Data volumes are a file-specific feature. For this reason, volumes are setup
-    for file-system based input/output DROPs only, namely the FileDROP and the
-    DirectoryContainer types. Other DROP types can instead pass down their
+    for file-system based input/output DROPs only, namely the FileDROP, the
+    DirectoryContainer and the SharedMemoryDROP types. Other DROP types can instead pass down their
     dataURL property via the command-line by using placeholders. Placeholders
     for input DROP dataURLs take the form of "%iDataURLX", where X starts from 0
     and refers to the X-th non-filesystem related input. Likewise, output
@@ -278,7 +278,7 @@ class DockerApp(BarrierAppDROP):
         # In the case of fs-based i/o we replace the command-line with the path
         # that the Drop will receive *inside* the docker container (see below)
         def isFSBased(x):
-            return isinstance(x, (FileDROP, DirectoryContainer))
+            return isinstance(x, (FileDROP, DirectoryContainer, SharedMemoryDROP))
 
         iitems = self._inputs.items()
         oitems = self._outputs.items()
@@ -295,7 +295,8 @@ class DockerApp(BarrierAppDROP):
         # We bind the inputs and outputs inside the docker under the DFMS_ROOT
         # directory, maintaining the rest of their original paths.
         # Outputs are bound only up to their dirname (see class doc for details)
-        # Volume bindings are setup for FileDROPs and DirectoryContainers only
+        # Volume bindings are setup for FileDROPs, DirectoryContainers and
+        # SharedMemoryDROPs only
         vols = [i.path for i in dockerInputs.values()] + [os.path.dirname(o.path) for o in dockerOutputs.values()]
         binds  = [                i.path  + ":" +                  dockerInputs[uid].path  for uid,i in fsInputs.items()]
         binds += [os.path.dirname(o.path) + ":" + os.path.dirname(dockerOutputs[uid].path) for uid,o in fsOutputs.items()]
@@ -45,6 +45,9 @@ class SocketListenerApp(BarrierAppDROP):
     exception whenever one is added. On the output side, one or more outputs
     can be specified with the restriction that they are not ContainerDROPs
     so data can be written into them through the framework.
+
+    Data is received into a single buffer of `bufsize` bytes, which is then
+    written into the outputs without further copies.
     '''
 
     _dryRun = False
@@ -66,6 +69,7 @@ class SocketListenerApp(BarrierAppDROP):
         self._host = host
         self._port = port
         self._reuseAddr = self._getArg(kwargs, 'reuseAddr', False)
+        self._bufsize = int(self._getArg(kwargs, 'bufsize', 65536))
 
     def run(self):
 
@@ -90,13 +94,15 @@ class SocketListenerApp(BarrierAppDROP):
             logger.info('Accepted connection from %s:%d', address[0], address[1])
 
         # Simply write the data we receive into our outputs
+        buf = bytearray(self._bufsize)
+        view = memoryview(buf)
         with contextlib.closing(clientSocket):
             while True:
-                data = clientSocket.recv(4096)
-                if not data:
+                nbytes = clientSocket.recv_into(buf)
+                if not nbytes:
                     break
                 for out in outs:
-                    out.write(data)
+                    out.write(view[:nbytes])
 
     @property
     def host(self):
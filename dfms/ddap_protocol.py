@@ -74,6 +74,33 @@ class ChecksumTypes:
     """
     CRC_32, CRC_32C = range(2)
 
+class ChecksumModes:
+    """
+    An enumeration of the different ways in which DROPs calculate the checksum
+    of the data written through them. NONE means that no checksum is
+    calculated. INLINE means that the checksum is updated by the writer itself
+    on each write. BACKGROUND means that the checksum is calculated by a
+    separate thread, and is only available after the DROP has been completed.
+    """
+    NONE, INLINE, BACKGROUND = range(3)
+
+class CompressionTypes:
+    """
+    An enumeration of the algorithms with which DROPs can compress their data
+    (see `dfms.io.CompressedIO`). ZLIB is always available; LZ4 and ZSTD
+    require the lz4 and zstandard packages, respectively.
+    """
+    ZLIB, LZ4, ZSTD = range(3)
+
+class StreamingBufferPolicies:
+    """
+    An enumeration of what DROPs can do with newly written data when the queue
+    feeding one of their streaming consumers is full (see `dfms.streaming`).
+    BLOCK makes the writer wait until there is space in the queue, DROP
+    discards the new data, and SPILL queues it in a file on disk instead.
+    """
+    BLOCK, DROP, SPILL = range(3)
+
 class ExecutionMode:
     """
     Execution modes for a DROP. DROP means that a DROP will trigger
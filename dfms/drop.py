@@ -36,16 +36,23 @@ import random
 import shutil
 import threading
 import time
+import uuid
 
 import six
 from six import BytesIO
+from six.moves import queue as Queue  # @UnresolvedImport
 
-from dfms.ddap_protocol import ExecutionMode, ChecksumTypes, AppDROPStates, \
-    DROPLinkType, DROPPhases, DROPStates, DROPRel
-from dfms.event import EventFirer
+from dfms.ddap_protocol import ExecutionMode, ChecksumTypes, ChecksumModes, \
+    AppDROPStates, DROPLinkType, DROPPhases, DROPStates, DROPRel, \
+    StreamingBufferPolicies, CompressionTypes
+from dfms.event import EventFirer, StatusEvent, ExecStatusEvent, \
+    ProducerFinishedEvent
 from dfms.exceptions import InvalidDropException, InvalidRelationshipException
-from dfms.io import OpenMode, FileIO, MemoryIO, NgasIO, ErrorIO, NullIO, ShoreIO
-from dfms.utils import prepare_sql
+from dfms.io import OpenMode, FileIO, MemoryIO, NgasIO, NgasLiteIO, ErrorIO, \
+    NullIO, ShoreIO, SharedMemoryIO, SHM_DIR, fadviseHints, CompressedIO, \
+    COMPRESSION_CODECS, registerMemoryBuffer
+from dfms.streaming import StreamingChannel
+from dfms.utils import prepare_sql, sql_params
 
 
 try:
@@ -60,12 +67,212 @@ logger = logging.getLogger(__name__)
 
 class ListAsDict(list):
     """A list that adds drop UIDs to a set as they get appended to the list"""
-    def __init__(self, my_set):
-        self.set = my_set
+    def __init__(self, my_set=None):
+        self.set = my_set if my_set is not None else set()
     def append(self, drop):
         super(ListAsDict, self).append(drop)
         self.set.add(drop.uid)
 
+def _uids(relationship):
+    """
+    Returns the set of UIDs of the given (lazily-created) ListAsDict, or an
+    empty tuple if it hasn't been created yet
+    """
+    return relationship.set if relationship is not None else ()
+
+# DROPs don't own their locks. With millions of DROPs per node a Lock and an
+# RLock per instance are a significant part of their memory footprint, so
+# instead all DROPs share a fixed pool of re-entrant locks, picking one based on
+# their UID. None of our critical sections call out to other DROPs while
+# holding the lock, so sharing them cannot lead to deadlocks.
+_N_LOCKS = 1024
+_locks = [threading.RLock() for _ in range(_N_LOCKS)]
+
+def _lockFor(uid):
+    return _locks[hash(uid) % _N_LOCKS]
+
+def _writableData(data):
+    """
+    Returns `data`, given to AbstractDROP.write, as bytes or as a read-only
+    memoryview over it (see `_readonlyView`)
+    """
+    if isinstance(data, six.integer_types):
+        return six.int2byte(data)
+    elif isinstance(data, six.string_types):
+        return six.b(data)
+    elif not isinstance(data, bytes):
+        return _readonlyView(data)
+    return data
+
+def _readonlyView(data):
+    """
+    Returns a read-only, one-dimensional view of the bytes of the
+    buffer-protocol object `data` (e.g., a bytearray, memoryview or numpy
+    array) without copying them. Non-contiguous buffers are copied into a bytes
+    object instead, and so are all buffers under python 2, where neither file
+    objects nor crc32 accept memoryviews.
+    """
+    view = memoryview(data)
+    if six.PY2 or not view.c_contiguous:
+        return view.tobytes()
+    if view.ndim != 1 or view.format != 'B':
+        view = view.cast('B')
+    if not view.readonly and hasattr(view, 'toreadonly'):
+        view = view.toreadonly()
+    return view
+
+def _enumValue(value, enum, n):
+    """
+    Returns `value` if it's one of the first `n` values of `enum`, or the
+    value of its attribute named `value` (case insensitive) if `value` is a
+    string. Returns None otherwise.
+    """
+    if isinstance(value, six.string_types):
+        value = getattr(enum, value.upper(), None)
+    return value if value in range(n) else None
+
+_TRUE_STRINGS = ('true', 'yes', 'on', '1')
+_FALSE_STRINGS = ('false', 'no', 'off', '0', '')
+
+def _boolValue(value):
+    """
+    Returns the boolean value of `value`. Strings, which usually come from
+    graph specifications, are parsed (case insensitive) rather than tested for
+    emptiness. Returns None if `value` is a string that can't be parsed.
+    """
+    if isinstance(value, six.string_types):
+        value = value.strip().lower()
+        if value in _TRUE_STRINGS:
+            return True
+        return False if value in _FALSE_STRINGS else None
+    return bool(value)
+
+# Maximum number of chunks waiting to be checksummed by a _BackgroundChecksum.
+# Writers block when it's reached, bounding the memory held by queued chunks
+_CHECKSUM_QUEUE_SIZE = 64
+
+class _BackgroundChecksum(object):
+    """
+    Calculates the checksum of the chunks put into a bounded queue on a
+    separate thread, so writers don't have to. Chunks are only referenced,
+    except for those that are not bytes objects, which are copied since the
+    buffers they view might be reused by the writer after writing them.
+    """
+
+    __slots__ = ('_queue', '_thread', '_checksum')
+
+    def __init__(self, name):
+        self._queue = Queue.Queue(_CHECKSUM_QUEUE_SIZE)
+        self._checksum = 0
+        self._thread = threading.Thread(target=self._run, name='Checksum %s' % (name,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def update(self, chunk):
+        if not isinstance(chunk, bytes):
+            chunk = bytes(chunk)
+        self._queue.put(chunk)
+
+    def _run(self):
+        get = self._queue.get
+        checksum = 0
+        while True:
+            chunk = get()
+            if chunk is None:
+                break
+            checksum = crc32(chunk, checksum)
+        self._checksum = checksum
+
+    def finish(self):
+        """
+        Waits until all queued chunks are checksummed and returns the result
+        """
+        self._queue.put(None)
+        self._thread.join()
+        return self._checksum
+
+# Average size of the buffers given to writev above which their CRC is chained
+# over them instead of calculated on their concatenation
+_CHAINED_CHECKSUM_SIZE = 16384
+
+class _WriteBuffer(object):
+    """
+    Holds back the small writes done on a DROP so they are written together
+    through `AbstractDROP.writev` once `size` bytes are pending, `interval`
+    seconds after the first of them is held back (if positive), or when the
+    DROP is flushed or completed, whatever happens first. Like in
+    _BackgroundChecksum, chunks that are not bytes objects are copied.
+
+    Chunks are kept until they are successfully written. Errors writing them
+    from the timer's thread are raised by the next call to `add` or `flush`.
+    """
+
+    __slots__ = ('size', '_interval', '_lock', '_chunks', '_nbytes', '_timer',
+                 '_error')
+
+    def __init__(self, size, interval):
+        self.size = size
+        self._interval = interval
+        self._lock = threading.RLock()
+        self._chunks = []
+        self._nbytes = 0
+        self._timer = None
+        self._error = None
+
+    def add(self, drop, data):
+        if type(data) is not bytes:
+            data = bytes(data)
+        with self._lock:
+            if self._error is not None:
+                self._raiseError()
+            self._chunks.append(data)
+            self._nbytes += len(data)
+
+            # Don't hold back the data completing the DROP either
+            if self._nbytes >= self.size or (drop._expectedSize > 0 and \
+               (drop._size or 0) + self._nbytes >= drop._expectedSize):
+                self._flush(drop)
+            elif self._timer is None and self._interval > 0:
+                self._timer = threading.Timer(self._interval, self._flushLater, (drop,))
+                self._timer.daemon = True
+                self._timer.start()
+        return len(data)
+
+    def flush(self, drop):
+        with self._lock:
+            self._raiseError()
+            self._flush(drop)
+
+    def _raiseError(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _flush(self, drop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._chunks:
+            return
+        chunks, nbytes = self._chunks, self._nbytes
+        self._chunks = []
+        self._nbytes = 0
+        try:
+            drop._writev(chunks)
+        except:
+            # Put them back so they are written by the next flush
+            self._chunks = chunks + self._chunks
+            self._nbytes += nbytes
+            raise
+
+    def _flushLater(self, drop):
+        with self._lock:
+            try:
+                self._flush(drop)
+            except Exception as e:
+                logger.exception("Error while flushing the buffered writes of %r", drop)
+                self._error = e
+
 #===============================================================================
 # DROP classes follow
 #===============================================================================
@@ -113,6 +320,19 @@ class AbstractDROP(EventFirer):
     #  - Subclasses implement methods decorated with @abstractmethod
     __metaclass__ = ABCMeta
 
+    # DROPs are created by the millions, so we avoid a per-instance __dict__.
+    # Subclasses outside this module that don't declare their own __slots__
+    # will still get one, which is fine for the less numerous AppDROPs
+    __slots__ = ('_oid', '_uid', '_consumers', '_producers',
+                 '_streamingConsumers', '_finishedProducers', '_refCount',
+                 '_lock', '_location', '_parent', '_status', '_phase',
+                 '_targetPhase', '_checksum', '_checksumType', '_size', '_wio',
+                 '_rios', '_executionMode', '_node', '_dataIsland',
+                 '_expireAfterUse', '_expirationDate', '_expectedSize',
+                 '_precious', '_checksumMode', '_checksummer',
+                 '_streamingChannelArgs', '_streamingChannels', '_compression',
+                 '_writeBuffer')
+
     def __init__(self, oid, uid, **kwargs):
         """
         Creates a DROP. The only mandatory argument are the Object ID
@@ -142,16 +362,15 @@ class AbstractDROP(EventFirer):
         # Obviously the normal way of doing this is using a dictionary, but
         # for the time being and while testing the integration with TBU's ceda
         # library we need to expose a list.
-        self._consumers_uids = set()
-        self._consumers = ListAsDict(self._consumers_uids)
-        self._producers_uids = set()
-        self._producers = ListAsDict(self._producers_uids)
+        # Many DROPs never get some (or any) of these relationships, so the
+        # ListAsDict objects are only created when the first one is added
+        self._consumers = None
+        self._producers = None
 
         # Set holding the state of the producers that have finished their
         # execution. Once all producers have finished, this DROP moves
-        # itself to the COMPLETED state
-        self._finishedProducers = []
-        self._finishedProducersLock = threading.Lock()
+        # itself to the COMPLETED state. Also lazily created
+        self._finishedProducers = None
 
         # Streaming consumers are objects that consume the data written in
         # this DROP *as it gets written*, and therefore don't have to
@@ -161,16 +380,29 @@ class AbstractDROP(EventFirer):
         # efficiency (why would a consumer want to consume the data twice?) and
         # not because it's technically impossible.
         # See comment above in self._consumers/self._producers for separate set
-        # with uids
-        self._streamingConsumers_uids = set()
-        self._streamingConsumers = ListAsDict(self._streamingConsumers_uids)
+        # with uids and lazy creation
+        self._streamingConsumers = None
+
+        # With a positive streamingHighWaterMark, streaming consumers are fed
+        # through StreamingChannels instead of directly from within write()
+        # (see dfms.streaming). _streamingChannelArgs then holds the arguments
+        # used to create them as streaming consumers are added
+        highWaterMark = int(self._getArg(kwargs, 'streamingHighWaterMark', 0))
+        policy = self._getArg(kwargs, 'streamingBufferPolicy', StreamingBufferPolicies.BLOCK)
+        spillDir = self._getArg(kwargs, 'streamingSpillDir', None)
+        self._streamingChannelArgs = None
+        self._streamingChannels = None
+        if highWaterMark > 0:
+            policy = _enumValue(policy, StreamingBufferPolicies, 3)
+            if policy is None:
+                raise InvalidDropException(self, "%r specifies an invalid streamingBufferPolicy" % (self,))
+            self._streamingChannelArgs = (highWaterMark, policy, spillDir)
 
         self._refCount = 0
-        self._refLock  = threading.Lock()
+        self._lock     = _lockFor(self._uid)
         self._location = None
         self._parent   = None
         self._status   = None
-        self._statusLock = threading.RLock()
 
         # Current and target phases.
         # Phases represent the resiliency of data. An initial phase of PLASMA
@@ -193,6 +425,38 @@ class AbstractDROP(EventFirer):
         self._checksumType = None
         self._size         = None
 
+        # How the checksum is calculated (see ChecksumModes). High-rate
+        # ingestion DROPs can use BACKGROUND to keep the checksum calculation
+        # out of their writers' way, or NONE to skip it altogether.
+        # The _BackgroundChecksum object is created on the first write
+        checksumMode = _enumValue(self._getArg(kwargs, 'checksumMode', ChecksumModes.INLINE), ChecksumModes, 3)
+        if checksumMode is None:
+            raise InvalidDropException(self, "%r specifies an invalid checksumMode" % (self,))
+        self._checksumMode = checksumMode
+        self._checksummer  = None
+
+        # Whether our data is compressed on its way to and from our storage
+        # (see dfms.io.CompressedIO). If so, this is a
+        # (CompressionTypes value, level, block size) tuple
+        compression = self._getArg(kwargs, 'compression', None)
+        if compression is not None:
+            compressionType = _enumValue(compression, CompressionTypes, 3)
+            if compressionType not in COMPRESSION_CODECS:
+                raise InvalidDropException(self, "%r specifies an invalid or unavailable compression: %r" % (self, compression))
+            level = self._getArg(kwargs, 'compressionLevel', None)
+            blockSize = int(self._getArg(kwargs, 'compressionBlockSize', 1024**2))
+            compression = (compressionType, None if level is None else int(level), blockSize)
+        self._compression = compression
+
+        # Many small writes can be coalesced into fewer, bigger ones written
+        # with writev (see _WriteBuffer) to save on the per-write overhead of
+        # status checks, checksum updates, streaming consumers and syscalls
+        writeBufferSize = int(self._getArg(kwargs, 'writeBufferSize', 0))
+        writeFlushInterval = float(self._getArg(kwargs, 'writeFlushInterval', 0))
+        self._writeBuffer = None
+        if writeBufferSize > 0:
+            self._writeBuffer = _WriteBuffer(writeBufferSize, writeFlushInterval)
+
         # The DataIO instance we use in our write method. It's initialized to
         # None because it's lazily initialized in the write method, since data
         # might be written externally and not through this DROP
@@ -203,8 +467,9 @@ class AbstractDROP(EventFirer):
         # open/read/close calls we use integers, mainly because Pyro doesn't
         # handle file types and other classes (like StringIO) well, but also
         # because it requires less transport.
+        # Created on the first open() call.
         # TODO: Make these threadsafe, no lock around them yet
-        self._rios = {}
+        self._rios = None
 
         # The execution mode.
         # When set to DROP (the default) the graph execution will be driven by
@@ -290,14 +555,14 @@ class AbstractDROP(EventFirer):
         """
         Increments the reference count of this DROP by one atomically.
         """
-        with self._refLock:
+        with self._lock:
             self._refCount += 1
 
     def decrRefCount(self):
         """
         Decrements the reference count of this DROP by one atomically.
         """
-        with self._refLock:
+        with self._lock:
             self._refCount -= 1
 
     def open(self, **kwargs):
@@ -313,10 +578,12 @@ class AbstractDROP(EventFirer):
         if self.status != DROPStates.COMPLETED:
             raise Exception("%r is in state %s (!=COMPLETED), cannot be opened for reading" % (self, self.status,))
 
-        io = self.getIO()
+        io = self._dataIO()
         io.open(OpenMode.OPEN_READ, **kwargs)
 
         # Save the IO object in the dictionary and return its descriptor instead
+        if self._rios is None:
+            self._rios = {}
         while True:
             descriptor = random.SystemRandom().randint(-six.MAXSIZE - 1, six.MAXSIZE)
             if descriptor not in self._rios:
@@ -350,10 +617,50 @@ class AbstractDROP(EventFirer):
         io = self._rios[descriptor]
         return io.read(count, **kwargs)
 
+    def readinto(self, descriptor, buf, **kwargs):
+        """
+        Reads up to `len(buf)` bytes from the given DROP `descriptor` into the
+        writable buffer `buf`, returning the number of bytes read. Reusing
+        the same `buf` avoids allocating a new bytes object on each read.
+        """
+        self._checkStateAndDescriptor(descriptor)
+        io = self._rios[descriptor]
+        return io.readinto(buf, **kwargs)
+
+    def seek(self, descriptor, offset, whence=0):
+        """
+        Moves the position from which the given DROP `descriptor` reads to
+        `offset`, interpreted like in the `seek` method of file objects, and
+        returns the new position. Only DROPs with random access to their data
+        support this operation; the rest raise `NotImplementedError`.
+        """
+        self._checkStateAndDescriptor(descriptor)
+        return self._rios[descriptor].seek(offset, whence)
+
+    def fileno(self, descriptor):
+        """
+        Returns the OS-level file descriptor of the storage opened by the given
+        DROP `descriptor`. Only DROPs stored in files support this operation;
+        the rest raise `NotImplementedError`.
+        """
+        self._checkStateAndDescriptor(descriptor)
+        return self._rios[descriptor].fileno()
+
+    def buffer(self, descriptor):
+        """
+        Returns a read-only memoryview over all the data of this DROP, which
+        remains valid until the given `descriptor` is closed. Only DROPs
+        whose storage allows to access their data without copying it (like
+        FileDROPs, which memory-map their files) support this operation;
+        the rest raise `NotImplementedError`.
+        """
+        self._checkStateAndDescriptor(descriptor)
+        return self._rios[descriptor].buffer()
+
     def _checkStateAndDescriptor(self, descriptor):
         if self.status != DROPStates.COMPLETED:
             raise Exception("%r is in state %s (!=COMPLETED), cannot be read" % (self.status,))
-        if descriptor not in self._rios:
+        if not self._rios or descriptor not in self._rios:
             raise Exception("Illegal descriptor %d given, remember to open() first" % (descriptor))
 
     def isBeingRead(self):
@@ -361,7 +668,7 @@ class AbstractDROP(EventFirer):
         Returns `True` if the DROP is currently being read; `False`
         otherwise
         """
-        with self._refLock:
+        with self._lock:
             return self._refCount > 0
 
     def write(self, data, **kwargs):
@@ -371,25 +678,37 @@ class AbstractDROP(EventFirer):
         once the DROP is COMPLETE or beyond only reading is allowed.
         The underlying storage mechanism is responsible for implementing the
         final writing logic via the `self.writeMeta()` method.
+
+        Apart from bytes, `data` can be any object supporting the buffer
+        protocol (e.g., a bytearray, memoryview or numpy array), in which case
+        its contents are not copied. Instead, a read-only memoryview over them
+        is handed to the underlying DataIO object and to the streaming
+        consumers of this DROP, which therefore must copy the data if they
+        need to keep it after their `dataWritten` method returns.
+
+        If this DROP was created with a positive ``writeBufferSize``, writes
+        smaller than that are held back (and copied if necessary) and written
+        together with later ones once ``writeBufferSize`` bytes are pending,
+        after ``writeFlushInterval`` seconds (if positive), or when `flush` or
+        `setCompleted` are called. Their size and checksum are only accounted
+        for, and streaming consumers only see them, at that point.
         '''
 
         if self.status not in [DROPStates.INITIALIZED, DROPStates.WRITING]:
             raise Exception("No more writing expected")
 
-        if isinstance(data, memoryview):
-            data = data.tobytes()
-        elif isinstance(data, six.integer_types):
-            data = six.int2byte(data)
-        elif isinstance(data, six.string_types):
-            data = six.b(data)
+        if type(data) is not bytes:
+            data = _writableData(data)
 
+        writeBuffer = self._writeBuffer
+        if writeBuffer is not None:
+            if len(data) < writeBuffer.size:
+                if self._status != DROPStates.WRITING:
+                    self.status = DROPStates.WRITING
+                return writeBuffer.add(self, data)
+            writeBuffer.flush(self)
 
-        # We lazily initialize our writing IO instance because the data of this
-        # DROP might not be written through this DROP
-        if not self._wio:
-            self._wio = self.getIO()
-            self._wio.open(OpenMode.OPEN_WRITE)
-        nbytes = self._wio.write(data)
+        nbytes = self._writeIO().write(data)
 
         dataLen = len(data)
         if nbytes != dataLen:
@@ -401,14 +720,138 @@ class AbstractDROP(EventFirer):
             self._size = 0
         self._size += nbytes
 
-        # Trigger our streaming consumers
+        # Trigger our streaming consumers, or the channels feeding them
         if self._streamingConsumers:
-            for streamingConsumer in self._streamingConsumers:
+            for streamingConsumer in self._streamingChannels or self._streamingConsumers:
                 streamingConsumer.dataWritten(self.uid, data)
 
         # Update our internal checksum
         self._updateChecksum(data)
 
+        self._checkWritingStatus()
+        return nbytes
+
+    def writev(self, buffers):
+        """
+        Writes all the objects in the `buffers` sequence (accepted like `data`
+        in `write`) one after the other into this DROP in a single operation,
+        and returns the number of bytes written. DROPs storing their data in
+        files write them all with a single writev(2) call.
+        """
+
+        if self.status not in [DROPStates.INITIALIZED, DROPStates.WRITING]:
+            raise Exception("No more writing expected")
+
+        buffers = [_writableData(data) for data in buffers]
+        self.flush()
+        return self._writev(buffers)
+
+    def _writev(self, buffers):
+
+        nbytes = self._writeIO().writev(buffers)
+
+        dataLen = sum(len(data) for data in buffers)
+        if nbytes != dataLen:
+            logger.warning('Not all data was correctly written by %s (%d/%d bytes written)' % (self, nbytes, dataLen))
+
+        if self._size is None:
+            self._size = 0
+        self._size += nbytes
+
+        # Streaming consumers see all the data at once. Inline CRCs are chained
+        # over large buffers instead of joining them; small ones are joined,
+        # which is cheaper than calculating their CRCs one by one
+        data = None
+        if self._streamingConsumers:
+            data = buffers[0] if len(buffers) == 1 else b''.join(buffers)
+            for streamingConsumer in self._streamingChannels or self._streamingConsumers:
+                streamingConsumer.dataWritten(self.uid, data)
+        if data is None and self._checksumMode == ChecksumModes.INLINE and \
+           dataLen >= _CHAINED_CHECKSUM_SIZE * len(buffers):
+            for buf in buffers:
+                self._updateChecksum(buf)
+        elif self._checksumMode != ChecksumModes.NONE:
+            if data is None:
+                data = buffers[0] if len(buffers) == 1 else b''.join(buffers)
+            self._updateChecksum(data)
+
+        self._checkWritingStatus()
+        return nbytes
+
+    def flush(self):
+        """
+        Writes the data held back by the write buffer of this DROP, if any
+        (see `write`).
+        """
+        if self._writeBuffer is not None:
+            self._writeBuffer.flush(self)
+
+    def writeFromFile(self, fd, offset, count, checksum=None):
+        """
+        Writes `count` bytes, read from offset `offset` of the OS-level file
+        descriptor `fd`, into this DROP, letting the kernel copy them directly
+        into its storage. `checksum` is the checksum of those bytes, if known.
+
+        This is only possible if this DROP stores its data in a file, has no
+        streaming consumers, and doesn't need to see the data to calculate its
+        checksum (i.e., its `checksumMode` is `ChecksumModes.NONE`, or it was
+        empty and `checksum` is given); otherwise `NotImplementedError` is
+        raised and nothing is written.
+        """
+
+        if self.status not in [DROPStates.INITIALIZED, DROPStates.WRITING]:
+            raise Exception("No more writing expected")
+        if self._streamingConsumers:
+            raise NotImplementedError("%r has streaming consumers" % (self,))
+        if self._checksumMode != ChecksumModes.NONE and (checksum is None or self._size):
+            raise NotImplementedError("%r needs to calculate its checksum" % (self,))
+
+        self.flush()
+        nbytes = self._writeIO().copyFrom(fd, offset, count)
+        if nbytes != count:
+            logger.warning('Not all data was correctly written by %s (%d/%d bytes written)' % (self, nbytes, count))
+
+        if self._size is None:
+            self._size = 0
+        self._size += nbytes
+        if self._checksumMode != ChecksumModes.NONE:
+            self._checksum = checksum
+            self._checksumType = _checksumType
+
+        self._checkWritingStatus()
+        return nbytes
+
+    def _writeIO(self):
+        # We lazily initialize our writing IO instance because the data of this
+        # DROP might not be written through this DROP
+        if not self._wio:
+            self._wio = self._dataIO()
+            self._wio.open(OpenMode.OPEN_WRITE, expectedSize=self._expectedSize)
+        return self._wio
+
+    def _dataIO(self):
+        """
+        Returns the DataIO through which the data of this DROP is read and
+        written: the one given by `getIO`, wrapped in a CompressedIO if this
+        DROP compresses its data.
+        """
+        io = self.getIO()
+        if self._compression:
+            compressionType, level, blockSize = self._compression
+            io = CompressedIO(io, compressionType, level=level, blockSize=blockSize)
+        return io
+
+    def _compressedURL(self, url):
+        """
+        Returns `url` prefixed with the name of the compression algorithm used
+        by this DROP, if any (e.g., ``zlib+file://...``), so readers resolving
+        it with `dfms.io.IOForURL` decompress the data.
+        """
+        if not self._compression:
+            return url
+        return COMPRESSION_CODECS[self._compression[0]].name + '+' + url
+
+    def _checkWritingStatus(self):
         # If we know how much data we'll receive, keep track of it and
         # automatically switch to COMPLETED
         if self._expectedSize > 0:
@@ -423,8 +866,6 @@ class AbstractDROP(EventFirer):
         else:
             self.status = DROPStates.WRITING
 
-        return nbytes
-
     @abstractmethod
     def getIO(self):
         """
@@ -453,11 +894,29 @@ class AbstractDROP(EventFirer):
         """
 
     def _updateChecksum(self, chunk):
-        # see __init__ for the initialization to None
-        if self._checksum is None:
-            self._checksum = 0
-            self._checksumType = _checksumType
-        self._checksum = crc32(chunk, self._checksum)
+        mode = self._checksumMode
+        if mode == ChecksumModes.INLINE:
+            # see __init__ for the initialization to None
+            if self._checksum is None:
+                self._checksum = 0
+                self._checksumType = _checksumType
+            self._checksum = crc32(chunk, self._checksum)
+        elif mode == ChecksumModes.BACKGROUND:
+            if self._checksummer is None:
+                self._checksummer = _BackgroundChecksum(self._uid)
+            self._checksummer.update(chunk)
+
+    def _finishChecksum(self):
+        """
+        Waits for the checksum being calculated in the background, if any, and
+        sets it as this DROP's checksum.
+        """
+        checksummer = self._checksummer
+        if checksummer is None:
+            return
+        self._checksummer = None
+        self._checksum = checksummer.finish()
+        self._checksumType = _checksumType
 
     @property
     def checksum(self):
@@ -465,9 +924,11 @@ class AbstractDROP(EventFirer):
         The checksum value for the data represented by this DROP. Its
         value is automatically calculated if the data was actually written
         through this DROP (using the `self.write()` method directly or
-        indirectly). In the case that the data has been externally written, the
-        checksum can be set externally after the DROP has been moved to
-        COMPLETED or beyond.
+        indirectly), unless this DROP's `checksumMode` is
+        `ChecksumModes.NONE`. When calculated in the background it is only
+        available after the DROP has been moved to COMPLETED. In the case that
+        the data has been externally written, the checksum can be set
+        externally after the DROP has been moved to COMPLETED or beyond.
 
         :see: `self.checksumType`
         """
@@ -503,6 +964,14 @@ class AbstractDROP(EventFirer):
             raise Exception("DROP %s is still not fully written, cannot manually set a checksum type yet" % (self))
         self._checksumType = value
 
+    @property
+    def checksumMode(self):
+        """
+        How the checksum of the data written through this DROP is calculated.
+        One of `ChecksumModes`.
+        """
+        return self._checksumMode
+
     @property
     def oid(self):
         """
@@ -559,11 +1028,26 @@ class AbstractDROP(EventFirer):
         All the key-value pairs contained in `attrs` are set as attributes of
         the event being sent. On top of that, the `uid` and `oid` attributes are
         also added, carrying the uid and oid of the current DROP, respectively.
+
+        The most frequent events (status changes, completion and execution
+        related events) are instead fired using their own event classes (see
+        `self._fireStatus`).
         """
-        kwargs['oid'] = self.oid
-        kwargs['uid'] = self.uid
+        if not self._listenersFor(eventType):
+            return
+        kwargs['oid'] = self._oid
+        kwargs['uid'] = self._uid
         self._fireEvent(eventType, **kwargs)
 
+    def _fireStatus(self, eventType, status):
+        """
+        Fires a `StatusEvent` of `eventType` carrying `status`. No event is
+        created if there are no listeners.
+        """
+        listeners = self._listenersFor(eventType)
+        if listeners:
+            self._deliverEvent(listeners, StatusEvent(eventType, self._oid, self._uid, status))
+
     @property
     def phase(self):
         """
@@ -618,18 +1102,18 @@ class AbstractDROP(EventFirer):
         """
         The current status of this DROP.
         """
-        with self._statusLock:
+        with self._lock:
             return self._status
 
     @status.setter
     def status(self, value):
-        with self._statusLock:
+        with self._lock:
             # if we are already in the state that is requested then do nothing
             if value == self._status:
                 return
             self._status = value
 
-        self._fire('status', status = value)
+        self._fireStatus('status', value)
 
     @property
     def parent(self):
@@ -660,7 +1144,7 @@ class AbstractDROP(EventFirer):
 
         :see: `self.addConsumer()`
         """
-        return self._consumers[:]
+        return self._consumers[:] if self._consumers else []
 
     def addConsumer(self, consumer, back=True):
         """
@@ -680,15 +1164,17 @@ class AbstractDROP(EventFirer):
         # An object cannot be a normal and streaming consumer at the same time,
         # see the comment in the __init__ method
         cuid = consumer.uid
-        if cuid in self._streamingConsumers_uids:
+        if cuid in _uids(self._streamingConsumers):
             raise InvalidRelationshipException(DROPRel(consumer, DROPLinkType.CONSUMER, self),
                                                "Consumer already registered as a streaming consumer")
 
         # Add if not already present
         # Add the reverse reference too automatically
-        if cuid in self._consumers_uids:
+        if cuid in _uids(self._consumers):
             return
         logger.debug('Adding new consumer %r to %r', consumer, self)
+        if self._consumers is None:
+            self._consumers = ListAsDict()
         self._consumers.append(consumer)
 
         # Subscribe the consumer to events sent when this DROP moves to
@@ -712,7 +1198,7 @@ class AbstractDROP(EventFirer):
 
         :see: `self.addProducer()`
         """
-        return self._producers[:]
+        return self._producers[:] if self._producers else []
 
     def addProducer(self, producer, back=True):
         """
@@ -727,9 +1213,11 @@ class AbstractDROP(EventFirer):
 
         # Don't add twice
         puid = producer.uid
-        if puid in self._producers_uids:
+        if puid in _uids(self._producers):
             return
 
+        if self._producers is None:
+            self._producers = ListAsDict()
         self._producers.append(producer)
 
         # Automatic back-reference
@@ -758,10 +1246,12 @@ class AbstractDROP(EventFirer):
         """
 
         finished = False
-        with self._finishedProducersLock:
+        with self._lock:
+            if self._finishedProducers is None:
+                self._finishedProducers = []
             self._finishedProducers.append(drop_state)
             nFinished = len(self._finishedProducers)
-            nProd = len(self._producers)
+            nProd = len(self._producers) if self._producers else 0
 
             if nFinished > nProd:
                 raise Exception("More producers finished that registered in DROP %r: %d > %d" % (self, nFinished, nProd))
@@ -784,7 +1274,7 @@ class AbstractDROP(EventFirer):
 
         :see: `self.addStreamingConsumer()`
         """
-        return self._streamingConsumers[:]
+        return self._streamingConsumers[:] if self._streamingConsumers else []
 
     def addStreamingConsumer(self, streamingConsumer, back=True):
         """
@@ -804,16 +1294,26 @@ class AbstractDROP(EventFirer):
         # An object cannot be a normal and streaming streamingConsumer at the same time,
         # see the comment in the __init__ method
         scuid = streamingConsumer.uid
-        if scuid in self._consumers_uids:
+        if scuid in _uids(self._consumers):
             raise InvalidRelationshipException(DROPRel(streamingConsumer, DROPLinkType.STREAMING_CONSUMER, self),
                                                "Consumer is already registered as a normal consumer")
 
         # Add if not already present
-        if scuid in self._streamingConsumers_uids:
+        if scuid in _uids(self._streamingConsumers):
             return
         logger.debug('Adding new streaming streaming consumer for %r: %s' %(self, streamingConsumer))
+        if self._streamingConsumers is None:
+            self._streamingConsumers = ListAsDict()
         self._streamingConsumers.append(streamingConsumer)
 
+        # Data and events go through a channel if requested
+        listener = streamingConsumer
+        if self._streamingChannelArgs is not None:
+            listener = StreamingChannel(streamingConsumer, *self._streamingChannelArgs)
+            if self._streamingChannels is None:
+                self._streamingChannels = []
+            self._streamingChannels.append(listener)
+
         # Automatic back-reference
         if back and hasattr(streamingConsumer, 'addStreamingInput'):
             streamingConsumer.addStreamingInput(self, False)
@@ -825,7 +1325,16 @@ class AbstractDROP(EventFirer):
         # an external entity will trigger the execution of the consumer at the
         # right time
         if self.executionMode == ExecutionMode.DROP:
-            self.subscribe(streamingConsumer, 'dropCompleted')
+            self.subscribe(listener, 'dropCompleted')
+
+    @property
+    def streamingQueueStats(self):
+        """
+        The statistics of the StreamingChannels feeding the streaming consumers
+        of this DROP (see `dfms.streaming.StreamingChannel.stats`), keyed by
+        the consumers' UIDs. Empty unless a streamingHighWaterMark was given.
+        """
+        return {c.consumer.uid: c.stats() for c in self._streamingChannels or ()}
 
     def setError(self):
         '''
@@ -835,12 +1344,13 @@ class AbstractDROP(EventFirer):
         # If written externally, self._wio will have remained None
         if self._wio:
             self._wio.close()
+        self._finishChecksum()
 
         logger.info("Moving %r to ERROR", self)
         self.status = DROPStates.ERROR
 
         # Signal our subscribers that the show is over
-        self._fire('dropCompleted', status=DROPStates.ERROR)
+        self._fireStatus('dropCompleted', DROPStates.ERROR)
 
     def setCompleted(self):
         '''
@@ -852,16 +1362,19 @@ class AbstractDROP(EventFirer):
         if self.status not in [DROPStates.INITIALIZED, DROPStates.WRITING]:
             raise Exception("%r not in INITIALIZED or WRITING state (%s), cannot setComplete()" % (self, self.status))
 
+        self.flush()
+
         # Close our writing IO instance.
         # If written externally, self._wio will have remained None
         if self._wio:
             self._wio.close()
+        self._finishChecksum()
 
         logger.debug("Moving %r to COMPLETED", self)
         self.status = DROPStates.COMPLETED
 
         # Signal our subscribers that the show is over
-        self._fire('dropCompleted', status=DROPStates.COMPLETED)
+        self._fireStatus('dropCompleted', DROPStates.COMPLETED)
 
     def isCompleted(self):
         '''
@@ -871,6 +1384,17 @@ class AbstractDROP(EventFirer):
         # lock in status() to access _status
         return (self.status == DROPStates.COMPLETED)
 
+    @property
+    def location(self):
+        """
+        A free-form description of where this DROP is physically located
+        """
+        return self._location
+
+    @location.setter
+    def location(self, location):
+        self._location = location
+
     @property
     def node(self):
         return self._node
@@ -882,8 +1406,20 @@ class AbstractDROP(EventFirer):
 class FileDROP(AbstractDROP):
     """
     A DROP that points to data stored in a mounted filesystem.
+
+    FileDROPs support the `buffer` method, which gives access to their
+    memory-mapped contents. The file is mapped when the DROP is opened if
+    ``mmap=True`` is given to `open`.
+
+    The `bufferSize`, `fadvise` and `directIO` options tune how the file is
+    accessed (see `dfms.io.FileIO`). For example, large products can be
+    written with ``directIO=True`` and read with ``fadvise='sequential,dontneed'``
+    so they don't push other DROPs' data out of the page cache.
     """
 
+    __slots__ = ('_delete_parent_dir', '_fnm', '_root', '_bufferSize',
+                 '_fadvise', '_directIO')
+
     def initialize(self, **kwargs):
         """
         FileDROP-specific initialization.
@@ -909,10 +1445,20 @@ class FileDROP(AbstractDROP):
             if os.path.isfile(self._fnm):
                 logger.warning('File %s already exists, overwriting' % (self._fnm))
 
+        self._bufferSize = int(self._getArg(kwargs, 'bufferSize', -1))
+        self._directIO = _boolValue(self._getArg(kwargs, 'directIO', False))
+        if self._directIO is None:
+            raise InvalidDropException(self, "%r specifies an invalid directIO value" % (self,))
+        try:
+            self._fadvise = fadviseHints(self._getArg(kwargs, 'fadvise', None))
+        except ValueError as e:
+            raise InvalidDropException(self, str(e))
+
         self._wio = None
 
     def getIO(self):
-        return FileIO(self._fnm)
+        return FileIO(self._fnm, bufferSize=self._bufferSize,
+                      fadvise=self._fadvise, directIO=self._directIO)
 
     @property
     def path(self):
@@ -934,9 +1480,12 @@ class FileDROP(AbstractDROP):
     @property
     def dataURL(self):
         hostname = os.uname()[1] # TODO: change when necessary
-        return "file://" + hostname + self._fnm
+        return self._compressedURL("file://" + hostname + self._fnm)
 
 class ShoreDROP(AbstractDROP):
+
+    __slots__ = ('_doid', '_column', '_row', '_rows', '_address')
+
     def initialize(self, **kwargs):
         self._doid = self._getArg(kwargs, 'doid', 'test_data_object')
         self._column = self._getArg(kwargs, 'column', 'test_column')
@@ -952,45 +1501,104 @@ class ShoreDROP(AbstractDROP):
 
 class NgasDROP(AbstractDROP):
     '''
-    A DROP that points to data stored in an NGAS server
+    A DROP that points to data stored in an NGAS server. Its data is read over
+    `ngasRetrieveParallelism` concurrent connections, in segments of
+    `ngasRetrieveSegmentSize` bytes, when the former is greater than one.
     '''
 
+    __slots__ = ('_ngasSrv', '_ngasPort', '_ngasTimeout', '_ngasConnectTimeout',
+                 '_ngasRetrieveParallelism', '_ngasRetrieveSegmentSize')
+
     def initialize(self, **kwargs):
         self._ngasSrv            = self._getArg(kwargs, 'ngasSrv', 'localhost')
         self._ngasPort           = int(self._getArg(kwargs, 'ngasPort', 7777))
         self._ngasTimeout        = int(self._getArg(kwargs, 'ngasTimeout', 2))
         self._ngasConnectTimeout = int(self._getArg(kwargs, 'ngasConnectTimeout', 2))
+        self._ngasRetrieveParallelism = int(self._getArg(kwargs, 'ngasRetrieveParallelism', 1))
+        self._ngasRetrieveSegmentSize = int(self._getArg(kwargs, 'ngasRetrieveSegmentSize', 16*1024**2))
 
     def getIO(self):
-        return NgasIO(self._ngasSrv, self.uid, port=self._ngasPort,
-                      ngasConnectTimeout=self._ngasConnectTimeout,
-                      ngasTimeout=self._ngasTimeout)
+        try:
+            return NgasIO(self._ngasSrv, self.uid, port=self._ngasPort,
+                          ngasConnectTimeout=self._ngasConnectTimeout,
+                          ngasTimeout=self._ngasTimeout,
+                          parallelism=self._ngasRetrieveParallelism,
+                          segmentSize=self._ngasRetrieveSegmentSize)
+        except ImportError:
+            logger.warning('NgasIO not available, using NgasLiteIO instead')
+            return NgasLiteIO(self._ngasSrv, self.uid, port=self._ngasPort,
+                              ngasConnectTimeout=self._ngasConnectTimeout,
+                              ngasTimeout=self._ngasTimeout,
+                              parallelism=self._ngasRetrieveParallelism,
+                              segmentSize=self._ngasRetrieveSegmentSize)
 
     @property
     def dataURL(self):
-        return "ngas://%s:%d/%s" % (self._ngasSrv, self._ngasPort, self.uid)
+        return self._compressedURL("ngas://%s:%d/%s" % (self._ngasSrv, self._ngasPort, self.uid))
 
 class InMemoryDROP(AbstractDROP):
     """
     A DROP that points data stored in memory.
+
+    Its dataURL can be opened with `dfms.io.IOForURL` from within the same
+    process, giving direct access to the DROP's buffer.
     """
 
+    __slots__ = ('_buf',)
+
     def initialize(self, **kwargs):
         self._buf = BytesIO()
 
     def getIO(self):
         return MemoryIO(self._buf)
 
+    @property
+    def dataURL(self):
+        return self._compressedURL(registerMemoryBuffer(self._buf))
+
+class SharedMemoryDROP(InMemoryDROP):
+    """
+    An InMemoryDROP whose data is stored in a POSIX shared memory object
+    instead of in the private memory of this process. Its dataURL can
+    therefore be opened from any process in the same node, and
+    subprocess-based applications can use its `path` directly.
+
+    Shared memory objects have unique names and are removed when the DROP is
+    deleted, for example by the Data Lifecycle Manager when it expires, or when
+    the session holding it is destroyed.
+    """
+
+    __slots__ = ('_name',)
+
+    def initialize(self, **kwargs):
+        self._buf = None
+        # Names must never be reused, as writing truncates existing objects
+        # that other processes might still be mapping
+        self._name = 'dfms_%s' % (uuid.uuid4().hex,)
+
+    def getIO(self):
+        return SharedMemoryIO(self._name)
+
+    @property
+    def path(self):
+        """
+        Returns the absolute path under which this DROP's shared memory object
+        is visible in the filesystem.
+        """
+        return os.path.join(SHM_DIR, self._name)
+
     @property
     def dataURL(self):
         hostname = os.uname()[1]
-        return "mem://%s/%d/%d" % (hostname, os.getpid(), id(self._buf))
+        return self._compressedURL("shm://%s/%s" % (hostname, self._name))
 
 class NullDROP(AbstractDROP):
     """
     A DROP that doesn't store any data.
     """
 
+    __slots__ = ()
+
     def getIO(self):
         return NullIO()
 
@@ -998,11 +1606,109 @@ class NullDROP(AbstractDROP):
     def dataURL(self):
         return "null://"
 
+class _ConnectionPool(object):
+    """
+    A pool of idle DB-API 2.0 connections, all opened with the same module and
+    connection parameters. Connections are handed out by `connection` and
+    returned to the pool when the caller is done with them; connections that
+    saw an error are rolled back and closed instead.
+
+    Modules that don't allow connections to be shared among threads (i.e.,
+    those with ``threadsafety < 2``, like sqlite3) get one pool per thread.
+    """
+
+    def __init__(self, drv, params, maxIdle):
+        self._drv = drv
+        self._params = params
+        self._maxIdle = maxIdle
+        self._lock = threading.Lock()
+        self._shared = []
+        self._local = threading.local()
+
+    def _idle(self):
+        if getattr(self._drv, 'threadsafety', 0) >= 2:
+            return self._shared
+        if not hasattr(self._local, 'idle'):
+            self._local.idle = []
+        return self._local.idle
+
+    @contextlib.contextmanager
+    def connection(self):
+        idle = self._idle()
+        with self._lock:
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = self._drv.connect(**self._params)
+
+        try:
+            yield conn
+        except GeneratorExit:
+            # A generator using this connection (e.g., RDBMSDrop.select_iter)
+            # was closed before finishing, the connection itself is fine
+            conn.rollback()
+            self._release(idle, conn)
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            conn.close()
+            raise
+        self._release(idle, conn)
+
+    def _release(self, idle, conn):
+        with self._lock:
+            if len(idle) < self._maxIdle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._shared = self._shared, []
+            if hasattr(self._local, 'idle'):
+                idle += self._local.idle
+                self._local.idle = []
+        for conn in idle:
+            conn.close()
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+#: The maximum number of idle connections kept for each module and set of
+#: connection parameters used by RDBMSDrops
+MAX_IDLE_DB_CONNECTIONS = 4
+
+def _connectionPool(drv, params):
+    key = (drv.__name__, repr(sorted(params.items())))
+    with _connection_pools_lock:
+        if key not in _connection_pools:
+            _connection_pools[key] = _ConnectionPool(drv, params, MAX_IDLE_DB_CONNECTIONS)
+        return _connection_pools[key]
+
+def closeDBConnections():
+    """
+    Closes the idle database connections pooled by RDBMSDrops in the calling
+    thread (and those shared among threads).
+    """
+    with _connection_pools_lock:
+        pools = list(_connection_pools.values())
+    for pool in pools:
+        pool.close()
+
 class RDBMSDrop(AbstractDROP):
     """
-    A Drop that stores data in a table of a relational database
+    A Drop that stores data in a table of a relational database.
+
+    Database connections are pooled per DB-API module and connection parameters
+    (see `closeDBConnections`), so many calls to `insert` and `select` don't
+    pay for establishing a new connection each time. Bulk loads should use
+    `insert_many`, and large result sets should be consumed with `select_iter`.
     """
 
+    __slots__ = ('_db_drv', '_db_table', '_db_params')
+
     def initialize(self, **kwargs):
         AbstractDROP.initialize(self, **kwargs)
 
@@ -1026,7 +1732,7 @@ class RDBMSDrop(AbstractDROP):
         return ErrorIO()
 
     def _connection(self):
-        return contextlib.closing(self._db_drv.connect(**self._db_params))
+        return _connectionPool(self._db_drv, self._db_params).connection()
 
     def _cursor(self, conn):
         return contextlib.closing(conn.cursor())
@@ -1047,6 +1753,58 @@ class RDBMSDrop(AbstractDROP):
                 cur.execute(sql, vals)
                 c.commit()
 
+    def insert_many(self, rows, columns=None, batch_size=10000):
+        """
+        Inserts all ``rows`` into the underlying table within a single
+        transaction, binding them to the same prepared statement in batches of
+        up to ``batch_size`` rows. If ``columns`` is given each row is a
+        sequence of values for those columns; otherwise rows are dictionaries
+        like those given to `insert`, all of them with the same keys. If any
+        row fails to be inserted none of them are. Returns the number of
+        inserted rows.
+        """
+        rows = iter(rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            return 0
+
+        if columns is None:
+            columns = list(first.keys())
+            values = lambda row: [row[col] for col in columns]
+        else:
+            values = lambda row: row
+
+        paramstyle = self._db_drv.paramstyle
+        sql = "INSERT into %s (%s) VALUES (%s)" % (self._db_table, ','.join(columns), ','.join(['{}']*len(columns)))
+        sql, _ = prepare_sql(sql, paramstyle, columns)
+        logger.debug('Executing SQL for many rows: %s', sql)
+
+        n = 0
+        batch = [sql_params(paramstyle, values(first))]
+        with self._connection() as c:
+            with self._cursor(c) as cur:
+                for row in rows:
+                    if len(batch) == batch_size:
+                        cur.executemany(sql, batch)
+                        n += len(batch)
+                        batch = []
+                    batch.append(sql_params(paramstyle, values(row)))
+                cur.executemany(sql, batch)
+                n += len(batch)
+                c.commit()
+
+        return n
+
+    def _select_sql(self, columns, condition, vals):
+        # Build up SQL with optional columns and conditions
+        columns = columns or ("*",)
+        sql = ["SELECT %s FROM %s" % (','.join(columns), self._db_table,)]
+        if condition:
+            sql.append(" WHERE ")
+            sql.append(condition)
+        return prepare_sql(''.join(sql), self._db_drv.paramstyle, vals)
+
     def select(self, columns=None, condition=None, vals=()):
         """
         Returns the selected values from the table. Users can constrain the
@@ -1058,20 +1816,38 @@ class RDBMSDrop(AbstractDROP):
         with self._connection() as c:
             with self._cursor(c) as cur:
 
-                # Build up SQL with optional columns and conditions
-                columns = columns or ("*",)
-                sql = ["SELECT %s FROM %s" % (','.join(columns), self._db_table,)]
-                if condition:
-                    sql.append(" WHERE ")
-                    sql.append(condition)
-
                 # Go, go, go!
-                sql, vals = prepare_sql(''.join(sql), self._db_drv.paramstyle, vals)
+                sql, vals = self._select_sql(columns, condition, vals)
+                logger.debug('Executing SQL with parameters: %s / %r', sql, vals)
+                cur.execute(sql, vals)
+                rows = cur.fetchall() if cur.description else []
+
+                # Don't leave a read transaction open on a pooled connection
+                c.rollback()
+                return rows
+
+    def select_iter(self, columns=None, condition=None, vals=(), batch_size=1000):
+        """
+        Like `select`, but yields the selected rows one by one, fetching them
+        from the database in blocks of ``batch_size`` rows. Unlike `select`,
+        the whole result set is never held in memory at once. The underlying
+        connection is in use until the iteration finishes (or the iterator is
+        closed).
+        """
+        with self._connection() as c:
+            with self._cursor(c) as cur:
+
+                sql, vals = self._select_sql(columns, condition, vals)
                 logger.debug('Executing SQL with parameters: %s / %r', sql, vals)
                 cur.execute(sql, vals)
                 if cur.description:
-                    return cur.fetchall()
-                return []
+                    while True:
+                        rows = cur.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield row
+                c.rollback()
 
     @property
     def dataURL(self):
@@ -1088,9 +1864,13 @@ class ContainerDROP(AbstractDROP):
     attention to its "children" DROPs if I/O must be performed.
     """
 
+    __slots__ = ('_children',)
+
     def initialize(self, **kwargs):
         super(ContainerDROP, self).initialize(**kwargs)
-        self._children = []
+        # Lazily created on the first addChild() call; notably AppDROPs are
+        # ContainerDROPs but rarely have any children
+        self._children = None
 
     #===========================================================================
     # No data-related operations should actually be called in Container DROPs
@@ -1109,6 +1889,8 @@ class ContainerDROP(AbstractDROP):
 
         logger.debug("Adding new child for %r: %r", self, child)
 
+        if self._children is None:
+            self._children = []
         self._children.append(child)
         child.parent = self
 
@@ -1129,7 +1911,7 @@ class ContainerDROP(AbstractDROP):
 
     @property
     def children(self):
-        return self._children[:]
+        return self._children[:] if self._children else []
 
     def exists(self):
         if self._children:
@@ -1146,6 +1928,8 @@ class DirectoryContainer(ContainerDROP):
     represented by this DirectoryContainer.
     """
 
+    __slots__ = ('_path',)
+
     def initialize(self, **kwargs):
         ContainerDROP.initialize(self, **kwargs)
 
@@ -1212,6 +1996,8 @@ class AppDROP(ContainerDROP):
     an streaming input); for these cases see the `BarrierAppDROP`.
     '''
 
+    __slots__ = ('_inputs', '_outputs', '_streamingInputs', '_execStatus')
+
     def initialize(self, **kwargs):
 
         super(AppDROP, self).initialize(**kwargs)
@@ -1304,7 +2090,8 @@ class AppDROP(ContainerDROP):
         """
         Callback invoked when `data` has been written into the DROP with
         UID `uid` (which is one of the streaming inputs of this AppDROP).
-        By default no action is performed
+        `data` is either a bytes object or a read-only memoryview that is only
+        valid during this call. By default no action is performed
         """
 
     @property
@@ -1319,7 +2106,9 @@ class AppDROP(ContainerDROP):
         if self._execStatus == execStatus:
             return
         self._execStatus = execStatus
-        self._fire('execStatus', execStatus=execStatus)
+        listeners = self._listenersFor('execStatus')
+        if listeners:
+            self._deliverEvent(listeners, ExecStatusEvent('execStatus', self._oid, self._uid, execStatus))
 
     def _notifyAppIsFinished(self):
         """
@@ -1329,7 +2118,10 @@ class AppDROP(ContainerDROP):
         this method.
         """
         logger.debug("Moving %r to %s", self, "FINISHED" if self._execStatus is AppDROPStates.FINISHED else "ERROR")
-        self._fire('producerFinished', status=self.status, execStatus=self.execStatus)
+        listeners = self._listenersFor('producerFinished')
+        if listeners:
+            e = ProducerFinishedEvent('producerFinished', self._oid, self._uid, self.status, self._execStatus)
+            self._deliverEvent(listeners, e)
 
 class InputFiredAppDROP(AppDROP):
     """
@@ -1355,7 +2147,22 @@ class InputFiredAppDROP(AppDROP):
     The threshold is a value within 0 and 100 that indicates the tolerance
     to erroneous effective inputs, and after which the application will not be
     run but moved to the ERROR state itself instead.
+
+    Applications whose `run` method is CPU-bound python code can set the
+    `run_in_process` class attribute (or the `run_in_process` argument of
+    individual DROPs) to execute their `run` method in a pool of worker
+    processes instead, so they don't compete for the GIL with the rest of the
+    applications (see `dfms.process_pool` for details).
     """
+
+    __slots__ = ('_completedInputs', '_errorInputs', '_input_error_threshold',
+                 '_n_effective_inputs', '_n_tries', '_priority', '_executor',
+                 '_run_in_process')
+
+    # Whether the run() method of this class is executed by default in a
+    # separate worker process or not
+    run_in_process = False
+
     def initialize(self, **kwargs):
         super(InputFiredAppDROP, self).initialize(**kwargs)
         self._completedInputs = []
@@ -1378,6 +2185,20 @@ class InputFiredAppDROP(AppDROP):
         if self._n_tries < 1:
             raise InvalidDropException(self, 'Invalid n_tries, must be a positive number')
 
+        # The priority with which this application is executed when given an
+        # executor (see async_execute). Node Managers usually set it at
+        # deployment time to the length of the critical path after this app
+        self._priority = int(self._getArg(kwargs, 'priority', 0))
+
+        # An object with a submit(fn, priority, cancel) method, used by
+        # async_execute to schedule our execution; normally given by our Node
+        # Manager
+        self._executor = None
+
+        self._run_in_process = _boolValue(self._getArg(kwargs, 'run_in_process', self.run_in_process))
+        if self._run_in_process is None:
+            raise InvalidDropException(self, "%r specifies an invalid run_in_process value" % (self,))
+
     def addStreamingInput(self, streamingInputDrop, back=True):
         raise InvalidRelationshipException(DROPRel(streamingInputDrop, DROPLinkType.STREAMING_INPUT, self),
                                            "InputFiredAppDROPs don't accept streaming inputs")
@@ -1398,15 +2219,18 @@ class InputFiredAppDROP(AppDROP):
             raise Exception("%r: More effective inputs (%d) than inputs (%d)" % \
                             (self, self._n_effective_inputs, n_inputs))
 
-        if drop_state == DROPStates.ERROR:
-            self._errorInputs.append(uid)
-        elif drop_state == DROPStates.COMPLETED:
-            self._completedInputs.append(uid)
-        else:
+        if drop_state not in (DROPStates.ERROR, DROPStates.COMPLETED):
             raise Exception('Invalid DROP state in dropCompleted: %s' % drop_state)
 
-        error_len = len(self._errorInputs)
-        ok_len = len(self._completedInputs)
+        # Inputs might complete concurrently, but only one of them must
+        # see that all the effective inputs have completed
+        with self._lock:
+            if drop_state == DROPStates.ERROR:
+                self._errorInputs.append(uid)
+            else:
+                self._completedInputs.append(uid)
+            error_len = len(self._errorInputs)
+            ok_len = len(self._completedInputs)
 
         if (error_len + ok_len) == n_eff_inputs:
             # calculate the number of errors that have already occurred
@@ -1424,16 +2248,47 @@ class InputFiredAppDROP(AppDROP):
             else:
                 self.async_execute()
 
+    @property
+    def priority(self):
+        """
+        The priority with which this application is executed by its executor.
+        Higher values are executed first.
+        """
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority):
+        self._priority = priority
+
+    @property
+    def executor(self):
+        """
+        The executor used to schedule the execution of this application. If
+        `None`, each execution runs on a new thread.
+        """
+        return self._executor
+
+    @executor.setter
+    def executor(self, executor):
+        self._executor = executor
+
     def async_execute(self):
         # Return immediately, but schedule the execution of this app
-        # If we have been given a thread pool use that
-        if hasattr(self, '_tp'):
-            self._tp.apply_async(self.execute)
+        # If we have been given an executor use that
+        executor = self._executor
+        if executor is not None:
+            executor.submit(self.execute, self._priority, self._cancelExecution)
         else:
             t = threading.Thread(target=self.execute)
             t.daemon = 1
             t.start()
 
+    def _cancelExecution(self):
+        # Called by our executor when it discards our scheduled execution
+        logger.warning("Execution of %r was cancelled", self)
+        self.execStatus = AppDROPStates.ERROR
+        self.status = DROPStates.ERROR
+
     def execute(self):
         """
         Manually trigger the execution of this application.
@@ -1452,7 +2307,7 @@ class InputFiredAppDROP(AppDROP):
         self.execStatus = AppDROPStates.RUNNING
         while tries < self._n_tries:
             try:
-                self.run()
+                self._run()
                 self.execStatus = AppDROPStates.FINISHED
                 break
             except:
@@ -1467,6 +2322,15 @@ class InputFiredAppDROP(AppDROP):
         self.status = drop_state
         self._notifyAppIsFinished()
 
+    def _run(self):
+        if self._run_in_process:
+            from dfms import process_pool
+            if process_pool.can_run_in_process(self):
+                process_pool.run_in_process(self, getattr(self._executor, 'process_pool', None))
+                return
+            logger.debug("%r has outputs with streaming consumers, running it locally", self)
+        self.run()
+
     def run(self):
         """
         Run this application. It can be safely assumed that at this point all
@@ -1482,6 +2346,9 @@ class BarrierAppDROP(InputFiredAppDROP):
     A BarrierAppDROP is an InputFireAppDROP that waits for all its inputs to
     complete, effectively blocking the flow of the graph execution.
     """
+
+    __slots__ = ()
+
     def initialize(self, **kwargs):
         # Blindly override existing value if any
         kwargs['n_effective_inputs'] = -1
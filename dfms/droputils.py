@@ -25,12 +25,13 @@ Utility methods and classes to be used when interacting with DROPs
 
 import collections
 import logging
+import os
 import re
 import threading
 import traceback
 
 from dfms.ddap_protocol import DROPStates
-from dfms.drop import AppDROP
+from dfms.drop import AppDROP, AbstractDROP
 from dfms.io import IOForURL, OpenMode
 
 
@@ -91,31 +92,90 @@ class DROPWaiterCtx(object):
             self._test.assertTrue(evt.wait(to), "Waiting for DROP failed with timeout %d" % to)
 
 
-def allDropContents(drop):
+def openWithBuffer(drop):
+    """
+    Opens `drop` for reading, returning its descriptor and its `buffer`, or
+    None if the DROP doesn't support it. Only local DROPs are asked for their
+    buffers, since remote ones cannot share their memory with us.
+    """
+    if not isinstance(drop, AbstractDROP):
+        return drop.open(), None
+    desc = drop.open(mmap=True)
+    try:
+        return desc, drop.buffer(desc)
+    except NotImplementedError:
+        return desc, None
+
+def allDropContents(drop, bufsize=65536):
     '''
-    Returns all the data contained in a given DROP
+    Returns all the data contained in a given DROP. If the DROP supports it
+    the data is copied in one go from its `buffer`, otherwise it is read in
+    bufsize steps
     '''
-    desc = drop.open()
-    read = drop.read
-    buf = read(desc)
-    allContents = buf
-    while buf:
-        buf = read(desc)
-        allContents += buf
-    drop.close(desc)
-    return allContents
-
-def copyDropContents(source, target, bufsize=4096):
+    desc, buf = openWithBuffer(drop)
+    try:
+        if buf is not None:
+            return buf.tobytes()
+        read = drop.read
+        chunks = []
+        buf = read(desc, bufsize)
+        while buf:
+            chunks.append(buf)
+            buf = read(desc, bufsize)
+        return b''.join(chunks)
+    finally:
+        drop.close(desc)
+
+def copyDropContents(source, target, bufsize=65536):
     '''
-    Manually copies data from one DROP into another, in bufsize steps
+    Copies the data of one DROP into another. Depending on what both DROPs
+    support, the data is:
+
+     * copied by the kernel, if it goes from a file into another (see
+       `AbstractDROP.writeFromFile`),
+     * taken from the source's `buffer` without further copies, in bufsize
+       steps, or
+     * read in bufsize steps into a single, reused buffer.
     '''
+    if not isinstance(source, AbstractDROP):
+        desc = source.open()
+        try:
+            buf = source.read(desc, bufsize)
+            while buf:
+                target.write(buf)
+                buf = source.read(desc, bufsize)
+        finally:
+            source.close(desc)
+        return
+
     desc = source.open()
-    read = source.read
-    buf = read(desc, bufsize)
-    while buf:
-        target.write(buf)
-        buf = read(desc, bufsize)
-    source.close(desc)
+    try:
+        if isinstance(target, AbstractDROP) and _kernelCopy(source, desc, target):
+            return
+        try:
+            buf = source.buffer(desc)
+        except NotImplementedError:
+            buf = None
+        if buf is not None:
+            for start in range(0, len(buf), bufsize):
+                target.write(buf[start:start + bufsize])
+            return
+        buf = bytearray(bufsize)
+        view = memoryview(buf)
+        n = source.readinto(desc, buf)
+        while n:
+            target.write(view[:n])
+            n = source.readinto(desc, buf)
+    finally:
+        source.close(desc)
+
+def _kernelCopy(source, desc, target):
+    try:
+        fd = source.fileno(desc)
+        target.writeFromFile(fd, 0, os.fstat(fd).st_size, checksum=source.checksum)
+        return True
+    except NotImplementedError:
+        return False
 
 def getUpstreamObjects(drop):
     """
@@ -212,6 +272,43 @@ def breadFirstTraverse(toVisit):
         visited.update(next_visits)
         toVisit += next_visits
 
+def get_critical_path_lengths(nodes, weight=None):
+    """
+    Returns a dictionary with the length of the remaining critical path of each
+    DROP of the graph pointed by `nodes`, keyed by UID. The remaining critical
+    path of a DROP is the longest (i.e., heaviest) path starting at the DROP
+    and ending at any of the graph leaves.
+
+    `weight` is a function returning the weight of a given DROP, and defaults
+    to 1 for AppDROPs and 0 for any other DROP. Nodes that are not DROPs
+    (e.g., proxies to DROPs living in other Node Managers) are ignored.
+
+    This implementation is non-recursive.
+    """
+
+    if weight is None:
+        weight = lambda drop: 1 if isinstance(drop, AppDROP) else 0
+
+    def downstream(drop):
+        return [d for d in getDownstreamObjects(drop) if isinstance(d, AbstractDROP)]
+
+    lengths = {}
+    for root in listify(nodes):
+        toVisit = [(root, False)]
+        while toVisit:
+            drop, expanded = toVisit.pop()
+            if drop.uid in lengths:
+                continue
+            if expanded:
+                children = [lengths[d.uid] for d in downstream(drop)]
+                lengths[drop.uid] = weight(drop) + (max(children) if children else 0)
+            else:
+                # Visit the node again after all its downstream nodes
+                toVisit.append((drop, True))
+                toVisit.extend([(d, False) for d in downstream(drop) if d.uid not in lengths])
+
+    return lengths
+
 def listify(o):
     """
     If `o` is already a list return it as is; if `o` is a tuple returns a list
@@ -20,7 +20,6 @@
 #    MA 02111-1307  USA
 #
 
-import collections
 import logging
 
 
@@ -30,17 +29,83 @@ class Event(object):
     """
     An event sent through the dfms framework.
 
-    Events have at least a field describing the type of event they are (instead
-    of having subclasses of the `Event` class), and therefore this class makes
-    sure that at least that field exists. Any other piece of information can be
-    attached to individual instances of this class, depending on the event type.
+    Events have at least a field describing the type of event they are, plus the
+    oid and uid of the object that fired them. Since a handful of event types
+    are fired for every single DROP the most common ones are represented by
+    the `__slots__`-based subclasses below, which carry a fixed set of fields
+    and avoid a per-instance dictionary. Events carrying any other piece of
+    information use the `GenericEvent` class instead.
+
+    The `session_id` field is not set by the firer, but by the listeners that
+    forward events to other Node Managers.
     """
 
-    def __init__(self):
-        self.type = None
+    __slots__ = ('type', 'oid', 'uid', 'session_id')
+
+    def __init__(self, type=None, oid=None, uid=None):  # @ReservedAssignment
+        self.type = type
+        self.oid = oid
+        self.uid = uid
+        self.session_id = None
+
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        state.update(getattr(self, '__dict__', {}))
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            setattr(self, k, v)
 
     def __repr__(self, *args, **kwargs):
-        return '<Event %r>' % (self.__dict__)
+        return '<Event %r>' % (self.__getstate__())
+
+class StatusEvent(Event):
+    """
+    An event carrying a DROP status, fired with the ``status`` and
+    ``dropCompleted`` types.
+    """
+
+    __slots__ = ('status',)
+
+    def __init__(self, type=None, oid=None, uid=None, status=None):  # @ReservedAssignment
+        super(StatusEvent, self).__init__(type, oid, uid)
+        self.status = status
+
+class ExecStatusEvent(Event):
+    """
+    An event carrying the execution status of an AppDROP, fired with the
+    ``execStatus`` type.
+    """
+
+    __slots__ = ('execStatus',)
+
+    def __init__(self, type=None, oid=None, uid=None, execStatus=None):  # @ReservedAssignment
+        super(ExecStatusEvent, self).__init__(type, oid, uid)
+        self.execStatus = execStatus
+
+class ProducerFinishedEvent(Event):
+    """
+    An event fired with the ``producerFinished`` type by an AppDROP once it has
+    finished its execution, carrying both its status and execution status.
+    """
+
+    __slots__ = ('status', 'execStatus')
+
+    def __init__(self, type=None, oid=None, uid=None, status=None, execStatus=None):  # @ReservedAssignment
+        super(ProducerFinishedEvent, self).__init__(type, oid, uid)
+        self.status = status
+        self.execStatus = execStatus
+
+class GenericEvent(Event):
+    """
+    An event to which any piece of information can be attached, depending on
+    the event type.
+    """
 
 class EventFirer(object):
     """
@@ -54,12 +119,24 @@ class EventFirer(object):
     Listeners can specify the type of event they listen to at subscription time,
     or can also prefer to receive all events fired by this object if they wish
     so.
+
+    The tuple of listeners that should be called for each event type is computed
+    at subscription time, so firing an event doesn't need to compute it, and
+    can quickly return without creating the event if nobody is listening.
     """
 
     __ALL_EVENTS = object()
 
+    __slots__ = ('_listeners', '_dispatch')
+
     def __init__(self):
-        self._listeners = collections.defaultdict(list)
+        # Both lazily created on the first subscription, most firers never
+        # get one.
+        # _listeners holds the listeners subscribed to each event type, while
+        # _dispatch holds the full tuple of listeners to be called for each
+        # event type (i.e., including those subscribed to all events)
+        self._listeners = None
+        self._dispatch = None
 
     def subscribe(self, listener, eventType=None):
         """
@@ -69,7 +146,10 @@ class EventFirer(object):
         """
         logger.debug('Adding listener to %r eventType=%s: %r', self, eventType, listener)
         eventType = eventType or EventFirer.__ALL_EVENTS
-        self._listeners[eventType].append(listener)
+        if self._listeners is None:
+            self._listeners = {}
+        self._listeners[eventType] = self._listeners.get(eventType, ()) + (listener,)
+        self._updateDispatch()
 
     def unsubscribe(self, listener, eventType=None):
         """
@@ -78,8 +158,44 @@ class EventFirer(object):
         logger.debug('Removing listener to %r eventType=%s: %r', self, eventType, listener)
 
         eventType = eventType or EventFirer.__ALL_EVENTS
-        if listener in self._listeners[eventType]:
-            self._listeners[eventType].remove(listener)
+        if self._listeners is None:
+            return
+        listeners = list(self._listeners.get(eventType, ()))
+        if listener in listeners:
+            listeners.remove(listener)
+            if listeners:
+                self._listeners[eventType] = tuple(listeners)
+            else:
+                del self._listeners[eventType]
+            self._updateDispatch()
+
+    def _updateDispatch(self):
+        allEvents = EventFirer.__ALL_EVENTS
+        allListeners = self._listeners.get(allEvents, ())
+        dispatch = {}
+        for eventType, listeners in self._listeners.items():
+            if eventType is allEvents:
+                continue
+            dispatch[eventType] = listeners + allListeners
+        if allListeners:
+            dispatch[allEvents] = allListeners
+
+        # A single reference assignment, so firing events concurrently with
+        # this method sees either the old or the new dispatch table
+        self._dispatch = dispatch or None
+
+    def _listenersFor(self, eventType):
+        """
+        Returns the tuple of listeners that should receive an event of
+        `eventType`, which is empty if no-one is listening.
+        """
+        dispatch = self._dispatch
+        if dispatch is None:
+            return ()
+        listeners = dispatch.get(eventType, None)
+        if listeners is None:
+            return dispatch.get(EventFirer.__ALL_EVENTS, ())
+        return listeners
 
     def _fireEvent(self, eventType, **attrs):
         """
@@ -89,22 +205,21 @@ class EventFirer(object):
         the event being sent.
         """
 
-        # Which listeners should we call?
-        listeners = []
-        if eventType in self._listeners:
-            listeners += self._listeners[eventType]
-        if EventFirer.__ALL_EVENTS in self._listeners:
-            listeners += self._listeners[EventFirer.__ALL_EVENTS]
+        listeners = self._listenersFor(eventType)
         if not listeners:
-            logger.debug('No listeners found for eventType=%s', eventType)
             return
 
         # Now that we are sure there are listeners for our event
         # create it and send it to all of them
-        e = Event()
-        e.type = eventType
+        e = GenericEvent(eventType)
         for k, v in attrs.items():
             setattr(e, k, v)
+        self._deliverEvent(listeners, e)
 
+    def _deliverEvent(self, listeners, e):
+        """
+        Delivers the already created event `e` to the given `listeners`, as
+        obtained from `self._listenersFor`.
+        """
         for l in listeners:
-            l.handleEvent(e)
\ No newline at end of file
+            l.handleEvent(e)
@@ -33,7 +33,7 @@ from dfms.apps.socket_listener import SocketListenerApp
 from dfms.ddap_protocol import DROPRel, DROPLinkType
 from dfms.drop import ContainerDROP, InMemoryDROP, \
     FileDROP, NgasDROP, LINKTYPE_NTO1_PROPERTY, \
-    LINKTYPE_1TON_APPEND_METHOD, NullDROP
+    LINKTYPE_1TON_APPEND_METHOD, NullDROP, SharedMemoryDROP
 from dfms.exceptions import InvalidGraphException
 from dfms.json_drop import JsonDROP
 from dfms.s3_drop import S3DROP
@@ -41,6 +41,7 @@ from dfms.s3_drop import S3DROP
 
 STORAGE_TYPES = {
     'memory': InMemoryDROP,
+    'shm'   : SharedMemoryDROP,
     'file'  : FileDROP,
     'ngas'  : NgasDROP,
     'null'  : NullDROP,
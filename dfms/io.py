@@ -20,18 +20,30 @@
 #    MA 02111-1307  USA
 #
 from abc import abstractmethod, ABCMeta
+import errno
+import fcntl
 import logging
+import mmap
 import os
+import struct
+import tempfile
+import weakref
+import zlib
 
-from six import BytesIO
+import six
 import six.moves.urllib.parse as urlparse  # @UnresolvedImport
 
 from dfms import ngaslite
 from dfms import shoreClient
+from dfms.ddap_protocol import CompressionTypes
 
 
 logger = logging.getLogger(__name__)
 
+# Directory where POSIX shared memory objects are visible as files. Where
+# there is none we fall back to a regular temporary directory
+SHM_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
 class OpenMode:
     OPEN_WRITE, OPEN_READ = range(2)
 
@@ -64,13 +76,19 @@ class DataIO(object):
         Opens the underlying storage where the data represented by this instance
         is stored. Depending on the value of `mode` subsequent calls to
         `self.read` or `self.write` will succeed or fail.
+
+        When opening for writing, an `expectedSize` keyword argument with
+        the amount of bytes that will be written can be given, which some
+        classes use to preallocate their storage.
         """
         self._mode = mode
         self._desc = self._open(**kwargs)
 
     def write(self, data, **kwargs):
         """
-        Writes `data` into the storage
+        Writes `data` into the storage. `data` can be a bytes object or any
+        other object supporting the buffer protocol, like the read-only
+        memoryviews given by `dfms.drop.AbstractDROP.write`.
         """
         if self._mode is None:
             raise ValueError('Writing operation attempted on closed DataIO object')
@@ -78,6 +96,20 @@ class DataIO(object):
             raise ValueError('Writing operation attempted on write-only DataIO object')
         return self._write(data, **kwargs)
 
+    def writev(self, buffers, **kwargs):
+        """
+        Writes all the objects in the `buffers` sequence (which, like `data`
+        in `write`, can be bytes or any other buffer-protocol objects) one
+        after the other into the storage, and returns the number of bytes
+        written. DataIO classes that can do this in a single operation (e.g.,
+        with writev(2)) do so.
+        """
+        if self._mode is None:
+            raise ValueError('Writing operation attempted on closed DataIO object')
+        if self._mode == OpenMode.OPEN_READ:
+            raise ValueError('Writing operation attempted on write-only DataIO object')
+        return self._writev(buffers, **kwargs)
+
     def read(self, count, **kwargs):
         """
         Reads `count` bytes from the underlying storage.
@@ -88,6 +120,67 @@ class DataIO(object):
             raise ValueError('Reading operation attempted on write-only DataIO object')
         return self._read(count, **kwargs)
 
+    def readinto(self, buf, **kwargs):
+        """
+        Reads up to `len(buf)` bytes from the underlying storage into the
+        writable buffer `buf`, returning the number of bytes read.
+        """
+        if self._mode is None:
+            raise ValueError('Reading operation attempted on closed DataIO object')
+        if self._mode == OpenMode.OPEN_WRITE:
+            raise ValueError('Reading operation attempted on write-only DataIO object')
+        return self._readinto(buf, **kwargs)
+
+    def seek(self, offset, whence=0, **kwargs):
+        """
+        Moves the position from which data is read to `offset`, interpreted
+        like in the `seek` method of file objects, and returns the new
+        position. Only DataIO classes with random access to their data
+        support this operation; the rest raise `NotImplementedError`.
+        """
+        if self._mode is None:
+            raise ValueError('Seek operation attempted on closed DataIO object')
+        if self._mode == OpenMode.OPEN_WRITE:
+            raise ValueError('Seek operation attempted on write-only DataIO object')
+        return self._seek(offset, whence)
+
+    def fileno(self):
+        """
+        Returns the OS-level file descriptor of the underlying storage. Only
+        DataIO classes backed by a file support this operation; the rest
+        raise `NotImplementedError`.
+        """
+        if self._mode is None:
+            raise ValueError('File descriptor requested on closed DataIO object')
+        return self._fileno()
+
+    def copyFrom(self, fd, offset, count):
+        """
+        Writes `count` bytes read from offset `offset` of the OS-level file
+        descriptor `fd` into the storage, letting the kernel copy them without
+        passing through user space. Returns the number of bytes copied, which
+        is less than `count` only if the end of `fd` is reached. DataIO
+        classes that cannot do this raise `NotImplementedError`.
+        """
+        if self._mode is None:
+            raise ValueError('Writing operation attempted on closed DataIO object')
+        if self._mode == OpenMode.OPEN_READ:
+            raise ValueError('Writing operation attempted on write-only DataIO object')
+        return self._copyFrom(fd, offset, count)
+
+    def buffer(self):
+        """
+        Returns a read-only memoryview over all the data, which remains valid
+        until this object is closed. Only DataIO classes that can give access
+        to their data without copying it support this operation; the rest
+        raise `NotImplementedError`.
+        """
+        if self._mode is None:
+            raise ValueError('Buffer requested on closed DataIO object')
+        if self._mode == OpenMode.OPEN_WRITE:
+            raise ValueError('Buffer requested on write-only DataIO object')
+        return self._buffer()
+
     def close(self, **kwargs):
         """
         Closes the underlying storage where the data represented by this
@@ -123,9 +216,70 @@ class DataIO(object):
     @abstractmethod
     def _write(self, data, **kwargs): pass
 
+    def _writev(self, buffers, **kwargs):
+        # Joining the buffers is cheaper than writing them one by one
+        return self._write(b''.join(buffers), **kwargs)
+
     @abstractmethod
     def _close(self, **kwargs): pass
 
+    def _readinto(self, buf, **kwargs):
+        data = self._read(len(buf), **kwargs)
+        if not data:
+            return 0
+        n = len(data)
+        buf[:n] = data
+        return n
+
+    def _seek(self, offset, whence=0):
+        raise NotImplementedError("%s doesn't support seek()" % (self.__class__.__name__,))
+
+    def _fileno(self):
+        raise NotImplementedError("%s doesn't support fileno()" % (self.__class__.__name__,))
+
+    def _copyFrom(self, fd, offset, count):
+        raise NotImplementedError("%s doesn't support copyFrom()" % (self.__class__.__name__,))
+
+    def _buffer(self):
+        raise NotImplementedError("%s doesn't support buffer()" % (self.__class__.__name__,))
+
+def _kernelCopy(infd, outfd, offset, count):
+    """
+    Copies `count` bytes from offset `offset` of `infd` into the current
+    position of `outfd` using copy_file_range(2), which can even avoid copying
+    the data on filesystems with reflinks, or sendfile(2) otherwise. Returns
+    the number of bytes copied.
+    """
+    copied = 0
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    if copy_file_range is not None:
+        try:
+            while copied < count:
+                n = copy_file_range(infd, outfd, count - copied, offset + copied)
+                if not n:
+                    return copied
+                copied += n
+            return copied
+        except OSError as e:
+            # Not supported for this pair of files, or by this kernel
+            if copied or e.errno not in (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile is None:
+        raise NotImplementedError("No kernel copy support in this platform")
+    try:
+        while copied < count:
+            n = sendfile(outfd, infd, offset + copied, count - copied)
+            if not n:
+                break
+            copied += n
+    except OSError as e:
+        if copied or e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise
+        raise NotImplementedError("sendfile(2) not supported for these files")
+    return copied
+
 class NullIO(DataIO):
     """
     A DataIO that stores no data
@@ -140,6 +294,9 @@ class NullIO(DataIO):
     def _write(self, data, **kwargs):
         return len(data)
 
+    def _copyFrom(self, fd, offset, count):
+        return count
+
     def _close(self, **kwargs):
         pass
 
@@ -172,31 +329,94 @@ class ErrorIO(DataIO):
     def delete(self):
         raise NotImplementedError()
 
+# The buffers of the in-memory DROPs of this process, by the id used in their
+# mem:// URLs. Entries go away together with their buffers
+_memoryBuffers = weakref.WeakValueDictionary()
+
+def registerMemoryBuffer(buf):
+    """
+    Makes the BytesIO object `buf` reachable through IOForURL, and returns
+    the ``mem://`` URL that resolves to it. Only URLs given to IOForURL within
+    this same process can be resolved. The registration lasts until `buf`
+    is deleted through a MemoryIO, or garbage collected.
+    """
+    _memoryBuffers[id(buf)] = buf
+    return "mem://%s/%d/%d" % (os.uname()[1], os.getpid(), id(buf))
+
 class MemoryIO(DataIO):
     """
     A DataIO class that reads/write from/into the BytesIO object given at
-    construction time
+    construction time.
+
+    Readers share the data of the BytesIO object instead of getting a copy of
+    it. If opened with ``zeroCopy=True``, `read` returns memoryview slices of
+    the data instead of bytes, and no data is copied at all.
     """
 
     def __init__(self, buf, **kwargs):
+        super(MemoryIO, self).__init__()
         self._buf = buf
+        self._preallocated = False
+        self._pos = 0
+        self._zeroCopy = False
 
-    def _open(self, **kwargs):
+    def _open(self, expectedSize=-1, zeroCopy=False, **kwargs):
         if self._mode == OpenMode.OPEN_WRITE:
+            # Grow the buffer only once to its final size and overwrite it
+            # afterwards. It's truncated to the size actually written on close
+            if expectedSize > 0 and not self._buf.tell():
+                self._buf.seek(expectedSize - 1)
+                self._buf.write(b'\0')
+                self._buf.seek(0)
+                self._preallocated = True
             return self._buf
-        else:
-            return BytesIO(self._buf.getvalue())
+
+        # Since python 3.5 BytesIO.getvalue() returns its internal bytes object
+        # (copying it only if written to later) instead of a copy of the data.
+        # Unlike getbuffer() this doesn't prevent the BytesIO from being closed
+        # while readers still hold views of the data
+        self._pos = 0
+        self._zeroCopy = zeroCopy
+        return memoryview(self._buf.getvalue())
 
     def _write(self, data, **kwargs):
         self._desc.write(data)
         return len(data)
 
     def _read(self, count=4096, **kwargs):
-        return self._desc.read(count)
+        end = len(self._desc) if count < 0 else self._pos + count
+        data = self._desc[self._pos:end]
+        self._pos += len(data)
+        return data if self._zeroCopy else data.tobytes()
+
+    def _readinto(self, buf, **kwargs):
+        n = min(len(buf), len(self._desc) - self._pos)
+        if n <= 0:
+            return 0
+        buf[:n] = self._desc[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def _seek(self, offset, whence=0):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += len(self._desc)
+        if offset < 0:
+            raise ValueError('Negative seek position %d' % (offset,))
+        self._pos = offset
+        return offset
+
+    def _buffer(self):
+        return self._desc
 
     def _close(self, **kwargs):
         if self._mode == OpenMode.OPEN_READ:
-            self._desc.close()
+            # Views given to our readers stay valid after this
+            if hasattr(self._desc, 'release'):
+                self._desc.release()
+        elif self._preallocated:
+            self._buf.truncate(self._buf.tell())
         # If we're writing we don't close the descriptor because it's our
         # self._buf, which won't be readable afterwards
 
@@ -204,27 +424,287 @@ class MemoryIO(DataIO):
         return not self._buf.closed
 
     def delete(self):
+        if _memoryBuffers.get(id(self._buf)) is self._buf:
+            del _memoryBuffers[id(self._buf)]
         self._buf.close()
 
+#: Alignment of the buffer, sizes and offsets used in O_DIRECT writes
+DIRECT_IO_ALIGNMENT = 4096
+
+# Maximum number of buffers given to a single writev(2) call
+_IOV_MAX = os.sysconf('SC_IOV_MAX') if 'SC_IOV_MAX' in os.sysconf_names else 1024
+
+# Number of bytes read or written between posix_fadvise(DONTNEED) calls
+_DONTNEED_STEP = 8 * 1024**2
+
+_FADVISE_HINTS = {
+    'normal': 'POSIX_FADV_NORMAL',
+    'sequential': 'POSIX_FADV_SEQUENTIAL',
+    'random': 'POSIX_FADV_RANDOM',
+    'willneed': 'POSIX_FADV_WILLNEED',
+    'dontneed': 'POSIX_FADV_DONTNEED',
+    'noreuse': 'POSIX_FADV_NOREUSE'
+}
+
+def fadviseHints(hints):
+    """
+    Returns the tuple of posix_fadvise hint names given in `hints`, either as
+    a comma-separated string or as a sequence of names. Raises `ValueError`
+    if any of them is unknown.
+    """
+    if not hints:
+        return ()
+    if isinstance(hints, six.string_types):
+        hints = hints.split(',')
+    hints = tuple(h.strip().lower() for h in hints)
+    unknown = [h for h in hints if h not in _FADVISE_HINTS]
+    if unknown:
+        raise ValueError("Unknown posix_fadvise hints: %r" % (unknown,))
+    return hints
+
+def _fadvise(fd, offset, length, hint):
+    # Hints are just that, hints; there's nothing to do if they can't be given
+    advice = getattr(os, _FADVISE_HINTS[hint], None)
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        logger.debug("posix_fadvise(%s) failed", hint, exc_info=True)
+
+class _DirectWriter(object):
+    """
+    A write-only file object over a file opened with O_DIRECT. Data is gathered
+    into an aligned buffer, which is written when full; the unaligned tail of
+    the data is written without O_DIRECT when closing.
+    """
+
+    def __init__(self, fd, bufsize):
+        bufsize = max(bufsize, DIRECT_IO_ALIGNMENT)
+        bufsize -= bufsize % DIRECT_IO_ALIGNMENT
+        self._fd = fd
+        # Anonymous mappings are page-aligned
+        self._buf = mmap.mmap(-1, bufsize)
+        self._view = memoryview(self._buf)
+        self._pos = 0
+        self._written = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        size = len(self._view)
+        offset = 0
+        while offset < len(view):
+            n = min(size - self._pos, len(view) - offset)
+            self._view[self._pos:self._pos + n] = view[offset:offset + n]
+            self._pos += n
+            offset += n
+            if self._pos == size:
+                self._flush(size)
+
+    def _flush(self, n):
+        written = 0
+        while written < n:
+            written += os.write(self._fd, self._view[written:n])
+        self._view[:self._pos - n] = self._view[n:self._pos]
+        self._pos -= n
+        self._written += n
+
+    def flush(self):
+        # Only whole blocks can be written before closing
+        pass
+
+    def tell(self):
+        return self._written + self._pos
+
+    def truncate(self):
+        os.ftruncate(self._fd, self.tell())
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            self._flush(self._pos - self._pos % DIRECT_IO_ALIGNMENT)
+            if self._pos:
+                flags = fcntl.fcntl(self._fd, fcntl.F_GETFL)
+                fcntl.fcntl(self._fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+                self._flush(self._pos)
+        finally:
+            self._view.release()
+            self._buf.close()
+            os.close(self._fd)
+            self._fd = None
+
 class FileIO(DataIO):
+    """
+    A DataIO class that reads/writes from/into a file in the local filesystem.
+
+    When opened for reading, `buffer` returns a read-only memoryview over the
+    memory-mapped file. The file is mapped on the first call to `buffer`, or
+    when opening if `mmap=True` is given.
+
+    The access to the file can be tuned with the following options:
+
+     * `bufferSize`: the size of the buffer of the file object, as given to
+       `open`. Defaults to python's default.
+     * `fadvise`: posix_fadvise hints given for the whole file when opening
+       it (see `fadviseHints`). The ``dontneed`` hint is instead given
+       periodically for the data already read or written, so it doesn't stay
+       in the page cache.
+     * `directIO`: if True, data is written with O_DIRECT, bypassing the page
+       cache altogether, through an aligned buffer of `bufferSize` bytes
+       (rounded down to a multiple of `DIRECT_IO_ALIGNMENT`, and 1 MB by
+       default). Files are written normally on filesystems or platforms that
+       don't support O_DIRECT.
+    """
 
-    def __init__(self, filename, **kwargs):
+    def __init__(self, filename, bufferSize=-1, fadvise=(), directIO=False, **kwargs):
         super(FileIO, self).__init__()
         self._fnm = filename
-
-    def _open(self, **kwargs):
-        flag = 'r' if self._mode is OpenMode.OPEN_READ else 'w'
-        flag += 'b'
-        return open(self._fnm, flag)
+        self._mmap = None
+        self._view = None
+        self._preallocated = False
+        self._bufferSize = bufferSize
+        self._hints = fadviseHints(fadvise)
+        self._directIO = directIO
+        self._advised = 0
+        self._transferred = 0
+
+    def _open(self, mmap=False, expectedSize=-1, **kwargs):
+        desc = None
+        if self._directIO and self._mode == OpenMode.OPEN_WRITE and hasattr(os, 'O_DIRECT'):
+            desc = self._openDirect()
+        if desc is None:
+            flag = 'r' if self._mode is OpenMode.OPEN_READ else 'w'
+            flag += 'b'
+            desc = open(self._fnm, flag, self._bufferSize)
+        self._advised = self._transferred = 0
+        for hint in self._hints:
+            if hint != 'dontneed':
+                _fadvise(desc.fileno(), 0, 0, hint)
+        if mmap and self._mode == OpenMode.OPEN_READ:
+            self._desc = desc
+            self._buffer()
+        elif expectedSize > 0 and self._mode == OpenMode.OPEN_WRITE:
+            self._preallocate(desc, expectedSize)
+        return desc
+
+    def _openDirect(self):
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_DIRECT
+        try:
+            fd = os.open(self._fnm, flags, 0o666)
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            logger.debug("%s doesn't support O_DIRECT, writing normally", self._fnm)
+            return None
+        bufsize = self._bufferSize if self._bufferSize > 0 else 1024**2
+        return _DirectWriter(fd, bufsize)
+
+    def _preallocate(self, desc, size):
+        # Reserving all the space at once avoids fragmentation on disk. The
+        # file is truncated to the size actually written on close
+        try:
+            os.posix_fallocate(desc.fileno(), 0, size)
+            self._preallocated = True
+        except (AttributeError, OSError):
+            logger.debug("Couldn't preallocate %d bytes for %s", size, self._fnm, exc_info=True)
+
+    def _dontneed(self, n):
+        # Drop from the page cache what was read or written since last time
+        self._transferred += n
+        if self._transferred - self._advised >= _DONTNEED_STEP:
+            if self._mode == OpenMode.OPEN_WRITE:
+                self._desc.flush()
+            _fadvise(self._desc.fileno(), self._advised, self._transferred - self._advised, 'dontneed')
+            self._advised = self._transferred
 
     def _read(self, count=4096, **kwargs):
-        return self._desc.read(count)
+        data = self._desc.read(count)
+        if 'dontneed' in self._hints:
+            self._dontneed(len(data))
+        return data
+
+    def _readinto(self, buf, **kwargs):
+        n = self._desc.readinto(buf)
+        if 'dontneed' in self._hints:
+            self._dontneed(n)
+        return n
+
+    def _seek(self, offset, whence=0):
+        return self._desc.seek(offset, whence)
 
     def _write(self, data, **kwargs):
         self._desc.write(data)
+        if 'dontneed' in self._hints and not isinstance(self._desc, _DirectWriter):
+            self._dontneed(len(data))
         return len(data)
 
+    def _writev(self, buffers, **kwargs):
+        if not hasattr(os, 'writev') or isinstance(self._desc, _DirectWriter):
+            return super(FileIO, self)._writev(buffers, **kwargs)
+
+        fd = self._fileno()
+        total = 0
+        for i in range(0, len(buffers), _IOV_MAX):
+            chunk = buffers[i:i + _IOV_MAX]
+            n = os.writev(fd, chunk)
+            total += n
+
+            # Short writes are rare for regular files; just finish them off
+            remaining = sum(len(data) for data in chunk) - n
+            if remaining:
+                rest = b''.join(chunk)[-remaining:]
+                while rest:
+                    n = os.write(fd, rest)
+                    rest = rest[n:]
+                    total += n
+
+        if 'dontneed' in self._hints:
+            self._dontneed(total)
+        return total
+
+    def _fileno(self):
+        # Whoever uses the descriptor directly needs to see all data written so far
+        if self._mode == OpenMode.OPEN_WRITE:
+            self._desc.flush()
+        return self._desc.fileno()
+
+    def _copyFrom(self, fd, offset, count):
+        if isinstance(self._desc, _DirectWriter):
+            raise NotImplementedError("Kernel copies are not supported with O_DIRECT")
+        return _kernelCopy(fd, self._fileno(), offset, count)
+
+    def _buffer(self):
+        if self._view is None:
+            fd = self._desc.fileno()
+            # Empty files cannot be mapped
+            if os.fstat(fd).st_size == 0:
+                self._view = memoryview(b'')
+            else:
+                self._mmap = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+        return self._view
+
     def _close(self, **kwargs):
+        if self._view is not None:
+            view, m = self._view, self._mmap
+            self._view = self._mmap = None
+            try:
+                view.release()
+                if m is not None:
+                    m.close()
+            except BufferError:
+                # Users still hold views over the mapped data; the file is
+                # unmapped when those are garbage collected
+                pass
+        if self._preallocated:
+            self._desc.truncate()
+        if 'dontneed' in self._hints and not isinstance(self._desc, _DirectWriter):
+            self._desc.flush()
+            _fadvise(self._desc.fileno(), 0, 0, 'dontneed')
         self._desc.close()
 
     def getFileName(self):
@@ -236,6 +716,16 @@ class FileIO(DataIO):
     def delete(self):
         os.unlink(self._fnm)
 
+class SharedMemoryIO(FileIO):
+    """
+    A FileIO that reads/writes from/into the POSIX shared memory object with
+    the name given at construction time, and which therefore can be accessed
+    from any process in the same node.
+    """
+
+    def __init__(self, name, **kwargs):
+        super(SharedMemoryIO, self).__init__(os.path.join(SHM_DIR, name), **kwargs)
+
 class ShoreIO(DataIO):
 
     def __init__(self, doid, column, row, rows = 1, address = None, **kwargs):
@@ -280,12 +770,18 @@ class ShoreIO(DataIO):
 
 class NgasIO(DataIO):
     '''
-    A DROP whose data is finally stored into NGAS. Since NGAS doesn't
-    support appending data to existing files, we store all the data temporarily
-    in a file on the local filesystem and then move it to the NGAS destination
+    A DROP whose data is finally stored into NGAS. The NGAS client API
+    doesn't have a way to continually feed an ARCHIVE request with data, so
+    data is written and read using the `ngaslite` module instead, which streams
+    it to and from the server over pooled, keep-alive connections. The NGAS
+    client API is used only to check for the existence of the file.
+
+    If `parallelism` is greater than one, data is read in segments of
+    `segmentSize` bytes fetched over that many concurrent connections.
     '''
 
-    def __init__(self, hostname, fileId, port = 7777, ngasConnectTimeout=2, ngasTimeout=2, length=-1):
+    def __init__(self, hostname, fileId, port = 7777, ngasConnectTimeout=2, ngasTimeout=2, length=-1,
+                 parallelism=1, segmentSize=16*1024**2):
 
         # Check that we actually have the NGAMS client libraries
         try:
@@ -301,6 +797,8 @@ class NgasIO(DataIO):
         self._ngasTimeout        = ngasTimeout
         self._fileId             = fileId
         self._length             = length
+        self._parallelism        = parallelism
+        self._segmentSize        = segmentSize
 
     def _getClient(self):
         from ngamsPClient import ngamsPClient  # @UnresolvedImport
@@ -308,39 +806,24 @@ class NgasIO(DataIO):
 
     def _open(self, **kwargs):
         if self._mode == OpenMode.OPEN_WRITE:
-            # The NGAS client API doesn't have a way to continually feed an ARCHIVE
-            # request with data. Thus the only way we can currently archive data
-            # into NGAS is by accumulating it all on our side and finally
-            # sending it over.
-            self._buf = ''
-            self._writtenDataSize = 0
-        return self._getClient()
+            return ngaslite.beingArchive(self._ngasSrv, self._fileId, port=self._ngasPort, timeout=self._ngasTimeout, length=self._length)
+        return ngaslite.retrieve(self._ngasSrv, self._fileId, port=self._ngasPort, timeout=self._ngasTimeout,
+                                 parallelism=self._parallelism, segmentSize=self._segmentSize)
 
     def _close(self, **kwargs):
-        client = self._desc
         if self._mode == OpenMode.OPEN_WRITE:
-            reply, msg, _, _ = client._httpPost(
-                     client.getHost(), client.getPort(), 'QARCHIVE',
-                     'application/octet-stream', dataRef=self._buf,
-                     pars=[['filename',self._fileId]], dataSource='BUFFER',
-                     dataSize=self._writtenDataSize)
-            self._buf = None
-            if reply != 200:
-                # Probably msg is not enough, we need to unpack the status XML doc
-                # from the returning data and extract the real error message from
-                # there
-                raise Exception(msg)
-
-        # Release the reference to _desc so the client object gets destroyed
+            ngaslite.finishArchive(self._desc, self._fileId)
+        else:
+            self._desc.close()
+
+        # Release the reference to _desc so the connection can be reused
         del self._desc
 
     def _read(self, count, **kwargs):
-        # Read data from NGAS and give it back to our reader
-        self._desc.retrieve2File(self._fileId, cmd="QRETRIEVE")
+        return self._desc.read(count)
 
     def _write(self, data, **kwargs):
-        self._buf += data
-        self._writtenDataSize += len(data)
+        self._desc.write(data)
         return len(data)
 
     def exists(self):
@@ -359,9 +842,13 @@ class NgasLiteIO(DataIO):
 
     The `ngaslite` module doesn't support the STATUS command yet, and because of
     that this class will throw an error if its `exists` method is invoked.
+
+    If `parallelism` is greater than one, data is read in segments of
+    `segmentSize` bytes fetched over that many concurrent connections.
     '''
 
-    def __init__(self, hostname, fileId, port = 7777, ngasConnectTimeout=2, ngasTimeout=2, length=-1):
+    def __init__(self, hostname, fileId, port = 7777, ngasConnectTimeout=2, ngasTimeout=2, length=-1,
+                 parallelism=1, segmentSize=16*1024**2):
         super(NgasLiteIO, self).__init__()
         self._ngasSrv            = hostname
         self._ngasPort           = port
@@ -369,6 +856,8 @@ class NgasLiteIO(DataIO):
         self._ngasTimeout        = ngasTimeout
         self._fileId             = fileId
         self._length             = length
+        self._parallelism        = parallelism
+        self._segmentSize        = segmentSize
 
     def _getClient(self):
         from ngamsPClient import ngamsPClient  # @UnresolvedImport
@@ -377,22 +866,20 @@ class NgasLiteIO(DataIO):
     def _open(self, **kwargs):
         if self._mode == OpenMode.OPEN_WRITE:
             return ngaslite.beingArchive(self._ngasSrv, self._fileId, port=self._ngasPort, timeout=self._ngasTimeout, length=self._length)
-        return ngaslite.retrieve(self._ngasSrv, self._fileId, port=self._ngasPort, timeout=self._ngasTimeout)
+        return ngaslite.retrieve(self._ngasSrv, self._fileId, port=self._ngasPort, timeout=self._ngasTimeout,
+                                 parallelism=self._parallelism, segmentSize=self._segmentSize)
 
     def _close(self, **kwargs):
         if self._mode == OpenMode.OPEN_WRITE:
-            conn = self._desc
-            ngaslite.finishArchive(conn, self._fileId)
-            conn.close()
+            ngaslite.finishArchive(self._desc, self._fileId)
         else:
-            response = self._desc
-            response.close()
+            self._desc.close()
 
     def _read(self, count, **kwargs):
-        self._desc.read(count)
+        return self._desc.read(count)
 
     def _write(self, data, **kwargs):
-        self._desc.send(data)
+        self._desc.write(data)
         return len(data)
 
     def exists(self):
@@ -401,6 +888,221 @@ class NgasLiteIO(DataIO):
     def delete(self):
         pass # We never delete stuff from NGAS
 
+class _Codec(object):
+    """
+    The block compression and decompression functions of an algorithm
+    """
+    def __init__(self, name, compress, decompress):
+        self.name = name
+        self.compress = compress
+        self.decompress = decompress
+
+def _codecs():
+    codecs = {CompressionTypes.ZLIB: _Codec('zlib',
+        lambda data, level: zlib.compress(data, 1 if level is None else level),
+        lambda data, size: zlib.decompress(data))}
+    try:
+        import lz4.block  # @UnresolvedImport
+        codecs[CompressionTypes.LZ4] = _Codec('lz4',
+            lambda data, level: lz4.block.compress(data, store_size=False, compression=level or 0,
+                                                   mode='high_compression' if level else 'default'),
+            lambda data, size: lz4.block.decompress(data, uncompressed_size=size))
+    except ImportError:
+        pass
+    try:
+        import zstandard  # @UnresolvedImport
+        codecs[CompressionTypes.ZSTD] = _Codec('zstd',
+            lambda data, level: zstandard.ZstdCompressor(level=3 if level is None else level).compress(data),
+            lambda data, size: zstandard.ZstdDecompressor().decompress(data, max_output_size=size))
+    except ImportError:
+        pass
+    return codecs
+
+#: The compression algorithms available in this installation, indexed by
+#: their `CompressionTypes` value
+COMPRESSION_CODECS = _codecs()
+
+def compressionType(name):
+    """
+    Returns the `CompressionTypes` value of the compression algorithm called
+    `name`, or None if it's unknown or not available in this installation.
+    """
+    for compressionType, codec in COMPRESSION_CODECS.items():
+        if codec.name == name.lower():
+            return compressionType
+    return None
+
+class CompressedIO(DataIO):
+    """
+    A DataIO that compresses the data written into another DataIO, and
+    decompresses it when reading.
+
+    Data is compressed in independent blocks of `blockSize` bytes with the
+    given `CompressionTypes` algorithm and `level`. None means the default
+    level of each algorithm, except for zlib, which favours speed and uses 1.
+    The stored data looks like this::
+
+        header | block 0 | ... | block N-1 | end marker | block index | footer
+
+    where each block is prefixed by its compressed and uncompressed sizes,
+    and the block index has the offset of each block. If the underlying
+    DataIO can `seek` then so can this class, which uses the block index to
+    decompress only the block containing the requested offset.
+    """
+
+    _HEADER = struct.Struct('>4sBxxxI')
+    _BLOCK = struct.Struct('>II')
+    _FOOTER = struct.Struct('>QQI4s')
+    _MAGIC = b'DFZ1'
+    _INDEX_MAGIC = b'DFZI'
+
+    def __init__(self, io, compression=CompressionTypes.ZLIB, level=None, blockSize=1024**2):
+        super(CompressedIO, self).__init__()
+        if compression not in COMPRESSION_CODECS:
+            raise ValueError("Compression type %r not available" % (compression,))
+        self._io = io
+        self._compression = compression
+        self._level = level
+        self._blockSize = blockSize
+
+    @property
+    def io(self):
+        """
+        The underlying DataIO holding the compressed data
+        """
+        return self._io
+
+    def _open(self, **kwargs):
+        # The expected size is that of the uncompressed data, so it's of no use
+        # to the underlying DataIO
+        self._io.open(self._mode)
+        self._pending = bytearray()
+        self._offsets = []
+        self._block = b''
+        self._blockPos = 0
+        self._index = None
+        if self._mode == OpenMode.OPEN_WRITE:
+            self._offset = self._HEADER.size
+            self._size = 0
+            self._io.write(self._HEADER.pack(self._MAGIC, self._compression, self._blockSize))
+        else:
+            self._pos = 0
+            # DROPs that were never written have no data at all
+            header = self._io.read(self._HEADER.size)
+            self._eof = not header
+            if self._eof:
+                self._index = ()
+                self._totalSize = 0
+                return self._io
+            header += self._readExactly(self._HEADER.size - len(header))
+            magic, self._readCompression, self._readBlockSize = self._HEADER.unpack(header)
+            if magic != self._MAGIC:
+                raise Exception("%r doesn't contain compressed data" % (self._io,))
+            if self._readCompression not in COMPRESSION_CODECS:
+                raise Exception("Compression type %d of %r not available" % (self._readCompression, self._io))
+        return self._io
+
+    def _write(self, data, **kwargs):
+        n = len(data)
+        self._pending += data
+        blockSize = self._blockSize
+        if len(self._pending) >= blockSize:
+            view = memoryview(self._pending)
+            start = 0
+            while len(view) - start >= blockSize:
+                self._writeBlock(view[start:start + blockSize])
+                start += blockSize
+            view.release()
+            del self._pending[:start]
+        return n
+
+    def _writeBlock(self, block):
+        compressed = COMPRESSION_CODECS[self._compression].compress(block.tobytes() if six.PY2 else block, self._level)
+        self._offsets.append(self._offset)
+        self._io.write(self._BLOCK.pack(len(compressed), len(block)))
+        self._io.write(compressed)
+        self._offset += self._BLOCK.size + len(compressed)
+        self._size += len(block)
+
+    def _readExactly(self, n):
+        chunks = []
+        while n:
+            chunk = self._io.read(n)
+            if not chunk:
+                raise Exception("Unexpected end of compressed data in %r" % (self._io,))
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+    def _nextBlock(self):
+        compressedSize, size = self._BLOCK.unpack(self._readExactly(self._BLOCK.size))
+        if not compressedSize:
+            self._eof = True
+            return False
+        data = self._readExactly(compressedSize)
+        self._block = COMPRESSION_CODECS[self._readCompression].decompress(data, size)
+        self._blockPos = 0
+        return True
+
+    def _read(self, count=4096, **kwargs):
+        # A negative count reads everything up to the end of the data
+        chunks = []
+        while count:
+            if self._blockPos == len(self._block) and (self._eof or not self._nextBlock()):
+                break
+            end = len(self._block) if count < 0 else self._blockPos + count
+            data = self._block[self._blockPos:end]
+            self._blockPos += len(data)
+            if count > 0:
+                count -= len(data)
+            chunks.append(data)
+        data = chunks[0] if len(chunks) == 1 else b''.join(chunks)
+        self._pos += len(data)
+        return data
+
+    def _seek(self, offset, whence=0):
+        if self._index is None:
+            self._io.seek(-self._FOOTER.size, 2)
+            indexOffset, self._totalSize, nblocks, magic = self._FOOTER.unpack(self._readExactly(self._FOOTER.size))
+            if magic != self._INDEX_MAGIC:
+                raise Exception("%r has no block index" % (self._io,))
+            self._io.seek(indexOffset)
+            self._index = struct.unpack('>%dQ' % nblocks, self._readExactly(8 * nblocks))
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._totalSize
+        offset = max(0, min(offset, self._totalSize))
+
+        blockSize = self._readBlockSize if self._index else 1
+        i = offset // blockSize
+        self._block = b''
+        self._blockPos = 0
+        self._eof = i >= len(self._index)
+        if not self._eof:
+            self._io.seek(self._index[i])
+            self._nextBlock()
+            self._blockPos = offset - i * blockSize
+        self._pos = offset
+        return offset
+
+    def _close(self, **kwargs):
+        if self._mode == OpenMode.OPEN_WRITE:
+            if self._pending:
+                self._writeBlock(memoryview(self._pending))
+            self._io.write(self._BLOCK.pack(0, 0))
+            indexOffset = self._offset + self._BLOCK.size
+            self._io.write(struct.pack('>%dQ' % len(self._offsets), *self._offsets))
+            self._io.write(self._FOOTER.pack(indexOffset, self._size, len(self._offsets), self._INDEX_MAGIC))
+        self._pending = self._block = None
+        self._io.close()
+
+    def exists(self):
+        return self._io.exists()
+
+    def delete(self):
+        self._io.delete()
+
 def IOForURL(url):
     """
     Returns a DataIO instance that handles the given URL for reading. If no
@@ -408,12 +1110,37 @@ def IOForURL(url):
     """
     url = urlparse.urlparse(url)
     io = None
-    if url.scheme == 'file':
+    if '+' in url.scheme:
+        # <compression>+<scheme>://, see AbstractDROP.dataURL
+        algorithm, scheme = url.scheme.split('+', 1)
+        compression = compressionType(algorithm)
+        io = IOForURL(url._replace(scheme=scheme).geturl())
+        if io is not None and compression is not None:
+            io = CompressedIO(io, compression)
+        else:
+            io = None
+    elif url.scheme == 'file':
         hostname = url.netloc
         filename = url.path
         if hostname == 'localhost' or hostname == '127.0.0.1' or \
            hostname == os.uname()[1]:
             io = FileIO(filename)
+    elif url.scheme == 'shm':
+        hostname = url.netloc
+        if hostname == 'localhost' or hostname == '127.0.0.1' or \
+           hostname == os.uname()[1]:
+            io = SharedMemoryIO(url.path.lstrip('/'))
+    elif url.scheme == 'mem':
+        # mem://<hostname>/<pid>/<buffer id>, see registerMemoryBuffer
+        hostname = url.netloc
+        try:
+            pid, bufid = [int(x) for x in url.path.strip('/').split('/')]
+        except ValueError:
+            pid = bufid = None
+        if hostname == os.uname()[1] and pid == os.getpid():
+            buf = _memoryBuffers.get(bufid)
+            if buf is not None:
+                io = MemoryIO(buf)
     elif url.scheme == 'null':
         io = NullIO()
     elif url.scheme == 'ngas':
@@ -22,25 +22,327 @@
 """
 A DROP for a JSON file
 """
+import codecs
 import json
 import logging
+import os
+import re
+import struct
+import threading
 
+import six
+
+from dfms import droputils
 from dfms.drop import FileDROP
 
 LOG = logging.getLogger(__name__)
 
+#: Number of bytes read at a time when scanning JSON content
+CHUNK_SIZE = 1024 * 1024
+
+_WS = re.compile(r'[ \t\n\r]*')
+_SEPARATOR = re.compile(r'[ \t\n\r]*,[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+_OFFSETS = struct.Struct('<QQ')
+_TRAILER_LEN = struct.Struct('<Q')
+_INDEX_VERSION = 1
+
+
+class _Scanner(object):
+    """
+    Scans the top-level members of the JSON array or object stored in a binary
+    file, decoding them one at a time. Iterating over a scanner yields
+    ``(key, value, start, end)`` tuples, where ``key`` is None for array items
+    and ``start``/``end`` are the offsets of the value in the decoded text.
+
+    If ``byteOffsets`` is True the file is decoded as latin-1 instead of UTF-8
+    so that offsets are also byte offsets in the file, which is what the index
+    is built with. Keys are still decoded correctly, but string values aren't.
+    """
+
+    def __init__(self, f, byteOffsets=False, chunkSize=CHUNK_SIZE):
+        self._f = f
+        self._byteOffsets = byteOffsets
+        self._decoder = codecs.getincrementaldecoder('latin-1' if byteOffsets else 'utf-8')()
+        self._chunkSize = chunkSize
+        self._buf = u''
+        self._pos = 0
+        self._base = 0
+        self._eof = False
+
+        c = self._next()
+        if c not in (u'[', u'{'):
+            raise ValueError('JSON content is not an array or an object')
+        self.isArray = (c == u'[')
+        self._pos += 1
+
+    def _read(self, n):
+        # Drop the consumed text and append at least n more bytes of data
+        data = self._f.read(max(n, self._chunkSize))
+        self._eof = not data
+        self._buf = self._buf[self._pos:] + self._decoder.decode(data, final=self._eof)
+        self._base += self._pos
+        self._pos = 0
+
+    def _next(self):
+        # Skips whitespace and returns the next character without consuming it
+        while True:
+            self._pos = _WS.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if self._eof:
+                raise ValueError('Unexpected end of JSON content at offset %d' % (self._base + self._pos))
+            self._read(0)
+
+    def _expect(self, c):
+        if self._next() != c:
+            raise ValueError('Expected %r at offset %d' % (c, self._base + self._pos))
+        self._pos += 1
+
+    def _value(self):
+        # A value is only complete if something follows it, otherwise a number
+        # could continue in the data we haven't read yet
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+                if end < len(self._buf) or self._eof:
+                    break
+            except ValueError:
+                if self._eof:
+                    raise
+            self._read(len(self._buf) - self._pos)
+
+        start = self._base + self._pos
+        self._pos = end
+        return value, start, self._base + end
+
+    def __iter__(self):
+        closing = u']' if self.isArray else u'}'
+        if self._next() == closing:
+            return
+        while True:
+            key = None
+            if not self.isArray:
+                if self._next() != u'"':
+                    raise ValueError('Expected object key at offset %d' % (self._base + self._pos))
+                key, start, end = self._value()
+                if self._byteOffsets:
+                    raw = self._buf[self._pos - (end - start):self._pos]
+                    key = json.loads(raw.encode('latin-1').decode('utf-8'))
+                self._expect(u':')
+                self._next()
+
+            value, start, end = self._value()
+            yield key, value, start, end
+
+            # Fast path for when the separator and the beginning of the next
+            # member are already in the buffer
+            m = _SEPARATOR.match(self._buf, self._pos)
+            if m and m.end() < len(self._buf):
+                self._pos = m.end()
+                continue
+
+            if self._next() == closing:
+                return
+            self._expect(u',')
+            self._next()
+
+
+class _Index(object):
+    """
+    The offsets of the top-level members of a JSON file, stored on disk.
+
+    The index file holds one ``(start, end)`` pair of little-endian 64-bit
+    byte offsets per member, followed by a JSON trailer with the size and
+    modification time of the indexed file, whether its content is an array,
+    the number of members and (for objects) their keys, and finally the length
+    of the trailer. Only the trailer is kept in memory; offsets are read from
+    disk on each lookup.
+    """
+
+    def __init__(self, path, trailer):
+        self.path = path
+        self.isArray = trailer['array']
+        self.count = trailer['count']
+        self.keys = None
+        if not self.isArray:
+            self.keys = {k: i for i, k in enumerate(trailer['keys'])}
+        self._trailer = trailer
+
+    def isValidFor(self, filename):
+        st = os.stat(filename)
+        return self._trailer['size'] == st.st_size and self._trailer['mtime'] == st.st_mtime
+
+    def offsets(self, i):
+        with open(self.path, 'rb') as f:
+            f.seek(i * _OFFSETS.size)
+            return _OFFSETS.unpack(f.read(_OFFSETS.size))
+
+    @staticmethod
+    def build(filename, path):
+        """
+        Scans the JSON file ``filename`` and writes its index into ``path``
+        """
+        st = os.stat(filename)
+        keys = []
+        tmp = path + '.tmp'
+        try:
+            with open(filename, 'rb') as f, open(tmp, 'wb') as idx:
+                scanner = _Scanner(f, byteOffsets=True)
+                for key, _, start, end in scanner:
+                    idx.write(_OFFSETS.pack(start, end))
+                    if key is not None:
+                        keys.append(key)
+
+                trailer = {'version': _INDEX_VERSION, 'size': st.st_size,
+                           'mtime': st.st_mtime, 'array': scanner.isArray,
+                           'count': len(keys) if not scanner.isArray else idx.tell() // _OFFSETS.size,
+                           'keys': None if scanner.isArray else keys}
+                data = json.dumps(trailer).encode('utf-8')
+                idx.write(data)
+                idx.write(_TRAILER_LEN.pack(len(data)))
+            os.rename(tmp, path)
+        except:
+            if os.path.isfile(tmp):
+                os.unlink(tmp)
+            raise
+        return _Index(path, trailer)
+
+    @staticmethod
+    def load(path):
+        """
+        Loads the index stored in ``path``, or returns None if there is no
+        usable index there
+        """
+        try:
+            with open(path, 'rb') as f:
+                f.seek(-_TRAILER_LEN.size, os.SEEK_END)
+                n, = _TRAILER_LEN.unpack(f.read(_TRAILER_LEN.size))
+                f.seek(-_TRAILER_LEN.size - n, os.SEEK_END)
+                trailer = json.loads(f.read(n).decode('utf-8'))
+        except (IOError, OSError, ValueError, struct.error):
+            return None
+        if trailer.get('version') != _INDEX_VERSION:
+            return None
+        return _Index(path, trailer)
+
 
 class JsonDROP(FileDROP):
+    """
+    A FileDROP holding a JSON array or object.
+
+    Items can be accessed with the usual ``drop[item]`` notation or with
+    `lookup`. Instead of parsing the whole file, these use an index with the
+    offsets of the top-level members of the JSON content, which is built and
+    stored next to the file (with an ``.idx`` extension) on first access. Only
+    the requested member is read and decoded. Content that can't be indexed,
+    like a scalar or compressed data, is parsed in full instead. `iterMembers`
+    streams through all top-level members without holding them all in memory
+    at once.
+    """
+
+    __slots__ = ('_data', '_index', '_indexLock')
+
     def __init__(self, oid, uid, **kwargs):
         self._data = None
+        self._index = None
+        self._indexLock = threading.Lock()
         super(JsonDROP, self).__init__(oid, uid, **kwargs)
 
     def __getitem__(self, item):
+        if self._data is None and not isinstance(item, slice):
+            return self.lookup((item,))
         if self._data is None:
             self._load()
 
         return self._data[item]
 
     def _load(self):
-        with open(self.path, mode='r') as json_file:
-            self._data = json.load(json_file)
+        with self._openContent() as f:
+            self._data = json.loads(f.read(-1).decode('utf-8'))
+
+    def _openContent(self):
+        # Compressed content can only be read through the DROP's own I/O
+        if self._compression:
+            return droputils.DROPFile(self)
+        return open(self.path, 'rb')
+
+    @property
+    def indexPath(self):
+        """
+        The path of the file holding the offsets index of this DROP
+        """
+        return self.path + '.idx'
+
+    def _getIndex(self):
+        # Returns None if the content can't be indexed
+        if self._compression:
+            return None
+        with self._indexLock:
+            index = self._index
+            if index is None or not index.isValidFor(self.path):
+                index = _Index.load(self.indexPath)
+                if index is None or not index.isValidFor(self.path):
+                    LOG.debug('Building JSON index for %r', self)
+                    try:
+                        index = _Index.build(self.path, self.indexPath)
+                    except ValueError as e:
+                        LOG.debug("Can't index %r: %s", self, e)
+                        return None
+                self._index = index
+            return index
+
+    def lookup(self, path):
+        """
+        Returns the value found by following ``path``, a sequence of keys and
+        indices, from the top-level JSON array or object of this DROP. A single
+        key or index can also be given.
+        """
+        if isinstance(path, six.string_types) or isinstance(path, six.integer_types):
+            path = (path,)
+        path = list(path)
+        index = self._getIndex() if path and self._data is None else None
+        if index is not None:
+            value = self._member(index, path.pop(0))
+        else:
+            if self._data is None:
+                self._load()
+            value = self._data
+
+        for item in path:
+            value = value[item]
+        return value
+
+    def _member(self, index, item):
+        if index.isArray:
+            if not isinstance(item, six.integer_types):
+                raise TypeError('list indices must be integers, not %s' % (type(item).__name__,))
+            i = item + index.count if item < 0 else item
+            if not 0 <= i < index.count:
+                raise IndexError('list index out of range')
+        else:
+            if item not in index.keys:
+                raise KeyError(item)
+            i = index.keys[item]
+
+        start, end = index.offsets(i)
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return json.loads(data.decode('utf-8'))
+
+    def iterMembers(self):
+        """
+        Iterates over the top-level members of the JSON content of this DROP,
+        decoding one at a time. Array items are yielded as they are; object
+        members are yielded as ``(key, value)`` tuples.
+        """
+        with self._openContent() as f:
+            scanner = _Scanner(f)
+            for key, value, _, _ in scanner:
+                yield value if scanner.isArray else (key, value)
+
+    def delete(self):
+        super(JsonDROP, self).delete()
+        if os.path.isfile(self.indexPath):
+            os.unlink(self.indexPath)
@@ -157,8 +157,12 @@ class NgasStore(AbstractStore):
     """
     A store that a given NGAS server as its storage mechanism. It creates
     NgasDROPs and monitors the disks usage of the NGAS system.
+
+    All NgasDROPs created by this store share the same pool of keep-alive
+    connections to the NGAS server; `retrieveParallelism` sets the number of
+    concurrent connections over which their data is read.
     """
-    def __init__(self, host=None, port=None, initialCheck=True):
+    def __init__(self, host=None, port=None, initialCheck=True, retrieveParallelism=1):
 
         try:
             from ngamsPClient import ngamsPClient  # @UnusedImport
@@ -176,6 +180,7 @@ class NgasStore(AbstractStore):
 
         self._host = host
         self._port = port
+        self._retrieveParallelism = retrieveParallelism
 
         self.updateSpaces()
 
@@ -201,6 +206,7 @@ class NgasStore(AbstractStore):
     def createDrop(self, oid, uid, **kwargs):
         kwargs['ngasSrv']  = self._host
         kwargs['ngasPort'] = self._port
+        kwargs.setdefault('ngasRetrieveParallelism', self._retrieveParallelism)
         return NgasDROP(oid, uid, **kwargs)
 
     def _getClient(self):
@@ -208,7 +208,13 @@ def dfmsNM(args=sys.argv):
     parser.add_option("--luigi", action="store_true",
                       dest="enable_luigi", help="Enable integration with Luigi. Disabled by default.", default=False)
     parser.add_option("-t", "--max-threads", action="store", type="int",
-                      dest="max_threads", help="Max thread pool size used for executing drops. 0 (default) means no pool.", default=0)
+                      dest="max_threads", help="Max number of threads used for executing drops. 0 (default) means a size based on the number of CPUs.", default=0)
+    parser.add_option("--max-processes", action="store", type="int",
+                      dest="max_processes", help="Max number of processes used for executing drops that run in a separate process. 0 (default) means the number of CPUs.", default=0)
+    parser.add_option("--events-linger", action="store", type="float",
+                      dest="events_linger", help="Seconds to wait for more events before publishing a batch of them to other Node Managers. 0 (default) means sending the queued ones straight away.", default=0)
+    parser.add_option("--event-delivery-threads", action="store", type="int",
+                      dest="event_delivery_threads", help="Number of threads delivering the events received from other Node Managers. Defaults to 1", default=1)
     (options, args) = parser.parse_args(args)
 
     # Add DM-specific options
@@ -221,7 +227,10 @@ def dfmsNM(args=sys.argv):
                         'host': options.host,
                         'error_listener': options.errorListener,
                         'enable_luigi': options.enable_luigi,
-                        'max_threads': options.max_threads}
+                        'max_threads': options.max_threads,
+                        'max_processes': options.max_processes,
+                        'events_linger': options.events_linger,
+                        'event_delivery_threads': options.event_delivery_threads}
     options.dmAcronym = 'NM'
     options.restType = NMRestServer
 
@@ -0,0 +1,193 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+The wire format used by Node Managers to send batches of events to each other.
+
+A frame starts with a header holding the ``DFEV`` magic string, the version of
+the format and the number of events it contains, followed by one record per
+event. Each record has a fixed-size part with the kind of event, its status
+and execution status (-1 if not set) and the lengths of its type, session ID,
+OID and UID strings, followed by those UTF-8 encoded strings (empty ones
+are decoded as None).
+
+The events fired for every single DROP (StatusEvent, ExecStatusEvent and
+ProducerFinishedEvent) are encoded this way. Any other event is encoded as a
+JSON object holding its fields, which therefore must be JSON-serializable.
+Unlike pickles, decoding a frame never runs arbitrary code.
+
+Frames are sent as the second part of a two-part message, the first one being
+a topic created by `topic` that allows subscribers to receive only the events
+meant to them. Topics created by `hello_topic` are never used for events;
+publishers answer subscriptions to them with an empty message, which tells
+subscribers that their previous subscriptions have been seen.
+"""
+
+import json
+import struct
+import uuid
+
+import six
+
+from dfms.event import Event, StatusEvent, ExecStatusEvent, \
+    ProducerFinishedEvent, GenericEvent
+
+
+#: The version of the wire format written by `encode`
+VERSION = 1
+
+_MAGIC = b'DFEV'
+_HELLO = b'\xffhello'
+_HEADER = struct.Struct('>4sBI')
+_RECORD = struct.Struct('>BbbHHHH')
+_JSON_LEN = struct.Struct('>I')
+_MAX_STRING = 0xffff
+
+# The kinds of events with a fixed schema, and the one for the rest
+_GENERIC = 0
+_KINDS = {StatusEvent: 1, ExecStatusEvent: 2, ProducerFinishedEvent: 3}
+_CLASSES = {v: k for k, v in _KINDS.items()}
+
+def _b(s):
+    if s is None:
+        return b''
+    if not isinstance(s, six.text_type):
+        s = six.text_type(s)
+    return s.encode('utf-8')
+
+def _checked(s, evt):
+    if len(s) > _MAX_STRING:
+        raise ValueError('String of %d bytes in %r is too long (max. %d)' % (len(s), evt, _MAX_STRING))
+    return s
+
+def _s(b):
+    return b.decode('utf-8') if b else None
+
+def _status(value):
+    return -1 if value is None else value
+
+def topic(session_id, node=None):
+    """
+    Returns the topic under which the events of session `session_id` destined
+    to `node` are published. The topic for a session with no node is a prefix
+    of all the topics for that session, while the topic for no session at all
+    is empty, and therefore a prefix of all topics.
+    """
+    if session_id is None:
+        return b''
+    if node is None:
+        return _b(session_id) + b'\0'
+    return _b(session_id) + b'\0' + _b(node) + b'\0'
+
+def hello_topic():
+    """
+    Returns a new, unique hello topic. These start with a byte that never
+    appears in UTF-8 text, so they are different from any other topic
+    """
+    return _HELLO + uuid.uuid4().bytes
+
+def is_hello_topic(topic):
+    """
+    Returns whether `topic` was created by `hello_topic`
+    """
+    return topic.startswith(_HELLO)
+
+def encode(events):
+    """
+    Encodes the given sequence of events into a single frame. A `ValueError`
+    is raised if any of them can't be encoded, like generic events with
+    attributes that are not JSON-serializable, or events with strings longer
+    than 65535 bytes once encoded.
+    """
+    parts = [_HEADER.pack(_MAGIC, VERSION, len(events))]
+    for evt in events:
+        kind = _KINDS.get(type(evt), _GENERIC)
+        if kind == _GENERIC:
+            try:
+                data = json.dumps(evt.__getstate__()).encode('utf-8')
+            except TypeError as e:
+                raise ValueError('%r is not JSON-serializable: %s' % (evt, e))
+            parts.append(_RECORD.pack(kind, -1, -1, 0, 0, 0, 0))
+            parts.append(_JSON_LEN.pack(len(data)))
+            parts.append(data)
+            continue
+
+        strings = [_checked(_b(evt.type), evt), _checked(_b(evt.session_id), evt),
+                   _checked(_b(evt.oid), evt), _checked(_b(evt.uid), evt)]
+        status = _status(getattr(evt, 'status', None))
+        execStatus = _status(getattr(evt, 'execStatus', None))
+        try:
+            parts.append(_RECORD.pack(kind, status, execStatus, *[len(s) for s in strings]))
+        except struct.error as e:
+            raise ValueError('Invalid status in %r: %s' % (evt, e))
+        parts.extend(strings)
+    return b''.join(parts)
+
+def decode(frame):
+    """
+    Decodes the events contained in `frame`, returning them in a list. A
+    `ValueError` is raised if `frame` isn't valid or was written with a
+    different version of this format.
+    """
+    try:
+        magic, version, n = _HEADER.unpack_from(frame, 0)
+    except struct.error:
+        raise ValueError('Event frame too short')
+    if magic != _MAGIC:
+        raise ValueError('Not an event frame')
+    if version != VERSION:
+        raise ValueError('Unsupported event frame version: %d' % (version,))
+
+    frame = memoryview(frame)
+    events = []
+    offset = _HEADER.size
+    try:
+        for _ in range(n):
+            kind, status, execStatus, l1, l2, l3, l4 = _RECORD.unpack_from(frame, offset)
+            offset += _RECORD.size
+
+            if kind == _GENERIC:
+                l, = _JSON_LEN.unpack_from(frame, offset)
+                offset += _JSON_LEN.size
+                evt = GenericEvent()
+                evt.__setstate__(json.loads(frame[offset:offset + l].tobytes().decode('utf-8')))
+                offset += l
+                events.append(evt)
+                continue
+
+            strings = []
+            for l in (l1, l2, l3, l4):
+                strings.append(_s(frame[offset:offset + l].tobytes()))
+                offset += l
+
+            evt = Event.__new__(_CLASSES[kind])
+            evt.type, evt.session_id, evt.oid, evt.uid = strings
+            if kind != 2:
+                evt.status = None if status == -1 else status
+            if kind != 1:
+                evt.execStatus = None if execStatus == -1 else execStatus
+            events.append(evt)
+    except (struct.error, KeyError, ValueError):
+        raise ValueError('Corrupted event frame')
+
+    if offset != len(frame):
+        raise ValueError('Corrupted event frame')
+    return events
@@ -0,0 +1,193 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Module containing the executor used by Node Managers to run the applications
+of all their sessions.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+def default_max_workers():
+    """
+    The default number of workers of an `AppExecutor`. Applications usually
+    either use a CPU themselves or wait on an external process that does (like
+    those running in `dfms.process_pool`), but some of them simply wait on
+    I/O, so we allow a few more workers than CPUs.
+    """
+    return multiprocessing.cpu_count() + 4
+
+class AppExecutor(object):
+    """
+    A bounded pool of worker threads executing applications on behalf of the
+    different sessions of a Node Manager.
+
+    Each session has its own priority queue of applications ready to be
+    executed, with higher priorities executed first. Applications usually get
+    their priority at deployment time from the length of the critical path
+    that remains after them (see `dfms.droputils.get_critical_path_lengths`).
+
+    Workers pick applications from sessions in a round-robin fashion, so a
+    session with a huge number of ready applications cannot starve a smaller
+    one. Worker threads are started only when needed, up to `max_workers`.
+
+    Applications that run in a separate process use the `process_pool` of
+    their executor, if given (see `dfms.process_pool.ProcessPool`).
+    """
+
+    def __init__(self, max_workers=None, process_pool=None):
+        self._max_workers = max(max_workers or default_max_workers(), 1)
+        self.process_pool = process_pool
+        self._cond = threading.Condition()
+        self._queues = {}
+        self._ready_sessions = collections.deque()
+        self._seq = itertools.count()
+        self._workers = []
+        self._idle = 0
+        self._running = True
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def for_session(self, session_id):
+        """
+        Returns an object with a ``submit(fn, priority, cancel)`` method that
+        submits work to this executor on behalf of session ``session_id``.
+        """
+        return _SessionExecutor(self, session_id)
+
+    def submit(self, session_id, fn, priority=0, cancel=None):
+        """
+        Schedules the execution of ``fn`` on behalf of session ``session_id``
+        with the given ``priority``. If the execution is discarded when this
+        executor is shut down, ``cancel`` is called instead, if given.
+        """
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Executor has been shut down")
+
+            queue = self._queues.get(session_id, None)
+            if queue is None:
+                queue = self._queues[session_id] = []
+                self._ready_sessions.append(session_id)
+
+            # The sequence number breaks ties between equal priorities,
+            # keeping submission order and avoiding comparing functions
+            heapq.heappush(queue, (-priority, next(self._seq), fn, cancel))
+
+            # Idle workers are accounted as busy as soon as they are notified,
+            # so consecutive submissions don't notify the same worker
+            if self._idle:
+                self._idle -= 1
+                self._cond.notify()
+            elif len(self._workers) < self._max_workers:
+                t = threading.Thread(target=self._work, name="AppExecutor worker #%d" % (len(self._workers),))
+                t.daemon = True
+                self._workers.append(t)
+                t.start()
+
+    def _next(self):
+        # Round-robin between sessions, highest priority first within each
+        session_id = self._ready_sessions.popleft()
+        queue = self._queues[session_id]
+        _, _, fn, _ = heapq.heappop(queue)
+        if queue:
+            self._ready_sessions.append(session_id)
+        else:
+            del self._queues[session_id]
+        return fn
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._ready_sessions:
+                    self._idle += 1
+                    self._cond.wait()
+                if not self._running:
+                    return
+                fn = self._next()
+            try:
+                fn()
+            except:
+                logger.exception("Error while executing %r", fn)
+
+    def pending(self, session_id=None):
+        """
+        Returns the number of submitted but not yet started executions, either
+        for session ``session_id`` or for all sessions.
+        """
+        with self._cond:
+            if session_id is not None:
+                return len(self._queues.get(session_id, ()))
+            return sum(len(q) for q in self._queues.values())
+
+    def shutdown(self, timeout=None):
+        """
+        Stops this executor. Pending executions are discarded and their
+        cancellation callbacks called, while running ones are waited on for up
+        to ``timeout`` seconds in total.
+        """
+        with self._cond:
+            self._running = False
+            discarded = self._queues
+            self._queues = {}
+            self._ready_sessions.clear()
+            self._cond.notify_all()
+
+        for session_id, queue in discarded.items():
+            logger.warning("Discarding %d pending executions of session %s", len(queue), session_id)
+            for _, _, fn, cancel in sorted(queue):
+                if cancel is None:
+                    continue
+                try:
+                    cancel()
+                except:
+                    logger.exception("Error while cancelling the execution of %r", fn)
+
+        deadline = None if timeout is None else time.time() + timeout
+        for t in self._workers:
+            t.join(None if deadline is None else max(deadline - time.time(), 0))
+
+class _SessionExecutor(object):
+    """Submits work to an `AppExecutor` on behalf of a given session"""
+
+    __slots__ = ('_executor', '_session_id')
+
+    def __init__(self, executor, session_id):
+        self._executor = executor
+        self._session_id = session_id
+
+    @property
+    def process_pool(self):
+        return self._executor.process_pool
+
+    def submit(self, fn, priority=0, cancel=None):
+        self._executor.submit(self._session_id, fn, priority, cancel)
@@ -28,7 +28,6 @@ import abc
 import collections
 import importlib
 import logging
-import multiprocessing.pool
 import os
 import socket
 import sys
@@ -38,13 +37,14 @@ import time
 import six
 from six.moves import queue as Queue  # @UnresolvedImport
 
-from dfms import utils
-from dfms.drop import AppDROP
+from dfms import process_pool, utils
+from dfms.drop import AppDROP, InputFiredAppDROP
 from dfms.exceptions import NoSessionException, SessionAlreadyExistsException,\
     DaliugeException
 from dfms.lifecycle.dlm import DataLifecycleManager
-from dfms.manager import constants
+from dfms.manager import constants, event_wire
 from dfms.manager.drop_manager import DROPManager
+from dfms.manager.executor import AppExecutor
 from dfms.manager.session import Session
 
 
@@ -91,14 +91,27 @@ class NodeManagerBase(DROPManager):
                  enable_luigi=False,
                  events_port = constants.NODE_DEFAULT_EVENTS_PORT,
                  rpc_port = constants.NODE_DEFAULT_RPC_PORT,
-                 max_threads = 0):
+                 max_threads = 0,
+                 max_processes = 0,
+                 events_linger = 0,
+                 event_delivery_threads = 1):
 
         self._dlm = DataLifecycleManager() if useDLM else None
         self._host = host or 'localhost'
         self._events_port = events_port
         self._rpc_port = rpc_port
+        self._events_linger = events_linger
+        self._event_delivery_threads = max(event_delivery_threads, 1)
         self._sessions = {}
 
+        # Number of events sent to and received from other Node Managers.
+        # Events are published by a single thread, but might be delivered by
+        # many
+        self._events_published = 0
+        self._events_delivered = 0
+        self._events_dropped = 0
+        self._events_stats_lock = threading.Lock()
+
         # dfmsPath contains code added by the user with possible
         # DROP applications
         if dfmsPath:
@@ -124,13 +137,16 @@ class NodeManagerBase(DROPManager):
 
         self._enable_luigi = enable_luigi
 
-        # Start our thread pool
+        # Start our application executor, shared by all sessions
         if max_threads == 0:
-            self._threadpool = None
+            max_threads = None
         else:
             max_threads = max(min(max_threads, 200), 1)
-            logger.info("Initializing thread pool with %d threads", max_threads)
-            self._threadpool = multiprocessing.pool.ThreadPool(processes=max_threads)
+        # Applications running in separate processes use a pool of our own
+        # with these many processes at most
+        self._process_pool = process_pool.ProcessPool(max_processes)
+        self._executor = AppExecutor(max_threads, self._process_pool)
+        logger.info("Initialized application executor with %d threads", self._executor.max_workers)
 
         # Event handler that only logs status changes
         debugging = logger.isEnabledFor(logging.DEBUG)
@@ -145,16 +161,21 @@ class NodeManagerBase(DROPManager):
         Starts any background task required by this Node Manager
         """
 
-    @abc.abstractmethod
     def shutdown(self):
         """
-        Stops any pending background task run by this Node Manager
+        Stops any pending background task run by this Node Manager, including
+        the application executor and the pool of worker processes. Mix-ins
+        overriding this method must call it.
         """
+        self._executor.shutdown(5)
+        self._process_pool.shutdown()
 
     @abc.abstractmethod
-    def subscribe(self, host, port):
+    def subscribe(self, host, port, topics=(b'',)):
         """
         Subscribes this Node Manager to events published in from ``host``:``port``
+        under any of the given ``topics`` (see `event_wire.topic`), which by
+        default include all events.
         """
 
     @abc.abstractmethod
@@ -175,10 +196,40 @@ class NodeManagerBase(DROPManager):
         Method called by subclasses when a new event has arrived through the
         subscription mechanism.
         """
-        if not evt.session_id in self._sessions:
-            logger.warning("No session %s found, event will be dropped" % (evt.session_id))
+        session = self._sessions.get(evt.session_id, None)
+        if session is None:
+            with self._events_stats_lock:
+                self._events_dropped += 1
+            logger.warning("No session %s found, event will be dropped", evt.session_id)
             return
-        self._sessions[evt.session_id].deliver_event(evt)
+        with self._events_stats_lock:
+            self._events_delivered += 1
+        session.deliver_event(evt)
+
+    def getEventStats(self):
+        """
+        Returns a dictionary with the number of events published by this Node
+        Manager to other Node Managers (one per destination node), and the
+        number of events received from them that were delivered to a session
+        or dropped because their session was not found.
+        """
+        with self._events_stats_lock:
+            return {'published': self._events_published,
+                    'delivered': self._events_delivered,
+                    'dropped': self._events_dropped}
+
+    def _event_topics(self, evt):
+        """
+        Returns the topics under which ``evt`` should be published, one for
+        each node interested in it, which might be none. Events that don't
+        belong to a session of this Node Manager are published under the
+        topic of their session, if any.
+        """
+        session = self._sessions.get(evt.session_id, None)
+        if session is None:
+            return (event_wire.topic(evt.session_id),)
+        return tuple(event_wire.topic(evt.session_id, node)
+                     for node in session.event_destinations(evt.uid))
 
     def _check_session_id(self, session_id):
         if session_id not in self._sessions:
@@ -214,18 +265,24 @@ class NodeManagerBase(DROPManager):
         self._check_session_id(sessionId)
         session = self._sessions[sessionId]
 
+        session_executor = self._executor.for_session(sessionId)
+
+        # Only the events of drops that other nodes are interested in are
+        # forwarded to them, so most drops don't get this listener
+        evt_listener = NMDropEventListener(self, sessionId)
+
         def foreach(drop):
-            if self._threadpool is not None:
-                drop._tp = self._threadpool
+            if isinstance(drop, InputFiredAppDROP):
+                drop.executor = session_executor
             if self._dlm:
                 self._dlm.addDrop(drop)
 
             # Remote event forwarding
-            evt_listener = NMDropEventListener(self, sessionId)
-            if isinstance(drop, AppDROP):
-                drop.subscribe(evt_listener, 'producerFinished')
-            else:
-                drop.subscribe(evt_listener, 'dropCompleted')
+            if session.event_destinations(drop.uid):
+                if isinstance(drop, AppDROP):
+                    drop.subscribe(evt_listener, 'producerFinished')
+                else:
+                    drop.subscribe(evt_listener, 'dropCompleted')
 
             # Purely for logging purposes
             log_evt_listener = self._logging_event_listener
@@ -260,9 +317,12 @@ class NodeManagerBase(DROPManager):
 
         logger.debug("Received subscription information: %r", relationships)
         self._check_session_id(sessionId)
-        self._sessions[sessionId].add_node_subscriptions(sessionId, relationships, self)
+        session = self._sessions[sessionId]
+        session.add_node_subscriptions(sessionId, relationships, self)
 
-        # Set up event channels subscriptions
+        # Set up event channels subscriptions, receiving only the events of
+        # this session that are destined to this node
+        topic = event_wire.topic(sessionId, session.node)
         for nodesub in relationships:
 
             host = nodesub
@@ -271,7 +331,7 @@ class NodeManagerBase(DROPManager):
                 host, events_port, _ = nodesub
 
             # TODO: we also have to unsubscribe from them at some point
-            self.subscribe(host, events_port)
+            self.subscribe(host, events_port, (topic,))
 
     def get_drop_attribute(self, hostname, port, session_id, uid, name):
 
@@ -326,10 +386,42 @@ class BaseMixIn(object):
         self._running = True
     def shutdown(self):
         self._running = False
+        super(BaseMixIn, self).shutdown()
 
 class ZMQPubSubMixIn(BaseMixIn):
+    """
+    Publishes and receives events through ZeroMQ XPUB/SUB sockets.
+
+    None of the threads involved poll. The publisher and subscriber threads
+    block in a zmq.Poller waiting for either messages from their sockets, or
+    for a wake-up message on an inproc socket, sent when there are new events
+    to publish, when a new subscription is requested or when shutting down.
+    The delivery threads block on their queues.
+
+    Events are sent in batches using the format defined in
+    `dfms.manager.event_wire`. The publisher sends all the events that are
+    already queued in a single message per topic, waiting ``events_linger``
+    seconds for more events to arrive before doing so. Topics identify the
+    session and destination node of the events, so subscribers receive only
+    the events they are interested in, and events that no other node is
+    interested in are not published at all.
+
+    Received events are delivered by ``event_delivery_threads`` threads, each
+    with its own queue. Events are assigned to a thread based on their
+    session and UID, so the events of a given DROP are delivered in order,
+    while a slow handler only holds back the events assigned to its thread.
+
+    A publisher drops the events published before it knows about a
+    subscription, so subscriptions finish only after the publisher has
+    answered a hello topic subscribed to after all the others. To know which
+    publisher answered, each publisher is connected to through its own SUB
+    socket.
+    """
+
+    #: The maximum number of events sent in a single message
+    max_events_batch = 1000
 
-    subscription = collections.namedtuple('subscription', 'endpoint finished_evt')
+    subscription = collections.namedtuple('subscription', 'endpoint topics finished_evt')
 
     def start(self):
 
@@ -339,10 +431,16 @@ class ZMQPubSubMixIn(BaseMixIn):
         logger.info("Importing of zmq took %.3f seconds", time.time() - start)
 
         super(ZMQPubSubMixIn, self).start()
-        self._pubevts = Queue.Queue()
-        self._recvevts = Queue.Queue()
+        self._recvevts = [Queue.Queue() for _ in range(self._event_delivery_threads)]
+        self._recvevts_maxdepth = [0] * len(self._recvevts)
         self._subscriptions = Queue.Queue()
 
+        # Events to publish. The publisher thread is woken up only when the
+        # first event is added to an empty list
+        self._pubevts = []
+        self._pubevts_lock = threading.Lock()
+        self._pubevts_signalled = False
+
         # Setting up zeromq for event publishing/subscription
         # They share the same context, there's no need for two separate ones
         self._zmqctx = zmq.Context()
@@ -354,101 +452,270 @@ class ZMQPubSubMixIn(BaseMixIn):
         pubsock_created = threading.Event()
         subsock_created = threading.Event()
 
+        self._zmqpubwakeup_endpoint = "inproc://evtpub-wakeup-%d" % (id(self),)
         self._zmqpubthread = threading.Thread(target = self._zmq_pub_thread, name="ZMQ evtpub", args=(pubsock_created,))
         self._zmqpubthread.start()
         if not pubsock_created.wait(timeout):
             raise Exception("Failed to create PUB ZMQ socket in %d seconds" % (timeout,))
 
+        self._zmqwakeup_endpoint = "inproc://evtsub-wakeup-%d" % (id(self),)
         self._zmqsubthread = threading.Thread(target = self._zmq_sub_thread, name="ZMQ evtsub", args=(subsock_created,))
         self._zmqsubthread.start()
         if not subsock_created.wait(timeout):
             raise Exception("Failed to create PUB ZMQ socket in %d seconds" % (timeout,))
 
-        self._zmqsubqthread = threading.Thread(target = self._zmq_sub_queue_thread, name="ZMQ evtsubq")
-        self._zmqsubqthread.start()
+        # Used to wake up the publisher thread while holding _pubevts_lock,
+        # and by any thread to wake up the subscriber thread, one at a time
+        self._zmqpubwakeup = self._zmqctx.socket(zmq.PUSH)  # @UndefinedVariable
+        self._zmqpubwakeup.connect(self._zmqpubwakeup_endpoint)
+        self._zmqwakeup_lock = threading.Lock()
+        self._zmqwakeup = self._zmqctx.socket(zmq.PUSH)  # @UndefinedVariable
+        self._zmqwakeup.connect(self._zmqwakeup_endpoint)
+
+        self._zmqsubqthreads = []
+        for i, recvevts in enumerate(self._recvevts):
+            t = threading.Thread(target = self._zmq_sub_queue_thread, name="ZMQ evtsubq-%d" % (i,), args=(recvevts,))
+            t.start()
+            self._zmqsubqthreads.append(t)
 
     def shutdown(self):
         super(ZMQPubSubMixIn, self).shutdown()
-        self._zmqsubqthread.join()
+
+        # Tell our threads to finish
+        with self._pubevts_lock:
+            self._zmqpubwakeup.send(b'stop')
+        for recvevts in self._recvevts:
+            recvevts.put(None)
+        self._wakeup_sub_thread(b'stop')
+
+        for t in self._zmqsubqthreads:
+            t.join()
         self._zmqpubthread.join()
         self._zmqsubthread.join()
+        self._zmqpubwakeup.close()
+        self._zmqwakeup.close()
         self._zmqctx.destroy()
         logger.info("ZMQ context used for event pub/sub destroyed")
 
     def publish_event(self, evt):
-        self._pubevts.put(evt)
+        topics = self._event_topics(evt)
+        if not topics:
+            return
+        with self._pubevts_lock:
+            self._pubevts.append((topics, evt))
+            if not self._pubevts_signalled:
+                self._pubevts_signalled = True
+                self._zmqpubwakeup.send(b'')
 
-    def subscribe(self, host, port):
+    def subscribe(self, host, port, topics=(b'',)):
         timeout = 5
         finished_evt = threading.Event()
         endpoint = "tcp://%s:%d" % (host, port)
-        self._subscriptions.put(ZMQPubSubMixIn.subscription(endpoint, finished_evt))
+        self._subscriptions.put(ZMQPubSubMixIn.subscription(endpoint, topics, finished_evt))
+        self._wakeup_sub_thread()
         if not finished_evt.wait(timeout):
-            raise DaliugeException("ZMQ subscription not achieved within %d seconds" % (timeout,))
+            raise DaliugeException("ZMQ subscription to %s not achieved within %d seconds" % (endpoint, timeout))
         logger.info("Subscribed for events originating from %s", endpoint)
 
+    def _wakeup_sub_thread(self, msg=b''):
+        with self._zmqwakeup_lock:
+            self._zmqwakeup.send(msg)
+
     def _zmq_pub_thread(self, sock_created):
         import zmq
 
-        pub = self._zmqctx.socket(zmq.PUB)  # @UndefinedVariable
+        pub = self._zmqctx.socket(zmq.XPUB)  # @UndefinedVariable
         pub.set_hwm(0) # Never drop messages that should be sent
         endpoint = "tcp://%s:%d" % (zmq_safe(self._host), self._events_port)
         pub.bind(endpoint)
+        wakeup = self._zmqctx.socket(zmq.PULL)  # @UndefinedVariable
+        wakeup.bind(self._zmqpubwakeup_endpoint)
         logger.info("Listening for events via ZeroMQ on %s", endpoint)
         sock_created.set()
 
-        while self._running:
+        poller = zmq.Poller()
+        poller.register(pub, zmq.POLLIN)  # @UndefinedVariable
+        poller.register(wakeup, zmq.POLLIN)  # @UndefinedVariable
+
+        finished = False
+        while not finished:
 
             try:
-                obj = self._pubevts.get_nowait()
-            except Queue.Empty:
-                time.sleep(0.01)
-                continue
+                socks = dict(poller.poll())
+            except Exception:
+                logger.exception("Something bad happened in %s:%d to ZMQ :'(", self._host, self._events_port)
+                break
 
-            while self._running:
+            # Subscriptions, only hello topics need an answer. Unsubscriptions
+            # start with a 0 byte
+            if pub in socks:
+                while True:
+                    try:
+                        msg = pub.recv(flags = zmq.NOBLOCK)  # @UndefinedVariable
+                    except zmq.error.Again:
+                        break
+                    if msg[:1] == b'\x01' and event_wire.is_hello_topic(msg[1:]):
+                        pub.send_multipart([msg[1:], b''])
+
+            if wakeup in socks:
+                while True:
+                    try:
+                        finished |= wakeup.recv(flags = zmq.NOBLOCK) == b'stop'  # @UndefinedVariable
+                    except zmq.error.Again:
+                        break
+                if not finished and self._events_linger > 0:
+                    time.sleep(self._events_linger)
+                self._publish_queued_events(pub)
+
+        pub.close()
+        wakeup.close()
+
+    def _publish_queued_events(self, pub):
+        with self._pubevts_lock:
+            batch, self._pubevts = self._pubevts, []
+            self._pubevts_signalled = False
+
+        # With no high water mark sending never blocks
+        by_topic = collections.defaultdict(list)
+        for topics, evt in batch:
+            for topic in topics:
+                by_topic[topic].append(evt)
+        n = self.max_events_batch
+        for topic, events in by_topic.items():
+            for i in range(0, len(events), n):
                 try:
-                    pub.send_pyobj(obj, flags = zmq.NOBLOCK)  # @UndefinedVariable
-                    break
-                except zmq.error.Again:
-                    logger.debug("Got an 'Again' when publishing event")
-                    time.sleep(0.01)
-                    continue
-
-    def _zmq_sub_queue_thread(self):
-        while self._running:
+                    frame, nevents = self._encode_events(events[i:i + n])
+                    if nevents:
+                        self._events_published += nevents
+                        pub.send_multipart([topic, frame])
+                except Exception:
+                    logger.exception("Error while publishing %d events, they will be dropped", len(events[i:i + n]))
+
+    def _encode_events(self, events):
+        # Returns a frame with the given events and the number of events in it.
+        # Events that can't be encoded are logged and left out, so they don't
+        # prevent the rest of the batch from being published
+        try:
+            return event_wire.encode(events), len(events)
+        except ValueError:
+            pass
+        encodable = []
+        for evt in events:
             try:
-                evt = self._recvevts.get_nowait()
-                self.deliver_event(evt)
-            except Queue.Empty:
-                time.sleep(0.01)
+                event_wire.encode((evt,))
+            except ValueError:
+                logger.exception("Event %r can't be encoded and will be dropped", evt)
+                continue
+            encodable.append(evt)
+        return event_wire.encode(encodable), len(encodable)
+
+    def getEventStats(self):
+        """
+        Returns the event statistics of this Node Manager (see
+        `NodeManagerBase.getEventStats`), plus the current and maximum depth of
+        the queue of each delivery thread under ``queues``.
+        """
+        stats = super(ZMQPubSubMixIn, self).getEventStats()
+        stats['queues'] = [{'depth': q.qsize(), 'maxDepth': maxDepth}
+                           for q, maxDepth in zip(self._recvevts, self._recvevts_maxdepth)]
+        return stats
+
+    def _queue_received_event(self, evt):
+        # Only called from the subscriber thread
+        n = len(self._recvevts)
+        i = hash((evt.session_id, evt.uid)) % n if n > 1 else 0
+        recvevts = self._recvevts[i]
+        recvevts.put(evt)
+        depth = recvevts.qsize()
+        if depth > self._recvevts_maxdepth[i]:
+            self._recvevts_maxdepth[i] = depth
+
+    def _zmq_sub_queue_thread(self, recvevts):
+        while True:
+            evt = recvevts.get()
+            if evt is None:
+                break
+            self.deliver_event(evt)
 
     def _zmq_sub_thread(self, sock_created):
         import zmq
 
-        sub = self._zmqctx.socket(zmq.SUB)  # @UndefinedVariable
-        sub.setsockopt(zmq.SUBSCRIBE, six.b(''))  # @UndefinedVariable
+        # Each publisher is connected to through its own SUB socket, even if
+        # subscribed to for different topics. Subscriptions wait for the
+        # answer to their hello topic in pending
+        subs = {}
+        pending = {}
+        wakeup = self._zmqctx.socket(zmq.PULL)  # @UndefinedVariable
+        wakeup.bind(self._zmqwakeup_endpoint)
         sock_created.set()
 
-        while self._running:
+        poller = zmq.Poller()
+        poller.register(wakeup, zmq.POLLIN)  # @UndefinedVariable
 
-            # A new subscription has been requested
-            try:
-                subscription = self._subscriptions.get_nowait()
-                sub.connect(subscription.endpoint)
-                subscription.finished_evt.set()
-            except Queue.Empty:
-                pass
+        while True:
 
             try:
-                evt = sub.recv_pyobj(flags = zmq.NOBLOCK)  # @UndefinedVariable
-                self._recvevts.put(evt)
-            except zmq.error.Again:
-                time.sleep(0.01)
+                socks = dict(poller.poll())
             except Exception:
-                # Figure out what to do here
                 logger.exception("Something bad happened in %s:%d to ZMQ :'(", self._host, self._events_port)
                 break
 
+            # New subscriptions have been requested, or we are shutting down.
+            # Only the latter closes the wakeup socket, otherwise whoever
+            # wakes us up could block forever
+            if wakeup in socks:
+                if wakeup.recv() == b'stop':
+                    break
+                while True:
+                    try:
+                        subscription = self._subscriptions.get_nowait()
+                    except Queue.Empty:
+                        break
+                    sub = subs.get(subscription.endpoint, None)
+                    if sub is None:
+                        sub = self._zmqctx.socket(zmq.SUB)  # @UndefinedVariable
+                        sub.connect(subscription.endpoint)
+                        poller.register(sub, zmq.POLLIN)  # @UndefinedVariable
+                        subs[subscription.endpoint] = sub
+                    for topic in subscription.topics:
+                        sub.setsockopt(zmq.SUBSCRIBE, topic)  # @UndefinedVariable
+                    hello = event_wire.hello_topic()
+                    sub.setsockopt(zmq.SUBSCRIBE, hello)  # @UndefinedVariable
+                    pending[hello] = subscription
+
+            # Take all the events that have arrived
+            for sub in subs.values():
+                if sub not in socks:
+                    continue
+                while True:
+                    try:
+                        msg = sub.recv_multipart(flags = zmq.NOBLOCK)  # @UndefinedVariable
+                    except zmq.error.Again:
+                        break
+                    except Exception:
+                        # Figure out what to do here
+                        logger.exception("Something bad happened in %s:%d to ZMQ :'(", self._host, self._events_port)
+                        break
+                    if msg[0] in pending:
+                        sub.setsockopt(zmq.UNSUBSCRIBE, msg[0])  # @UndefinedVariable
+                        pending.pop(msg[0]).finished_evt.set()
+                        continue
+                    if event_wire.is_hello_topic(msg[0]):
+                        continue
+                    try:
+                        if len(msg) != 2:
+                            raise ValueError('Expected 2 message parts, got %d' % (len(msg),))
+                        events = event_wire.decode(msg[-1])
+                    except ValueError as e:
+                        logger.warning("Dropping event message: %s", e)
+                        continue
+                    for evt in events:
+                        self._queue_received_event(evt)
+
+        for sub in subs.values():
+            sub.close()
+        wakeup.close()
+
 class ZeroRPCMixIn(BaseMixIn):
 
     request = collections.namedtuple('request', 'method args queue')
@@ -675,7 +942,7 @@ class PyroRPCMixIn(BaseMixIn):
 
             def __pyro4_class_to_dict(o):
                 d = {'__class__' : o.__class__.__name__, '__module__': o.__class__.__module__}
-                d.update(o.__dict__)
+                d.update(o.__getstate__())
                 return d
 
             def __pyro4_dict_to_class(classname, d):
@@ -688,8 +955,9 @@ class PyroRPCMixIn(BaseMixIn):
                     setattr(o, k, d[k])
                 return o
 
-            Pyro4.util.SerializerBase.register_class_to_dict(Event, __pyro4_class_to_dict)
-            Pyro4.util.SerializerBase.register_dict_to_class('Event', __pyro4_dict_to_class)
+            for clazz in [Event] + Event.__subclasses__():
+                Pyro4.util.SerializerBase.register_class_to_dict(clazz, __pyro4_class_to_dict)
+                Pyro4.util.SerializerBase.register_dict_to_class(clazz.__name__, __pyro4_dict_to_class)
 
         def setup_pickle():
             Pyro4.config.SERIALIZER = 'pickle'
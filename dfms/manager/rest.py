@@ -239,7 +239,7 @@ class NMRestServer(ManagerRestServer):
     def getNMStatus(self):
         # we currently return the sessionIds, more things might be added in the
         # future
-        return {'sessions': self.sessions()}
+        return {'sessions': self.sessions(), 'events': self.dm.getEventStats()}
 
     @daliuge_aware
     def linkGraphParts(self, sessionId):
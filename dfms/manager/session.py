@@ -34,7 +34,8 @@ from dfms import droputils
 from dfms import luigi_int, graph_loader
 from dfms.ddap_protocol import DROPStates, DROPLinkType, DROPRel
 from dfms.drop import AbstractDROP, AppDROP, InputFiredAppDROP, \
-    LINKTYPE_1TON_APPEND_METHOD, LINKTYPE_1TON_BACK_APPEND_METHOD
+    LINKTYPE_1TON_APPEND_METHOD, LINKTYPE_1TON_BACK_APPEND_METHOD, \
+    SharedMemoryDROP
 from dfms.exceptions import InvalidSessionState, InvalidGraphException, \
     NoDropException, DaliugeException
 from dfms.manager import constants
@@ -132,6 +133,7 @@ class Session(object):
         self._error_status_listener = None
         self._enable_luigi = enable_luigi
         self._dropsubs = {}
+        self._evtdests = {}
         if error_listener:
             self._error_status_listener = ErrorStatusListener(self, error_listener)
 
@@ -149,6 +151,17 @@ class Session(object):
         with self._statusLock:
             self._status = status
 
+    @property
+    def node(self):
+        """
+        The name of the node this session runs on, as given by the ``node``
+        attribute of its DROP specifications, or None if they don't have one.
+        """
+        for dropSpec in self._graph.values():
+            if 'node' in dropSpec:
+                return dropSpec['node']
+        return None
+
     @property
     def roots(self):
         return self._roots
@@ -249,6 +262,8 @@ class Session(object):
                 drop.subscribe(self._error_status_listener, eventType='status')
         logger.info("Stored all drops, proceeding with further customization")
 
+        self._prioritize_apps()
+
         # Start the luigi task that will make sure the graph is executed
         # If we're not using luigi we still
         if self._enable_luigi:
@@ -271,14 +286,6 @@ class Session(object):
                     leaf.subscribe(listener, 'dropCompleted')
             logger.info("Listener added to leaf drops")
 
-        # We move to COMPLETED the DROPs that we were requested to
-        # InputFiredAppDROP are here considered as having to be executed and
-        # not directly moved to COMPLETED.
-        #
-        # This is done in a separate iteration at the very end because all drops
-        # to make sure all event listeners are ready
-        self.trigger_drops(completedDrops)
-
         # Foreach
         if foreach:
             logger.info("Invoking 'foreach' on each drop")
@@ -286,6 +293,15 @@ class Session(object):
                 foreach(drop)
             logger.info("'foreach' invoked for each drop")
 
+        # We move to COMPLETED the DROPs that we were requested to
+        # InputFiredAppDROP are here considered as having to be executed and
+        # not directly moved to COMPLETED.
+        #
+        # This is done in a separate iteration at the very end because all drops
+        # to make sure all event listeners (and executors given by 'foreach')
+        # are ready
+        self.trigger_drops(completedDrops)
+
         # Append proxies
         logger.info("Creating %d drop proxies", len(self._proxyinfo))
         for nm, host, port, local_uid, relname, remote_uid in self._proxyinfo:
@@ -296,6 +312,25 @@ class Session(object):
         self.status = SessionStates.RUNNING
         logger.info("Session %s is now RUNNING", self._sessionId)
 
+    def _prioritize_apps(self):
+        """
+        Sets the priority of each application of this session to the length of
+        the critical path remaining after it, so apps in the critical path get
+        executed first. Apps are weighted by their 'tw' (time weight) attribute
+        if present in their specification. Apps explicitly given a priority in
+        their specification are left untouched.
+        """
+        def weight(drop):
+            if not isinstance(drop, InputFiredAppDROP):
+                return 0
+            return self._graph[drop.oid].get('tw', 1)
+
+        lengths = droputils.get_critical_path_lengths(self._roots, weight)
+        for uid, length in lengths.items():
+            drop = self._drops[uid]
+            if isinstance(drop, InputFiredAppDROP) and 'priority' not in self._graph[drop.oid]:
+                drop.priority = length
+
     def _run(self, worker):
         worker.run()
         worker.stop()
@@ -323,6 +358,13 @@ class Session(object):
             logger.debug("Passing event %r to %r", evt, drop)
             drop.handleEvent(evt)
 
+    def event_destinations(self, uid):
+        """
+        Returns the names of the nodes interested in the events fired by the
+        local drop `uid`.
+        """
+        return self._evtdests.get(uid, ())
+
     def add_node_subscriptions(self, sessionId, relationships, nm):
 
         evt_consumer = (DROPLinkType.CONSUMER, DROPLinkType.STREAMING_CONSUMER, DROPLinkType.OUTPUT)
@@ -338,7 +380,8 @@ class Session(object):
             if type(host) is tuple:
                 host, _, rpc_port = host
 
-            # Store which drops should receive events from which remote drops
+            # Store which drops should receive events from which remote drops,
+            # and which nodes should receive events from which local drops
             dropsubs = collections.defaultdict(set)
             for rel in droprels:
 
@@ -356,6 +399,10 @@ class Session(object):
                 if (rel.rel in evt_consumer and rel.lhs is local_uid) or \
                    (rel.rel in evt_producer and rel.rhs is local_uid):
                     dropsubs[remote_uid].add(local_uid)
+                # We are in the event sender side
+                elif (rel.rel in evt_consumer and rel.rhs is local_uid) or \
+                     (rel.rel in evt_producer and rel.lhs is local_uid):
+                    self._evtdests.setdefault(local_uid, set()).add(host)
 
             self._dropsubs.update(dropsubs)
 
@@ -400,7 +447,14 @@ class Session(object):
         return dict(self._graph)
 
     def destroy(self):
-        pass
+        # Shared memory objects would otherwise outlive the session, taking up
+        # memory until they are removed by hand or the node is rebooted
+        for drop in list(self._drops.values()):
+            if isinstance(drop, SharedMemoryDROP) and drop.exists():
+                try:
+                    drop.delete()
+                except Exception:
+                    logger.exception("Error while deleting %r", drop)
 
     __del__ = destroy
 
@@ -25,25 +25,218 @@ Installing the NGAS client libraries is still a not-so-trivial exercise, and
 while not all dfms installations have the NGAS client libraries available we
 still need to access NGAS from time to time.
 
+Connections are kept alive after each request and handed out again for the
+next request to the same NGAS server, so a stream of small RETRIEVE and
+QARCHIVE requests doesn't pay for a new TCP connection each time.
+
 @author: rtobar
 '''
 
+import collections
+import re
+import select
+import socket
+import threading
+
 import six.moves.http_client as httplib  # @UnresolvedImport
 
+from dfms.utils import ParallelSegmentReader
+
+
+#: Maximum number of idle connections kept alive for each NGAS server
+MAX_IDLE_CONNECTIONS = 8
+
+_idle = collections.defaultdict(list)
+_idleLock = threading.Lock()
+_contentRange = re.compile(r'bytes \d+-\d+/(\d+)')
+
+class ArchiveConnection(httplib.HTTPConnection):
+    """
+    An HTTP connection to an NGAS server, as handed out by `getConnection`.
+
+    When used for a QARCHIVE request the data is sent via successive calls to
+    `write`. If the length of the data is not known beforehand the data is
+    sent using chunked transfer encoding.
+    """
+
+    chunked = False
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        # Requests and data are sent in as few calls as possible, so there is
+        # no point in delaying them (and with keep-alive connections, small
+        # requests would otherwise stall on delayed ACKs)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def write(self, data):
+        if not self.chunked:
+            self.send(data)
+        elif len(data):
+            # A single send keeps the framing and the data in the same packets
+            self.send(b''.join([('%x\r\n' % len(data)).encode('ascii'), data, b'\r\n']))
+
+def _isDropped(conn):
+    # An idle keep-alive connection should have nothing to read; if it does
+    # then the server either closed it or is sending garbage
+    if conn.sock is None:
+        return False
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (select.error, ValueError):
+        return True
+
+def getConnection(host, port=7777, timeout=None):
+    """
+    Returns a connection to the NGAS server located at `host`:`port`, reusing
+    one of its idle connections if possible. Connections should be given back
+    via `releaseConnection` after the response of their last request has been
+    read.
+    """
+    conn = None
+    with _idleLock:
+        idle = _idle[(host, port)]
+        while idle and conn is None:
+            conn = idle.pop()
+            if _isDropped(conn):
+                conn.close()
+                conn = None
+
+    if conn is None:
+        return ArchiveConnection(host, port, timeout=timeout)
+
+    conn.chunked = False
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    return conn
+
+def releaseConnection(conn, response):
+    """
+    Gives `conn` back to the pool of idle connections if `response`, the
+    response to its last request, has been fully read and the server is
+    keeping the connection alive. Otherwise the connection is closed.
+    """
+    if response.will_close or not response.isclosed() or conn.sock is None:
+        conn.close()
+        return
+    with _idleLock:
+        idle = _idle[(conn.host, conn.port)]
+        if len(idle) < MAX_IDLE_CONNECTIONS:
+            idle.append(conn)
+            return
+    conn.close()
 
-def retrieve(host, fileId, port=7777, timeout=None):
+def closeConnections():
+    """
+    Closes all idle connections
+    """
+    with _idleLock:
+        for idle in _idle.values():
+            for conn in idle:
+                conn.close()
+        _idle.clear()
+
+def _get(host, port, timeout, url, headers={}):
+    # RETRIEVEs are idempotent, so if a reused connection turns out to be
+    # broken we can safely try again on a new one
+    conn = getConnection(host, port, timeout)
+    if conn.sock is not None:
+        try:
+            conn.request('GET', url, headers=headers)
+            return conn, conn.getresponse()
+        except (httplib.HTTPException, socket.error):
+            conn.close()
+            conn = ArchiveConnection(host, port, timeout=timeout)
+    try:
+        conn.request('GET', url, headers=headers)
+        return conn, conn.getresponse()
+    except:
+        conn.close()
+        raise
+
+def _retrieveError(fileId, host, port, response):
+    return Exception("Error while RETRIEVE-ing %s from %s:%d: %d %s" % (fileId, host, port, response.status, response.msg))
+
+class Retrieval(object):
+    """
+    The file-like object returned by `retrieve` when the file is read over a
+    single connection
+    """
+
+    def __init__(self, conn, response):
+        self._conn = conn
+        self._response = response
+
+    def read(self, count=-1):
+        if count is None or count < 0:
+            return self._response.read()
+        return self._response.read(count)
+
+    def close(self):
+        releaseConnection(self._conn, self._response)
+
+class ParallelRetrieval(ParallelSegmentReader):
+    """
+    The file-like object returned by `retrieve` when the file is read in
+    segments of `segmentSize` bytes, up to `parallelism` of which are fetched
+    concurrently using ranged GETs over different connections.
+    """
+
+    def __init__(self, host, port, fileId, timeout, size, segmentSize, parallelism, first):
+        self._host = host
+        self._port = port
+        self._fileId = fileId
+        self._timeout = timeout
+        super(ParallelRetrieval, self).__init__(self._retrieveRange, size, segmentSize, parallelism, first=first)
+
+    def _retrieveRange(self, start, end):
+        conn, response = _get(self._host, self._port, self._timeout,
+                              '/RETRIEVE?file_id=' + self._fileId,
+                              {'Range': 'bytes=%d-%d' % (start, end - 1)})
+        try:
+            if response.status != httplib.PARTIAL_CONTENT:
+                raise _retrieveError(self._fileId, self._host, self._port, response)
+            data = response.read()
+        finally:
+            releaseConnection(conn, response)
+        if len(data) != end - start:
+            raise Exception("Short read while RETRIEVE-ing %s from %s:%d" % (self._fileId, self._host, self._port))
+        return data
+
+def retrieve(host, fileId, port=7777, timeout=None, parallelism=1, segmentSize=16*1024**2):
     """
     Retrieve the given fileId from the NGAS server located at `host`:`port`
 
     This method returns a file-like object that supports the `read` operation,
     and over which `close` must be invoked once no more data is read from it.
+
+    If `parallelism` is greater than one, and the server supports ranged
+    requests, the file is fetched in segments of `segmentSize` bytes over up to
+    `parallelism` concurrent connections.
     """
-    conn = httplib.HTTPConnection(host, port, timeout=timeout)
-    conn.request('GET', '/RETRIEVE?file_id=' + fileId)
-    response = conn.getresponse()
-    if response.status != httplib.OK:
-        raise Exception("Error while RETRIEVE-ing %s from %s:%d: %d %s" % (fileId, host, port, response.status, response.msg))
-    return response
+    url = '/RETRIEVE?file_id=' + fileId
+    if parallelism <= 1:
+        conn, response = _get(host, port, timeout, url)
+        if response.status != httplib.OK:
+            conn.close()
+            raise _retrieveError(fileId, host, port, response)
+        return Retrieval(conn, response)
+
+    # The first segment tells us whether ranges are supported at all, and
+    # the total size of the file
+    conn, response = _get(host, port, timeout, url, {'Range': 'bytes=0-%d' % (segmentSize - 1)})
+    if response.status == httplib.OK:
+        return Retrieval(conn, response)
+    try:
+        match = _contentRange.match(response.getheader('Content-Range', ''))
+        if response.status != httplib.PARTIAL_CONTENT or not match:
+            raise _retrieveError(fileId, host, port, response)
+        first = response.read()
+    finally:
+        releaseConnection(conn, response)
+
+    size = int(match.group(1))
+    return ParallelRetrieval(host, port, fileId, timeout, size, segmentSize, parallelism, first)
 
 def beingArchive(host, fileId, port=7777, timeout=0, length=-1):
     """
@@ -51,22 +244,41 @@ def beingArchive(host, fileId, port=7777, timeout=0, length=-1):
     the request for archiving the given `fileId`.
 
     This method returns the HTTP connection object, over which subsequential
-    calls to `send` must be made with the chunks of data that need to be stored.
-    Once all the data has been sent, the `finishArchive` method of this module
-    should be invoked to check that all went well with the archiving.
-    """
-    conn = httplib.HTTPConnection(host, port, timeout=timeout)
-    conn.putrequest('POST', '/QARCHIVE?filename=' + fileId)
-    conn.putheader('Content-Type', 'application/octet-stream')
-    if length != -1:
-        conn.putheader('Content-Length', length)
-    conn.endheaders()
+    calls to `write` must be made with the chunks of data that need to be
+    stored. These are streamed to the server as they are written, so there is
+    no need to know the total `length` in advance. Once all the data has been
+    sent, the `finishArchive` method of this module should be invoked to check
+    that all went well with the archiving.
+    """
+    conn = getConnection(host, port, timeout=timeout)
+    try:
+        conn.putrequest('POST', '/QARCHIVE?filename=' + fileId)
+        conn.putheader('Content-Type', 'application/octet-stream')
+        if length != -1:
+            conn.putheader('Content-Length', length)
+        else:
+            conn.putheader('Transfer-Encoding', 'chunked')
+            conn.chunked = True
+        conn.endheaders()
+    except:
+        conn.close()
+        raise
     return conn
 
 def finishArchive(conn, fileId):
     """
     Checks that an archiving started by `beginArchive` went on successfully.
+    The connection is given back to the pool afterwards, and must not be used
+    by the caller anymore.
     """
-    response = conn.getresponse()
+    try:
+        if conn.chunked:
+            conn.send(b'0\r\n\r\n')
+        response = conn.getresponse()
+        response.read()
+    except:
+        conn.close()
+        raise
+    releaseConnection(conn, response)
     if response.status != httplib.OK:
-        raise Exception("Error while QARCHIVE-ing %s to %s:%d: %d %s" % (fileId, conn.host, conn.port, response.status, response.msg))
\ No newline at end of file
+        raise Exception("Error while QARCHIVE-ing %s to %s:%d: %d %s" % (fileId, conn.host, conn.port, response.status, response.msg))
@@ -0,0 +1,257 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Execution of application DROPs in a pool of worker processes.
+
+Pure-python, CPU-bound applications running inside a Node Manager serialize
+on the GIL no matter how many cores the node has. Applications that opt-in to
+run in a separate process (see `dfms.drop.InputFiredAppDROP.run_in_process`)
+have their `run` method executed instead in one of the processes of a
+`ProcessPool`.
+
+To do so a *detached* copy of the application and its inputs and outputs is
+sent to the worker process. Detached copies have the same state as the
+originals but no relationships, listeners or open I/O, so the application
+code accesses its inputs and outputs as usual, reading and writing data
+directly from and into their storage (e.g., files). Data of DROPs whose
+dataURL cannot be resolved from another process (e.g., InMemoryDROPs) travels
+instead together with the copies, and is written back into the original
+outputs once the application finishes.
+"""
+
+import collections
+import logging
+import multiprocessing
+import threading
+
+from dfms import io
+
+
+logger = logging.getLogger(__name__)
+
+# Attributes of DROPs that only make sense within the process they live in,
+# and therefore are never copied over to worker processes
+_LOCAL_ATTRS = frozenset(['_listeners', '_dispatch', '_lock', '_consumers',
+                          '_producers', '_streamingConsumers',
+                          '_finishedProducers', '_rios', '_wio', '_parent',
+                          '_children', '_inputs', '_outputs',
+                          '_streamingInputs', '_executor', '_checksummer',
+                          '_streamingChannels', '_writeBuffer'])
+
+# How often applications waiting on a worker check if their pool is still there
+_SHUTDOWN_CHECK_PERIOD = 1
+
+class ProcessPool(object):
+    """
+    A pool of worker processes, started when first used.
+
+    Each Node Manager has its own pool, handed to its applications through
+    their executor, so shutting down one Node Manager doesn't affect the
+    applications of another one living in the same process. Applications
+    without such an executor use a default pool (see `get_pool`).
+
+    Worker processes are started fresh rather than forked where possible,
+    since forking a process with many running threads (like a Node Manager)
+    can leave the child with locks that will never be released.
+    """
+
+    def __init__(self, max_processes=None):
+        self._size = max_processes or None
+        self._pool = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def max_processes(self):
+        return self._size
+
+    @max_processes.setter
+    def max_processes(self, max_processes):
+        # Only has an effect if the pool hasn't been started
+        self._size = max_processes or None
+
+    def _get(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Pool of worker processes was shut down")
+            if self._pool is None:
+                if hasattr(multiprocessing, 'get_context'):
+                    ctx = multiprocessing.get_context('spawn')
+                else:
+                    ctx = multiprocessing
+                self._pool = ctx.Pool(self._size)
+                logger.info("Started pool of worker processes for applications")
+            return self._pool
+
+    def apply(self, fn, args):
+        """
+        Calls `fn` with `args` in one of the worker processes and returns its
+        result. A `RuntimeError` is raised if the pool is shut down in the
+        meanwhile, instead of waiting forever for a result that won't come.
+        """
+        pool = self._get()
+        result = pool.apply_async(fn, args)
+        while True:
+            try:
+                return result.get(_SHUTDOWN_CHECK_PERIOD)
+            except multiprocessing.TimeoutError:
+                if self._pool is not pool:
+                    raise RuntimeError("Pool of worker processes was shut down")
+
+    def shutdown(self):
+        """
+        Terminates the worker processes, if started. Applications waiting on
+        them, and those trying to use the pool afterwards, get a `RuntimeError`.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+            self._closed = True
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+_default_pool = ProcessPool()
+
+def set_max_processes(max_processes):
+    """
+    Sets the number of worker processes of the default pool. It has no effect
+    if the pool has already been started. If `None` or 0, the number of CPUs
+    of the machine is used.
+    """
+    _default_pool.max_processes = max_processes
+
+def get_pool():
+    """
+    Returns the default `ProcessPool`, used by applications that don't get one
+    from their executor.
+    """
+    return _default_pool
+
+def shutdown():
+    """
+    Terminates the worker processes of the default pool, if started. A new
+    default pool is started if needed afterwards.
+    """
+    global _default_pool
+    pool, _default_pool = _default_pool, ProcessPool(_default_pool.max_processes)
+    pool.shutdown()
+
+def _get_state(obj):
+    state = {}
+    for cls in type(obj).__mro__:
+        for slot in cls.__dict__.get('__slots__', ()):
+            if slot not in _LOCAL_ATTRS and hasattr(obj, slot):
+                state[slot] = getattr(obj, slot)
+    for k, v in getattr(obj, '__dict__', {}).items():
+        if k not in _LOCAL_ATTRS:
+            state[k] = v
+    return state
+
+def _detach(drop):
+    return drop.__class__, _get_state(drop)
+
+def _attach(detached):
+    cls, state = detached
+    drop = cls.__new__(cls)
+    for k, v in state.items():
+        setattr(drop, k, v)
+    for k in _LOCAL_ATTRS:
+        if hasattr(cls, k) or hasattr(drop, '__dict__'):
+            setattr(drop, k, None)
+    drop._lock = threading.RLock()
+    return drop
+
+def _is_local(drop):
+    # The data of DROPs whose dataURL can't be resolved lives in our process,
+    # and so does that of mem:// URLs, which only our process can resolve
+    try:
+        url = drop.dataURL
+        return url.split('://', 1)[0].split('+')[-1] == 'mem' or io.IOForURL(url) is None
+    except NotImplementedError:
+        return True
+
+def can_run_in_process(app):
+    """
+    Returns whether `app` can have its `run` method executed by a worker
+    process. Applications with outputs feeding streaming consumers cannot,
+    since their data must be written through the original outputs.
+    """
+    return not any(o.streamingConsumers for o in app.outputs)
+
+def run_in_process(app, pool=None):
+    """
+    Executes the `run` method of `app` in a worker process of `pool` (or of the
+    default pool), blocking until it finishes. Any exception raised by `run`
+    is re-raised in the caller.
+    """
+    inputs = [_detach(i) for i in app.inputs]
+    outputs = [(_detach(o), _is_local(o)) for o in app.outputs]
+    results = (pool or get_pool()).apply(_run, (_detach(app), inputs, outputs))
+
+    for o, (size, checksum, checksumType, data) in zip(app.outputs, results):
+        if data is not None:
+            o.write(data)
+        elif size is not None:
+            # Data was written directly into the final storage
+            o._size = size
+            o._checksum = checksum
+            o._checksumType = checksumType
+
+def _run(detached_app, inputs, outputs):
+    """
+    Runs the detached application in the worker process, returning for each
+    output its size, checksum and checksum type, plus its data if it would be
+    lost otherwise.
+    """
+    app = _attach(detached_app)
+    app._inputs = collections.OrderedDict()
+    app._outputs = collections.OrderedDict()
+    app._streamingInputs = collections.OrderedDict()
+    for i in inputs:
+        i = _attach(i)
+        app._inputs[i.uid] = i
+
+    local_outputs = []
+    for o, is_local in outputs:
+        o = _attach(o)
+        # Output completion is decided by the original DROPs
+        o._expectedSize = -1
+        app._outputs[o.uid] = o
+        local_outputs.append(is_local)
+
+    app.run()
+
+    results = []
+    for o, is_local in zip(app._outputs.values(), local_outputs):
+        if o._wio:
+            o._wio.close()
+        o._finishChecksum()
+        data = None
+        if is_local and o._size:
+            dataIO = o._dataIO()
+            dataIO.open(io.OpenMode.OPEN_READ)
+            try:
+                data = dataIO.read(o._size)
+            finally:
+                dataIO.close()
+        results.append((o._size, o._checksum, o._checksumType, data))
+    return results
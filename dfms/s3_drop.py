@@ -22,24 +22,231 @@
 """
 Drops that interact with AWS S3
 """
+import threading
+
 import boto3
-import botocore
+import botocore.config
+import botocore.exceptions
+from six.moves import queue as Queue  # @UnresolvedImport
 
 from dfms.drop import AbstractDROP
-from dfms.io import ErrorIO
+from dfms.io import DataIO, OpenMode
+from dfms.utils import ParallelSegmentReader
+
+
+#: Default size of the parts in which data is uploaded to and read from S3
+DEFAULT_PART_SIZE = 8 * 1024**2
+
+#: S3 requires all parts of a multipart upload but the last to be this big
+MIN_PART_SIZE = 5 * 1024**2
+
+_sessions = {}
+_sessionsLock = threading.Lock()
+
+def _is_not_found(e):
+    return e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NoSuchBucket', 'NotFound')
+
+class S3Session(object):
+    """
+    A boto3 S3 client shared by all the S3DROPs using the same credentials and
+    endpoint, together with the buckets known to exist through it. boto3
+    clients (unlike resources) are thread-safe, so a single one can be used
+    by all the threads uploading and downloading data.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._buckets = set()
+
+    def bucket_exists(self, bucket):
+        """
+        Returns whether `bucket` exists. Only the first check of each bucket
+        costs a round trip to S3.
+        """
+        if bucket in self._buckets:
+            return True
+        try:
+            self.client.head_bucket(Bucket=bucket)
+        except botocore.exceptions.ClientError as e:
+            # Other errors (e.g., we can't list the bucket but can read its
+            # objects) don't prove the bucket doesn't exist
+            if _is_not_found(e):
+                return False
+        self._buckets.add(bucket)
+        return True
+
+def get_session(profile_name=None, aws_access_key_id=None, aws_secret_access_key=None,
+                endpoint_url=None, max_concurrency=4):
+    """
+    Returns the S3Session for the given credentials and endpoint, creating it
+    if necessary. A non-default `endpoint_url` can be given to use
+    S3-compatible stores other than AWS.
+    """
+    key = (profile_name, aws_access_key_id, aws_secret_access_key, endpoint_url)
+    with _sessionsLock:
+        session = _sessions.get(key)
+        if session is None:
+            if profile_name is not None or aws_access_key_id is not None or aws_secret_access_key is not None:
+                boto_session = boto3.session.Session(profile_name=profile_name, aws_access_key_id=aws_access_key_id, aws_secret_access_key=aws_secret_access_key)
+            else:
+                boto_session = boto3.session.Session()
+            s3_config = {'addressing_style': 'path'} if endpoint_url else {}
+            config = botocore.config.Config(max_pool_connections=max(10, max_concurrency + 1), s3=s3_config)
+            session = S3Session(boto_session.client('s3', endpoint_url=endpoint_url, config=config))
+            _sessions[key] = session
+        return session
+
+class S3IO(DataIO):
+    """
+    A DataIO that reads/writes the data of an S3 object.
+
+    Data is uploaded as it is written. It is gathered in parts of `partSize`
+    bytes (at least `MIN_PART_SIZE`), which are uploaded as the parts of a
+    multipart upload by up to `concurrency` threads. Writers block while
+    `concurrency` parts are waiting to be uploaded, bounding the amount of
+    memory used. Objects smaller than a part are uploaded with a single PUT.
+
+    Data is read with ranged GETs of `partSize` bytes, up to `concurrency`
+    of which are done concurrently.
+    """
+
+    def __init__(self, session, bucket, key, partSize=DEFAULT_PART_SIZE, concurrency=4):
+        super(S3IO, self).__init__()
+        self._session = session
+        self._bucket = bucket
+        self._key = key
+        self._partSize = max(partSize, MIN_PART_SIZE)
+        self._concurrency = max(concurrency, 1)
+
+    def _open(self, **kwargs):
+        client = self._session.client
+        if self._mode == OpenMode.OPEN_WRITE:
+            if not self._session.bucket_exists(self._bucket):
+                raise Exception("S3 bucket %s doesn't exist" % (self._bucket,))
+            self._pending = bytearray()
+            self._uploadId = None
+            self._nparts = 0
+            self._etags = {}
+            self._error = None
+            self._queue = Queue.Queue(maxsize=self._concurrency)
+            self._uploaders = []
+            return None
+
+        size = client.head_object(Bucket=self._bucket, Key=self._key)['ContentLength']
+        if self._concurrency == 1 or size <= self._partSize:
+            return client.get_object(Bucket=self._bucket, Key=self._key)['Body']
+        return ParallelSegmentReader(self._getRange, size, self._partSize, self._concurrency)
+
+    def _getRange(self, start, end):
+        response = self._session.client.get_object(Bucket=self._bucket, Key=self._key,
+                                                   Range='bytes=%d-%d' % (start, end - 1))
+        return response['Body'].read()
 
+    def _read(self, count=4096, **kwargs):
+        return self._desc.read(count)
+
+    def _write(self, data, **kwargs):
+        self._pending += data
+        partSize = self._partSize
+        if len(self._pending) >= partSize:
+            view = memoryview(self._pending)
+            start = 0
+            while len(view) - start >= partSize:
+                self._uploadPart(view[start:start + partSize].tobytes())
+                start += partSize
+            view.release()
+            del self._pending[:start]
+        return len(data)
+
+    def _uploadPart(self, data):
+        if self._error is not None:
+            raise self._error
+        if self._uploadId is None:
+            response = self._session.client.create_multipart_upload(Bucket=self._bucket, Key=self._key)
+            self._uploadId = response['UploadId']
+            for i in range(self._concurrency):
+                t = threading.Thread(target=self._upload, name='S3 upload #%d of %s' % (i, self._key))
+                t.daemon = True
+                t.start()
+                self._uploaders.append(t)
+        self._nparts += 1
+        self._queue.put((self._nparts, data))
+
+    def _upload(self):
+        client = self._session.client
+        while True:
+            part = self._queue.get()
+            if part is None:
+                return
+            # After an error we keep consuming parts so writers don't block
+            if self._error is not None:
+                continue
+            partNumber, data = part
+            try:
+                response = client.upload_part(Bucket=self._bucket, Key=self._key, UploadId=self._uploadId,
+                                              PartNumber=partNumber, Body=data)
+                self._etags[partNumber] = response['ETag']
+            except Exception as e:
+                self._error = e
+
+    def _close(self, **kwargs):
+        if self._mode == OpenMode.OPEN_READ:
+            self._desc.close()
+            return
+
+        client = self._session.client
+        if self._uploadId is None:
+            client.put_object(Bucket=self._bucket, Key=self._key, Body=bytes(self._pending))
+            return
+
+        try:
+            if self._pending:
+                self._uploadPart(bytes(self._pending))
+        finally:
+            for _ in self._uploaders:
+                self._queue.put(None)
+            for t in self._uploaders:
+                t.join()
+
+        if self._error is not None:
+            client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._uploadId)
+            raise self._error
+        parts = [{'PartNumber': n, 'ETag': self._etags[n]} for n in sorted(self._etags)]
+        client.complete_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._uploadId,
+                                         MultipartUpload={'Parts': parts})
+
+    def exists(self):
+        try:
+            self._session.client.head_object(Bucket=self._bucket, Key=self._key)
+            return True
+        except botocore.exceptions.ClientError as e:
+            if _is_not_found(e):
+                return False
+            raise
+
+    def delete(self):
+        pass # Like NGAS, S3 is a final destination for data
 
 class S3DROP(AbstractDROP):
     """
-    A DROP that points to data stored in S3
+    A DROP that points to data stored in S3.
+
+    Its data is read and written through an S3IO with parts of `part_size`
+    bytes, `max_concurrency` of which are transferred concurrently. A
+    non-default `endpoint_url` can be given to use S3-compatible stores.
     """
+
+    __slots__ = ('_bucket', '_key', '_aws_access_key_id',
+                 '_aws_secret_access_key', '_profile_name', '_endpoint_url',
+                 '_part_size', '_max_concurrency')
+
     def __init__(self, oid, uid, **kwargs):
         self._bucket = None
         self._key = None
         self._aws_access_key_id = None
         self._aws_secret_access_key = None
         self._profile_name = None
-        self._s3 = None
+        self._endpoint_url = None
         super(S3DROP, self).__init__(oid, uid, **kwargs)
 
     def initialize(self, **kwargs):
@@ -52,6 +259,9 @@ class S3DROP(AbstractDROP):
         self._aws_access_key_id = self._getArg(kwargs, 'aws_access_key_id', None)
         self._aws_secret_access_key = self._getArg(kwargs, 'aws_secret_access_key', None)
         self._profile_name = self._getArg(kwargs, 'profile_name', None)
+        self._endpoint_url = self._getArg(kwargs, 'endpoint_url', None)
+        self._part_size = int(self._getArg(kwargs, 'part_size', DEFAULT_PART_SIZE))
+        self._max_concurrency = int(self._getArg(kwargs, 'max_concurrency', 4))
 
     @property
     def bucket(self):
@@ -82,47 +292,24 @@ class S3DROP(AbstractDROP):
         return "s3://" + self._bucket + '/' + self._key
 
     def exists(self):
-        s3 = self._get_s3_connection()
-        try:
-            s3.meta.client.head_bucket(Bucket=self._bucket)
-        except botocore.exceptions.ClientError as e:
-            # If a client error is thrown, then check that it was a 404 error.
-            # If it was a 404 error, then the bucket does not exist.
-            error_code = int(e.response['Error']['Code'])
-            if error_code == 404:
-                return False
+        # A single HEAD tells us whether the object exists, which it can't if
+        # the bucket doesn't
+        return self.getIO().exists()
 
+    def size(self):
         try:
-            s3.meta.client.head_object(Bucket=self._bucket, Key=self._key)
+            response = self._get_session().client.head_object(Bucket=self._bucket, Key=self._key)
         except botocore.exceptions.ClientError as e:
-            # If a client error is thrown, then check that it was a 404 error.
-            # If it was a 404 error, then the bucket does not exist.
-            error_code = int(e.response['Error']['Code'])
-            if error_code == 404:
-                return False
-
-        return True
-
-    def size(self):
-        if self.exists():
-            s3 = self._get_s3_connection()
-            object = s3.Object(self._bucket, self._key)
-            return object.content_length
-
-        return -1
+            if _is_not_found(e):
+                return -1
+            raise
+        return response['ContentLength']
 
     def getIO(self):
-        """
-        This type of DROP cannot be accessed directly
-        :return:
-        """
-        return ErrorIO()
+        return S3IO(self._get_session(), self._bucket, self._key,
+                    partSize=self._part_size, concurrency=self._max_concurrency)
 
-    def _get_s3_connection(self):
-        if self._s3 is None:
-            if self._profile_name is not None or self._aws_access_key_id is not None or self._aws_secret_access_key is not None:
-                session = boto3.session.Session(profile_name=self._profile_name, aws_access_key_id=self._aws_access_key_id, aws_secret_access_key=self._aws_secret_access_key)
-                self._s3 = session.resource('s3')
-            else:
-                self._s3 = boto3.resource('s3')
-        return self._s3
+    def _get_session(self):
+        return get_session(self._profile_name, self._aws_access_key_id,
+                           self._aws_secret_access_key, self._endpoint_url,
+                           self._max_concurrency)
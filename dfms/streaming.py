@@ -0,0 +1,187 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+Decoupled delivery of the data written into DROPs to their streaming
+consumers.
+
+By default DROPs call the `dataWritten` method of their streaming consumers
+synchronously from within their own `write` method, so a slow consumer stalls
+its producer. DROPs created with a positive ``streamingHighWaterMark`` instead
+put a `StreamingChannel` between themselves and each of their streaming
+consumers. Channels queue the written data and deliver it to the consumer from
+a dedicated thread, and decide what to do with new data when more than
+``streamingHighWaterMark`` bytes are already queued depending on the
+``streamingBufferPolicy`` of the DROP (see
+`dfms.ddap_protocol.StreamingBufferPolicies`).
+"""
+
+import collections
+import logging
+import tempfile
+import threading
+
+from dfms.ddap_protocol import StreamingBufferPolicies
+
+
+logger = logging.getLogger(__name__)
+
+# Kinds of items in a channel's queue
+_DATA, _SPILLED, _EVENT = range(3)
+
+class StreamingChannel(object):
+    """
+    A bounded queue between a DROP and one of its streaming consumers, plus
+    the thread delivering the queued data and events to the consumer.
+
+    Channels look like streaming consumers to the DROP feeding them: data is
+    handed over via `dataWritten` and the `dropCompleted` event via
+    `handleEvent`. Events are queued like data, so consumers are notified that
+    their input has finished only after they received all its data.
+    """
+
+    __slots__ = ('_consumer', '_highWaterMark', '_policy', '_spillDir',
+                 '_spillFile', '_spillReadPos', '_cond', '_items', '_depth',
+                 '_maxDepth', '_dropped', '_spilled', '_thread')
+
+    def __init__(self, consumer, highWaterMark,
+                 policy=StreamingBufferPolicies.BLOCK, spillDir=None):
+        self._consumer = consumer
+        self._highWaterMark = highWaterMark
+        self._policy = policy
+        self._spillDir = spillDir
+        self._spillFile = None
+        self._spillReadPos = 0
+        self._cond = threading.Condition()
+        self._items = collections.deque()
+        self._depth = 0
+        self._maxDepth = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._thread = None
+
+    @property
+    def consumer(self):
+        return self._consumer
+
+    @property
+    def depth(self):
+        """The number of bytes currently queued in memory"""
+        return self._depth
+
+    @property
+    def maxDepth(self):
+        """The maximum number of bytes queued in memory at any given time"""
+        return self._maxDepth
+
+    @property
+    def dropped(self):
+        """The number of chunks dropped because the queue was full"""
+        return self._dropped
+
+    @property
+    def spilled(self):
+        """The number of bytes spilled to disk because the queue was full"""
+        return self._spilled
+
+    def stats(self):
+        """
+        Returns a dictionary with the depth, maxDepth, dropped and spilled
+        values of this channel
+        """
+        with self._cond:
+            return {'depth': self._depth, 'maxDepth': self._maxDepth,
+                    'dropped': self._dropped, 'spilled': self._spilled}
+
+    def dataWritten(self, uid, data):
+        # data might be a view over a buffer that the writer will reuse
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        nbytes = len(data)
+
+        with self._cond:
+            full = self._depth and self._depth + nbytes > self._highWaterMark
+            if full:
+                if self._policy == StreamingBufferPolicies.DROP:
+                    self._dropped += 1
+                    return
+                elif self._policy == StreamingBufferPolicies.SPILL:
+                    self._spill(uid, data)
+                    return
+                while self._depth and self._depth + nbytes > self._highWaterMark:
+                    self._cond.wait()
+            self._depth += nbytes
+            self._maxDepth = max(self._maxDepth, self._depth)
+            self._put(_DATA, (uid, data))
+
+    def handleEvent(self, e):
+        with self._cond:
+            self._put(_EVENT, e)
+
+    def _spill(self, uid, data):
+        if self._spillFile is None:
+            self._spillFile = tempfile.TemporaryFile(prefix='dfms_spill_', dir=self._spillDir)
+        self._spillFile.seek(0, 2)
+        self._spillFile.write(data)
+        self._spilled += len(data)
+        self._put(_SPILLED, (uid, len(data)))
+
+    def _put(self, kind, item):
+        self._items.append((kind, item))
+        self._cond.notify_all()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='Streaming to %s' % (self._consumer.uid,))
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _next(self):
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            kind, item = self._items.popleft()
+            if kind == _DATA:
+                self._depth -= len(item[1])
+                self._cond.notify_all()
+            elif kind == _SPILLED:
+                uid, nbytes = item
+                self._spillFile.seek(self._spillReadPos)
+                item = (uid, self._spillFile.read(nbytes))
+                self._spillReadPos += nbytes
+            return kind, item
+
+    def _run(self):
+        consumer = self._consumer
+        while True:
+            kind, item = self._next()
+            try:
+                if kind == _EVENT:
+                    consumer.handleEvent(item)
+                else:
+                    consumer.dataWritten(*item)
+            except:
+                logger.exception("Error while delivering streaming data to %r", consumer)
+            if kind == _EVENT and item.type == 'dropCompleted':
+                break
+
+        with self._cond:
+            if self._spillFile is not None:
+                self._spillFile.close()
+                self._spillFile = None
@@ -30,6 +30,7 @@ import logging
 import math
 import os
 import socket
+import threading
 import time
 import types
 import zlib
@@ -290,11 +291,17 @@ def prepare_sql(sql, paramstyle, data=()):
     else: raise Exception('Unknown paramstyle: %s' % (paramstyle))
 
     sql = sql.format(*markers)
+    return (sql, sql_params(paramstyle, data))
 
+def sql_params(paramstyle, data):
+    """
+    Returns the sequence of values ``data`` in the form expected by a driver
+    using ``paramstyle`` for a statement prepared with `prepare_sql`. This is
+    useful to bind many rows of values into the same prepared statement.
+    """
     if paramstyle in ['format', 'pyformat']:
-        data = {'n%d'%(i): d for i,d in enumerate(data)}
-
-    return (sql, data)
+        return {'n%d'%(i): d for i,d in enumerate(data)}
+    return data
 
 def terminate_or_kill(proc, timeout):
     """
@@ -319,6 +326,101 @@ def terminate_or_kill(proc, timeout):
         proc.kill()
     proc.wait()
 
+class ParallelSegmentReader(object):
+    """
+    A file-like object that reads `size` bytes of remote data in segments of
+    `segmentSize` bytes, up to `parallelism` of which are fetched concurrently
+    by calling `fetch(start, end)` from different threads. `fetch` must return
+    the bytes in the [start, end) range. Segments are given back in order to
+    the reader, and at most `parallelism` of them are fetched ahead of it,
+    bounding the amount of memory used. If the first segment was already
+    fetched by the caller it can be given as `first`.
+    """
+
+    def __init__(self, fetch, size, segmentSize, parallelism, first=None):
+        self._fetchSegment = fetch
+        self._size = size
+        self._segmentSize = segmentSize
+        self._parallelism = parallelism
+        self._nsegments = (size + segmentSize - 1) // segmentSize
+
+        self._segments = {}
+        self._next = 0
+        if first is not None:
+            self._segments[0] = first
+            self._next = 1
+        self._current = 0
+        self._buf = b''
+        self._pos = 0
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+        nthreads = min(parallelism, self._nsegments - self._next)
+        self._threads = [threading.Thread(target=self._fetch) for _ in range(nthreads)]
+        for t in self._threads:
+            t.daemon = True
+            t.start()
+
+    def _fetch(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._next < self._nsegments and \
+                      self._next > self._current + self._parallelism:
+                    self._cond.wait()
+                if self._closed or self._next >= self._nsegments:
+                    return
+                i = self._next
+                self._next += 1
+
+            start = i * self._segmentSize
+            end = min(start + self._segmentSize, self._size)
+            try:
+                data = self._fetchSegment(start, end)
+            except Exception as e:
+                with self._cond:
+                    self._error = e
+                    self._cond.notify_all()
+                return
+
+            with self._cond:
+                self._segments[i] = data
+                self._cond.notify_all()
+
+    def read(self, count=-1):
+        if count is None or count < 0:
+            chunks = []
+            while True:
+                chunk = self.read(self._segmentSize)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        if self._pos == len(self._buf):
+            if self._current == self._nsegments:
+                return b''
+            with self._cond:
+                while self._current not in self._segments and self._error is None:
+                    self._cond.wait()
+                if self._current not in self._segments:
+                    raise self._error
+                self._buf = self._segments.pop(self._current)
+                self._current += 1
+                self._cond.notify_all()
+            self._pos = 0
+
+        data = self._buf[self._pos:self._pos + count]
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._segments.clear()
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
+
 class ZlibCompressedStream(object):
     """
     An object that takes a input of uncompressed stream and returns a compressed version of its
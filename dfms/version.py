@@ -0,0 +1,9 @@
+# THIS FILE IS GENERATED BY DALIUGE'S SETUP.PY
+# DO NOT MODIFY BY HAND
+version = '0.2.0'
+git_version = '8b2bb15a7ddf0fd4efe3ddbf761b50d85c485a48'
+full_version = '0.2.0.dev0+8b2bb15'
+is_release = False
+
+if not is_release:
+    version = full_version
\ No newline at end of file
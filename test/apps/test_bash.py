@@ -34,7 +34,7 @@ from dfms import droputils
 from dfms.apps.bash_shell_app import BashShellApp, StreamingInputBashApp,\
     StreamingOutputBashApp, StreamingInputOutputBashApp
 from dfms.ddap_protocol import DROPStates
-from dfms.drop import FileDROP, InMemoryDROP
+from dfms.drop import FileDROP, InMemoryDROP, SharedMemoryDROP
 from dfms.droputils import DROPWaiterCtx
 
 
@@ -63,6 +63,27 @@ class BashAppTests(unittest.TestCase):
         uid = os.getuid()
         self.assertEqual(uid, os.stat(c.path).st_uid)
 
+    def test_shared_memory(self):
+        """
+        A test to check that SharedMemoryDROPs are handed to bash commands via
+        their paths, like FileDROPs
+        """
+        a = SharedMemoryDROP('a', 'a')
+        b = BashShellApp('b', 'b', command='cp %i0 %o0')
+        c = SharedMemoryDROP('c', 'c')
+
+        b.addInput(a)
+        b.addOutput(c)
+
+        data = os.urandom(10)
+        with DROPWaiterCtx(self, c, 100):
+            a.write(data)
+            a.setCompleted()
+
+        self.assertEqual(data, droputils.allDropContents(c))
+        a.delete()
+        c.delete()
+
     def test_quoted_commands(self):
         """
         A test to check that commands using quotes are correctly executed, which
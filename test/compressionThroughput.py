@@ -0,0 +1,111 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the write and read throughput of FileDROPs that
+compress their data with each of the available algorithms, together with the
+number of bytes that actually end up on disk.
+
+The data written is either a compressible, CSV-like text (the default) or
+random bytes, which can't be compressed at all (-r/--random).
+"""
+
+from optparse import OptionParser
+import os
+import sys
+import tempfile
+import time
+
+from six.moves import range  # @UnresolvedImport
+
+from dfms.drop import FileDROP
+from dfms.io import COMPRESSION_CODECS
+
+
+def makeChunk(size, random):
+    if random:
+        return os.urandom(size)
+    rows = []
+    total = 0
+    i = 0
+    while total < size:
+        row = ('%d,%.6f,%d,source_%d\n' % (i, i * 0.001, i % 17, i % 100)).encode('ascii')
+        rows.append(row)
+        total += len(row)
+        i += 1
+    return b''.join(rows)[:size]
+
+def measure(dirname, chunk, n, **kwargs):
+    """
+    Writes `n` times `chunk` into a new FileDROP created with `kwargs`, reads
+    it back, and returns the write and read rates together with the size of the
+    resulting file.
+    """
+    drop = FileDROP('a', 'a', dirname=dirname, **kwargs)
+    start = time.time()
+    for _ in range(n):
+        drop.write(chunk)
+    drop.setCompleted()
+    writeRate = n * len(chunk) / (time.time() - start)
+
+    start = time.time()
+    desc = drop.open()
+    while drop.read(desc, 65536):
+        pass
+    drop.close(desc)
+    readRate = n * len(chunk) / (time.time() - start)
+
+    size = os.path.getsize(drop.path)
+    drop.delete()
+    return writeRate, readRate, size
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-T", "--total", action="store", type="int",
+                      dest="total", help = "Total number of MB to write. Defaults to 256", default=256)
+    parser.add_option("-b", "--block-size", action="store", type="int",
+                      dest="blockSize", help = "Compression block size in KB. Defaults to 1024", default=1024)
+    parser.add_option("-l", "--level", action="store", type="int",
+                      dest="level", help = "Compression level. Defaults to each algorithm's default", default=None)
+    parser.add_option("-r", "--random", action="store_true",
+                      dest="random", help = "Write random, incompressible data", default=False)
+    parser.add_option("-d", "--dirname", action="store", type="string",
+                      dest="dirname", help = "Directory where files are written. Defaults to a temporary directory", default=None)
+    (options, args) = parser.parse_args(sys.argv)
+
+    chunk = makeChunk(1024 * 1024, options.random)
+    dirname = options.dirname or tempfile.mkdtemp()
+
+    results = [('none',) + measure(dirname, chunk, options.total)]
+    for codec in COMPRESSION_CODECS.values():
+        kwargs = {'compression': codec.name, 'compressionBlockSize': options.blockSize * 1024}
+        if options.level is not None:
+            kwargs['compressionLevel'] = options.level
+        results.append((codec.name,) + measure(dirname, chunk, options.total, **kwargs))
+
+    if not options.dirname:
+        os.rmdir(dirname)
+
+    for name, writeRate, readRate, size in results:
+        print("%-5s: write %8.2f MB/s, read %8.2f MB/s, %8.2f MB on disk (%.1f%%)" %
+              (name, writeRate / 1024. / 1024., readRate / 1024. / 1024., size / 1024. / 1024.,
+               100. * size / (options.total * 1024 * 1024)))
@@ -0,0 +1,83 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the throughput of droputils.copyDropContents
+between different types of DROPs, comparing it with the old path of reading
+and writing the data in 4096 bytes steps.
+"""
+
+from optparse import OptionParser
+import sys
+import time
+
+from dfms import droputils
+from dfms.drop import InMemoryDROP, FileDROP, NullDROP
+
+
+def oldCopy(source, target, bufsize=4096):
+    desc = source.open()
+    try:
+        buf = source.read(desc, bufsize)
+        while buf:
+            target.write(buf)
+            buf = source.read(desc, bufsize)
+    finally:
+        source.close(desc)
+
+def measure(source, targettype, copy, bufsize):
+    """
+    Copies the data of `source` into a new DROP of type `targettype`,
+    returning the number of bytes copied per second.
+    """
+    target = targettype('b', 'b')
+    start = time.time()
+    copy(source, target, bufsize)
+    target.setCompleted()
+    rate = source.size / (time.time() - start)
+    target.delete()
+    return rate
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-T", "--total", action="store", type="int",
+                      dest="total", help = "Number of MB to copy. Defaults to 512", default=512)
+    parser.add_option("-c", "--chunksize", action="store", type="int",
+                      dest="chunksize", help = "Size of each chunk in bytes. Defaults to 65536", default=65536)
+    (options, args) = parser.parse_args(sys.argv)
+
+    chunk = b'x' * (1024 * 1024)
+    sources = {}
+    for droptype in (InMemoryDROP, FileDROP):
+        source = droptype('a', droptype.__name__)
+        for _ in range(options.total):
+            source.write(chunk)
+        source.setCompleted()
+        sources[droptype] = source
+
+    for sourcetype, targettype in ((InMemoryDROP, FileDROP), (FileDROP, FileDROP), (FileDROP, NullDROP)):
+        name = '%s to %s' % (sourcetype.__name__, targettype.__name__)
+        for copy, method in ((oldCopy, 'old'), (droputils.copyDropContents, 'new')):
+            rate = measure(sources[sourcetype], targettype, copy, options.chunksize if method == 'new' else 4096)
+            print("%-25s (%s): %.2f MB/s" % (name, method, rate / 1024. / 1024.))
+
+    sources[FileDROP].delete()
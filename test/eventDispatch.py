@@ -0,0 +1,92 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures how many events per second DROPs can fire. It
+creates a chain of DROPs, each of them listening for the completion of the
+previous one (like a consumer does), and then moves all of them to COMPLETED,
+reporting the rate at which events were fired.
+"""
+
+import gc
+import importlib
+from optparse import OptionParser
+import sys
+import time
+
+from six.moves import range  # @UnresolvedImport
+
+
+class Counter(object):
+    """A listener that simply counts the events it receives"""
+    def __init__(self):
+        self.n = 0
+    def handleEvent(self, e):
+        self.n += 1
+
+def measure(n, droptype, listeners):
+    """
+    Creates a chain of `n` DROPs of type `droptype`, where each DROP is
+    subscribed to the `dropCompleted` events of the previous one and
+    `listeners` extra listeners are subscribed to each DROP's `status` events.
+    It then moves all DROPs to COMPLETED and returns the number of events fired
+    and the time it took to do so.
+    """
+    counter = Counter()
+    drops = [droptype(str(i), str(i)) for i in range(n)]
+    for prev, drop in zip(drops, drops[1:]):
+        prev.subscribe(counter, 'dropCompleted')
+    for drop in drops:
+        for _ in range(listeners):
+            drop.subscribe(counter, 'status')
+
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.time()
+        for drop in drops:
+            drop.setCompleted()
+        delta = time.time() - start
+    finally:
+        gc.enable()
+
+    # Each DROP fires a 'status' and a 'dropCompleted' event
+    return 2 * n, counter.n, delta
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-i", "--instances", action="store", type="int",
+                      dest="instances", help = "Number of DROPs in the chain (defaults to 1M)", default=1000000)
+    parser.add_option("-t", "--type", action="store", type="string",
+                      dest="type", help = "DROP type to instantiate (defaults to dfms.drop.NullDROP)", default='dfms.drop.NullDROP')
+    parser.add_option("-l", "--listeners", action="store", type="int",
+                      dest="listeners", help = "Number of extra status listeners per DROP", default=0)
+    (options, args) = parser.parse_args(sys.argv)
+
+    n = options.instances
+    parts = options.type.split('.')
+    modname = '.'.join(parts[:-1])
+    classname = parts[-1]
+    droptype = getattr(importlib.import_module(modname), classname)
+
+    fired, delivered, delta = measure(n, droptype, options.listeners)
+    print("%d events fired by %d %ss in %.3f [s] (%.0f events/s), %d delivered" % (fired, n, droptype.__name__, delta, fired/delta, delivered))
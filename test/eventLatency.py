@@ -0,0 +1,92 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the latency of events travelling between two
+NodeManagers running on localhost, from the moment they are published by the
+first one until they are delivered by the second one. Events are sent one at a
+time, waiting for each one to be delivered before sending the next one.
+"""
+
+from optparse import OptionParser
+import sys
+import threading
+import time
+
+from dfms.event import GenericEvent
+from dfms.manager.node_manager import NodeManager
+
+
+class TimingNodeManager(NodeManager):
+
+    def __init__(self, *args, **kwargs):
+        self.latencies = []
+        self.delivered = threading.Event()
+        super(TimingNodeManager, self).__init__(*args, **kwargs)
+
+    def deliver_event(self, evt):
+        self.latencies.append(time.time() - evt.sent)
+        self.delivered.set()
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.))]
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--events", action="store", type="int",
+                      dest="events", help = "Number of events to send. Defaults to 1000", default=1000)
+    parser.add_option("-p", "--port", action="store", type="int",
+                      dest="port", help = "First port to use; four consecutive ports are used. Defaults to 15553", default=15553)
+    (options, args) = parser.parse_args(sys.argv)
+
+    port = options.port
+    nm1 = NodeManager(useDLM=False, host='localhost', events_port=port, rpc_port=port + 1)
+    nm2 = TimingNodeManager(useDLM=False, host='localhost', events_port=port + 2, rpc_port=port + 3)
+    try:
+        nm2.subscribe('localhost', port)
+
+        # PUB/SUB connections are established asynchronously, wait until
+        # events start arriving
+        while not nm2.delivered.is_set():
+            evt = GenericEvent(type='ping')
+            evt.sent = time.time()
+            nm1.publish_event(evt)
+            nm2.delivered.wait(0.1)
+        time.sleep(0.5)
+        del nm2.latencies[:]
+
+        for i in range(options.events):
+            nm2.delivered.clear()
+            evt = GenericEvent(type='dropCompleted', oid=str(i), uid=str(i))
+            evt.session_id = 'session'
+            evt.sent = time.time()
+            nm1.publish_event(evt)
+            nm2.delivered.wait(5)
+            time.sleep(0.001)
+
+        latencies = nm2.latencies
+        print("%d events: p50 %.3f ms, p99 %.3f ms, max %.3f ms" % (len(latencies),
+              percentile(latencies, 50) * 1e3, percentile(latencies, 99) * 1e3, max(latencies) * 1e3))
+    finally:
+        nm1.shutdown()
+        nm2.shutdown()
@@ -0,0 +1,110 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the throughput of events travelling between two
+NodeManagers running on localhost. A burst of dropCompleted events is
+published by the first one, and the time taken until all of them have been
+delivered by the second one is measured. Optionally, one in ten events can
+take a while to be handled, simulating slow event handlers.
+"""
+
+from optparse import OptionParser
+import sys
+import threading
+import time
+
+from dfms.ddap_protocol import DROPStates
+from dfms.event import StatusEvent, GenericEvent
+from dfms.manager.node_manager import NodeManager
+
+
+class CountingNodeManager(NodeManager):
+
+    def __init__(self, *args, **kwargs):
+        self.expected = 0
+        self.received = 0
+        self.slow = 0
+        self.lock = threading.Lock()
+        self.delivered = threading.Event()
+        super(CountingNodeManager, self).__init__(*args, **kwargs)
+
+    def deliver_event(self, evt):
+        if self.slow and evt.oid.endswith('0'):
+            time.sleep(self.slow)
+        with self.lock:
+            self.received += 1
+            if self.received >= self.expected:
+                self.delivered.set()
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--events", action="store", type="int",
+                      dest="events", help = "Number of events to send. Defaults to 100000", default=100000)
+    parser.add_option("-l", "--linger", action="store", type="float",
+                      dest="linger", help = "Seconds the publisher waits for more events before sending a batch. Defaults to 0", default=0)
+    parser.add_option("-t", "--threads", action="store", type="int",
+                      dest="threads", help = "Number of threads delivering events. Defaults to 1", default=1)
+    parser.add_option("-s", "--slow", action="store", type="float",
+                      dest="slow", help = "Seconds taken to handle one in ten events. Defaults to 0", default=0)
+    parser.add_option("-p", "--port", action="store", type="int",
+                      dest="port", help = "First port to use; four consecutive ports are used. Defaults to 15553", default=15553)
+    (options, args) = parser.parse_args(sys.argv)
+
+    port = options.port
+    kwargs = {'events_linger': options.linger} if options.linger else {}
+    nm1 = NodeManager(useDLM=False, host='localhost', events_port=port, rpc_port=port + 1, **kwargs)
+    kwargs = {'event_delivery_threads': options.threads} if options.threads > 1 else {}
+    nm2 = CountingNodeManager(useDLM=False, host='localhost', events_port=port + 2, rpc_port=port + 3, **kwargs)
+    try:
+        nm2.subscribe('localhost', port)
+
+        # PUB/SUB connections are established asynchronously, wait until
+        # events start arriving
+        nm2.expected = 1
+        while not nm2.delivered.is_set():
+            nm1.publish_event(GenericEvent(type='ping'))
+            nm2.delivered.wait(0.1)
+        time.sleep(0.5)
+
+        events = []
+        for i in range(options.events):
+            evt = StatusEvent('dropCompleted', 'oid%d' % i, 'uid%d' % i, DROPStates.COMPLETED)
+            evt.session_id = 'session'
+            events.append(evt)
+
+        nm2.delivered.clear()
+        nm2.received = 0
+        nm2.slow = options.slow
+        nm2.expected = options.events
+        start = time.time()
+        for evt in events:
+            nm1.publish_event(evt)
+        if not nm2.delivered.wait(300):
+            print("Only %d events delivered" % (nm2.received,))
+        duration = time.time() - start
+
+        print("%-12s: %.3f [s]" % ('Time', duration))
+        print("%-12s: %.0f [evts/s]" % ('Throughput', nm2.received / duration))
+    finally:
+        nm1.shutdown()
+        nm2.shutdown()
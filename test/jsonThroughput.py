@@ -0,0 +1,93 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures how JsonDROP copes with large JSON products. It
+writes a JSON array of the requested size and measures the time it takes to
+index it, stream through it with iterMembers, and look up random items through
+the index, comparing it with loading the whole document with json.load. The
+peak resident memory of the process is reported after each step, so the
+json.load case is run last.
+"""
+
+from optparse import OptionParser
+import json
+import random
+import resource
+import sys
+import time
+
+from dfms.json_drop import JsonDROP
+
+
+def maxrss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+def report(what, start, size):
+    rate = size / (time.time() - start) / 1024. / 1024.
+    print("%-20s: %8.2f MB/s, peak RSS %8.2f MB" % (what, rate, maxrss()))
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-T", "--total", action="store", type="int",
+                      dest="total", help = "Approximate size of the JSON document in MB. Defaults to 2048", default=2048)
+    parser.add_option("-l", "--lookups", action="store", type="int",
+                      dest="lookups", help = "Number of random lookups. Defaults to 1000", default=1000)
+    (options, args) = parser.parse_args(sys.argv)
+
+    # Items are ~200 bytes long
+    item = {'name': 'x' * 64, 'values': list(range(20)), 'flag': True, 'ratio': 0.125}
+    itemlen = len(json.dumps(item)) + 2
+    n = options.total * 1024 * 1024 // itemlen
+
+    drop = JsonDROP('a', 'a')
+    drop.write(b'[')
+    for i in range(n):
+        item['id'] = i
+        drop.write((',\n' if i else '') + json.dumps(item))
+    drop.write(b']')
+    print("Wrote %d items, %.2f MB, peak RSS %.2f MB" % (n, drop.size / 1024. / 1024., maxrss()))
+
+    drop.setCompleted()
+    try:
+        # The index is built on the first lookup
+        start = time.time()
+        drop[0]
+        report('index', start, drop.size)
+
+        start = time.time()
+        for _ in drop.iterMembers():
+            pass
+        report('iterMembers', start, drop.size)
+
+        start = time.time()
+        for _ in range(options.lookups):
+            i = random.randrange(n)
+            assert drop[i]['id'] == i
+        print("%-20s: %8.2f us per lookup" % ('lookup', (time.time() - start) * 1e6 / options.lookups))
+
+        start = time.time()
+        with open(drop.path) as f:
+            data = json.load(f)
+        report('json.load', start, drop.size)
+    finally:
+        drop.delete()
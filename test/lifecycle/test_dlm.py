@@ -32,7 +32,8 @@ import time
 import unittest
 
 from dfms.ddap_protocol import DROPStates, DROPPhases
-from dfms.drop import FileDROP, DirectoryContainer, BarrierAppDROP
+from dfms.drop import FileDROP, DirectoryContainer, BarrierAppDROP, \
+    SharedMemoryDROP
 from dfms.droputils import DROPWaiterCtx
 from dfms.lifecycle import dlm
 
@@ -130,6 +131,21 @@ class TestDataLifecycleManager(unittest.TestCase):
             self.assertEqual(DROPStates.DELETED, drop.status)
             self.assertFalse(drop.exists())
 
+    def test_cleanupExpiredSharedMemoryDrops(self):
+        with dlm.DataLifecycleManager(checkPeriod=0.1, cleanupPeriod=0.2) as manager:
+            drop = SharedMemoryDROP('oid:A', 'uid:A1', expectedSize=1, lifespan=0.1, precious=False)
+            manager.addDrop(drop)
+            self._writeAndClose(drop)
+            self.assertTrue(os.path.isfile(drop.path))
+
+            # The shared memory object is gone once the DROP is deleted
+            for _ in range(50):
+                if drop.status == DROPStates.DELETED:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(DROPStates.DELETED, drop.status)
+            self.assertFalse(os.path.exists(drop.path))
+
     def test_expireAfterUse(self):
         """
         Simple test for the expireAfterUse flag. Two DROPs are created with
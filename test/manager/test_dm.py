@@ -19,13 +19,18 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import os
 import threading
 import unittest
 
+from six.moves import queue as Queue  # @UnresolvedImport
+
 from dfms import droputils
 from dfms.ddap_protocol import DROPStates, DROPRel, DROPLinkType
 from dfms.drop import BarrierAppDROP, dropdict
-from dfms.manager.node_manager import NodeManager
+from dfms.event import GenericEvent, StatusEvent
+from dfms.manager import event_wire
+from dfms.manager.node_manager import NodeManager, NMDropEventListener
 
 
 hostname = 'localhost'
@@ -91,6 +96,21 @@ class TestDM(unittest.TestCase):
 
         self.assertTrue(evt.wait(10), "Didn't receive errors on time")
 
+    def test_shared_memory_cleanup(self):
+        """
+        The shared memory objects of a session are removed when it's destroyed
+        """
+        dm = self._start_dm()
+        quickDeploy(dm, 's1', [{"oid":"A", "type":"plain", "storage": "shm"},
+                               {"oid":"B", "type":"plain", "storage": "shm"}])
+        a, b = [dm._sessions['s1'].drops[x] for x in ('A', 'B')]
+        a.write(b'a')
+        a.setCompleted()
+        self.assertTrue(os.path.isfile(a.path))
+        self.assertNotEqual(a.path, b.path)
+        dm.destroySession('s1')
+        self.assertFalse(os.path.exists(a.path))
+
     def test_runGraphOneDOPerDOM(self):
         """
         A test that creates three DROPs in two different DMs and runs the graph.
@@ -306,4 +326,127 @@ class TestDM(unittest.TestCase):
             drop = dm2._sessions[sessionId].drops["B%d" % (i,)]
             self.assertEqual(DROPStates.COMPLETED, drop.status)
         dm1.destroySession(sessionId)
-        dm2.destroySession(sessionId)
\ No newline at end of file
+        dm2.destroySession(sessionId)
+
+    def test_event_topics(self):
+        """
+        Events are published only to the nodes interested in them: DM #3
+        takes part in a different session and never receives any event from
+        DM #1, while DM #2 receives only those of A
+
+        DM #1             DM #2
+        ===========       ================
+        | A --|---|-------|-> B --> C    |
+        | D       |       ================
+        ===========
+        """
+        dm1, dm2, dm3 = [self._start_dm() for _ in range(3)]
+
+        received = []
+        def deliver_event(evt):
+            received.append(evt)
+        dm3.deliver_event = deliver_event
+
+        sessionId = 's1'
+        g1 = [{"oid":"A", "type":"plain", "storage": "memory", "node": "localhost"},
+              {"oid":"D", "type":"plain", "storage": "memory", "node": "localhost"}]
+        g2 = [{"oid":"B", "type":"app", "app":"dfms.apps.crc.CRCApp", "node": "localhost"},
+              {"oid":"C", "type":"plain", "storage": "memory", "producers":["B"], "node": "localhost"}]
+        rels = [DROPRel('B', DROPLinkType.CONSUMER, 'A')]
+        quickDeploy(dm1, sessionId, g1, {nm_conninfo(1): rels})
+        quickDeploy(dm2, sessionId, g2, {nm_conninfo(0): rels})
+        quickDeploy(dm3, 's2', [{"oid":"E", "type":"plain", "storage": "memory"}],
+                    {nm_conninfo(0): [DROPRel('F', DROPLinkType.CONSUMER, 'E')]})
+
+        session1 = dm1._sessions[sessionId]
+        self.assertEqual({'localhost'}, session1.event_destinations('A'))
+        self.assertEqual((), session1.event_destinations('D'))
+        self.assertEqual('localhost', session1.node)
+
+        a, d = [session1.drops[x] for x in ('A', 'D')]
+        c = dm2._sessions[sessionId].drops['C']
+        with droputils.DROPWaiterCtx(self, c, 1):
+            d.write('d')
+            d.setCompleted()
+            a.write('a')
+            a.setCompleted()
+
+        self.assertEqual(DROPStates.COMPLETED, c.status)
+        self.assertEqual([], received)
+
+        # Only A's dropCompleted event left DM #1, D's weren't even queued
+        for drop, n in (a, 1), (d, 0):
+            listeners = drop._listenersFor('dropCompleted')
+            self.assertEqual(n, len([l for l in listeners if isinstance(l, NMDropEventListener)]))
+        self.assertEqual(1, dm1.getEventStats()['published'])
+        stats = dm2.getEventStats()
+        self.assertEqual((0, 1, 0), (stats['published'], stats['delivered'], stats['dropped']))
+        for dm in dm1, dm2:
+            dm.destroySession(sessionId)
+        dm3.destroySession('s2')
+
+    def test_unencodable_events(self):
+        """
+        Events that can't be encoded are dropped by the publisher, which keeps
+        publishing the rest
+        """
+        dm1, dm2 = [self._start_dm() for _ in range(2)]
+        received = Queue.Queue()
+        dm2.deliver_event = received.put
+        host, events_port, _ = nm_conninfo(0)
+        dm2.subscribe(host, events_port, (event_wire.topic('s1'),))
+
+        unserializable = GenericEvent('custom', 'A', 'A')
+        unserializable.value = object()
+        tooLong = StatusEvent('status', 'B', 'B' * 65536, 1)
+        for evt in (unserializable, tooLong, StatusEvent('status', 'C', 'C', 1)):
+            evt.session_id = 's1'
+            dm1.publish_event(evt)
+        self.assertEqual('C', received.get(timeout=5).uid)
+
+        evt = StatusEvent('status', 'D', 'D', 1)
+        evt.session_id = 's1'
+        dm1.publish_event(evt)
+        self.assertEqual('D', received.get(timeout=5).uid)
+        self.assertTrue(received.empty())
+        self.assertEqual(2, dm1.getEventStats()['published'])
+
+    def test_event_delivery_threads(self):
+        """
+        Remote events are delivered by several threads, and the application
+        consuming all of them runs exactly once
+
+        DM #1          DM #2
+        =========     ====================
+        | A0 -|-|-----|-|                |
+        | ... | |     | |--> B --> C     |
+        | A9 -|-|-----|-|                |
+        =========     ====================
+        """
+        dm1 = self._start_dm()
+        dm2 = self._start_dm(event_delivery_threads=4)
+
+        sessionId = 's1'
+        N = 10
+        g1 = [{"oid":"A%d" % i, "type":"plain", "storage": "memory"} for i in range(N)]
+        g2 = [{"oid":"B", "type":"app", "app":"test.graphsRepository.SleepAndCopyApp", "sleepTime": 0},
+              {"oid":"C", "type":"plain", "storage": "memory", "producers":["B"]}]
+        rels = [DROPRel('A%d' % i, DROPLinkType.INPUT, 'B') for i in range(N)]
+        quickDeploy(dm1, sessionId, g1, {nm_conninfo(1): rels})
+        quickDeploy(dm2, sessionId, g2, {nm_conninfo(0): rels})
+
+        c = dm2._sessions[sessionId].drops['C']
+        with droputils.DROPWaiterCtx(self, c, 5):
+            for i in range(N):
+                a = dm1._sessions[sessionId].drops['A%d' % i]
+                a.write(b'a')
+                a.setCompleted()
+
+        self.assertEqual(b'a' * N, droputils.allDropContents(c))
+        stats = dm2.getEventStats()
+        self.assertEqual(N, stats['delivered'])
+        self.assertEqual(4, len(stats['queues']))
+        for q in stats['queues']:
+            self.assertEqual(0, q['depth'])
+        dm1.destroySession(sessionId)
+        dm2.destroySession(sessionId)
@@ -0,0 +1,93 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2015
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import struct
+import unittest
+
+from dfms.event import StatusEvent, ExecStatusEvent, ProducerFinishedEvent, \
+    GenericEvent
+from dfms.manager import event_wire
+
+
+class TestEventWire(unittest.TestCase):
+
+    def _roundtrip(self, events):
+        decoded = event_wire.decode(event_wire.encode(events))
+        self.assertEqual(len(events), len(decoded))
+        for orig, evt in zip(events, decoded):
+            self.assertIs(type(orig), type(evt))
+            self.assertEqual(orig.__getstate__(), evt.__getstate__())
+        return decoded
+
+    def test_empty(self):
+        self.assertEqual([], event_wire.decode(event_wire.encode([])))
+
+    def test_slotted_events(self):
+        events = []
+        for i in range(3):
+            e = StatusEvent('dropCompleted', 'oid%d' % i, u'uid-é%d' % i, 2)
+            e.session_id = 'session'
+            events.append(e)
+        events.append(ExecStatusEvent('execStatus', 'a', 'a', 1))
+        events.append(ProducerFinishedEvent('producerFinished', 'b', 'b', 2, 3))
+        events.append(StatusEvent('status', 'c', 'c'))
+        self._roundtrip(events)
+
+    def test_generic_events(self):
+        e = GenericEvent('custom', 'oid', 'uid')
+        e.session_id = 's'
+        e.value = [1, 2.5, {'x': 'y'}]
+        decoded = self._roundtrip([e, StatusEvent('status', 'a', 'b', 1)])
+        self.assertEqual([1, 2.5, {'x': 'y'}], decoded[0].value)
+
+    def test_invalid_frames(self):
+        frame = event_wire.encode([StatusEvent('status', 'a', 'b', 1)])
+        self.assertRaises(ValueError, event_wire.decode, b'')
+        self.assertRaises(ValueError, event_wire.decode, b'XXXX' + frame[4:])
+        self.assertRaises(ValueError, event_wire.decode, frame[:-1])
+        self.assertRaises(ValueError, event_wire.decode, frame + b'x')
+
+        # Frames from a future version are rejected
+        header = struct.pack('>4sBI', b'DFEV', event_wire.VERSION + 1, 1)
+        self.assertRaises(ValueError, event_wire.decode, header + frame[len(header):])
+
+    def test_unencodable_events(self):
+        e = GenericEvent('custom', 'oid', 'uid')
+        e.value = object()
+        self.assertRaises(ValueError, event_wire.encode, [e])
+        self.assertRaises(ValueError, event_wire.encode, [StatusEvent('status', 'a', 'b' * 65536, 1)])
+        self.assertRaises(ValueError, event_wire.encode, [StatusEvent('status', 'a', 'b', 1000)])
+        self._roundtrip([StatusEvent('status', 'a', 'b' * 65535, 1)])
+
+    def test_topics(self):
+        session = event_wire.topic('s1')
+        node = event_wire.topic('s1', 'node1')
+        self.assertTrue(node.startswith(session))
+        self.assertTrue(node.startswith(event_wire.topic(None)))
+        self.assertFalse(event_wire.topic('s1', 'node10').startswith(node))
+        self.assertFalse(event_wire.topic('s10').startswith(session))
+
+    def test_hello_topics(self):
+        hello = event_wire.hello_topic()
+        self.assertTrue(event_wire.is_hello_topic(hello))
+        self.assertNotEqual(hello, event_wire.hello_topic())
+        self.assertFalse(event_wire.is_hello_topic(event_wire.topic('s1', 'node1')))
+        self.assertFalse(hello.startswith(event_wire.topic(u'\xff')))
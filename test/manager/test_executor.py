@@ -0,0 +1,136 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import threading
+import time
+import unittest
+
+from dfms.ddap_protocol import AppDROPStates, DROPStates
+from dfms.drop import BarrierAppDROP, InMemoryDROP
+from dfms.manager.executor import AppExecutor
+
+
+class TestAppExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = AppExecutor(1)
+        self.executed = []
+
+        # Keeps the only worker busy until we submitted everything
+        self.gate = threading.Event()
+        self.executor.submit('blocker', self.gate.wait)
+
+    def tearDown(self):
+        self.gate.set()
+        self.executor.shutdown(5)
+
+    def _wait_for(self, n):
+        self.gate.set()
+        for _ in range(100):
+            if len(self.executed) == n:
+                return
+            time.sleep(0.05)
+        self.fail("Only %d out of %d executions were done" % (len(self.executed), n))
+
+    def _record(self, name):
+        return lambda: self.executed.append(name)
+
+    def test_priorities(self):
+        for name, priority in (('a', 1), ('b', 5), ('c', 3), ('d', 5)):
+            self.executor.submit('s1', self._record(name), priority)
+        self.assertEqual(4, self.executor.pending('s1'))
+        self._wait_for(4)
+        self.assertListEqual(['b', 'd', 'c', 'a'], self.executed)
+        self.assertEqual(0, self.executor.pending())
+
+    def test_session_fairness(self):
+        s1 = self.executor.for_session('s1')
+        s2 = self.executor.for_session('s2')
+        for i in range(10):
+            s1.submit(self._record('s1-%d' % i), 10 - i)
+        s2.submit(self._record('s2-0'))
+        s2.submit(self._record('s2-1'))
+        self._wait_for(12)
+
+        # s2 gets its turn in between s1's executions, despite its lower
+        # priorities and later submission
+        self.assertListEqual(['s1-0', 's2-0', 's1-1', 's2-1'], self.executed[:4])
+        self.assertListEqual(['s1-%d' % i for i in range(10)], [x for x in self.executed if x.startswith('s1')])
+
+    def test_bounded_workers(self):
+        executor = AppExecutor(3)
+        lock = threading.Lock()
+        running = [0]
+        max_running = [0]
+        def work():
+            with lock:
+                running[0] += 1
+                max_running[0] = max(max_running[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+                self.executed.append(None)
+        try:
+            for _ in range(30):
+                executor.submit('s1', work)
+            self._wait_for(30)
+            self.assertEqual(3, max_running[0])
+        finally:
+            executor.shutdown(5)
+
+    def test_shutdown(self):
+        cancelled = []
+        for name, priority in (('a', 1), ('b', 5)):
+            self.executor.submit('s1', self._record(name), priority, lambda name=name: cancelled.append(name))
+        self.executor.submit('s2', self._record('c'))
+        self.executor.shutdown(0)
+
+        # Pending executions are cancelled rather than executed
+        self.gate.set()
+        self.assertListEqual(['b', 'a'], cancelled)
+        self.assertEqual(0, self.executor.pending())
+        self.assertRaises(RuntimeError, self.executor.submit, 's1', self._record('d'))
+        time.sleep(0.1)
+        self.assertListEqual([], self.executed)
+
+    def test_shutdown_timeout(self):
+        # All busy workers are waited on for the given timeout in total
+        executor = AppExecutor(3)
+        gate = threading.Event()
+        for _ in range(3):
+            executor.submit('s1', gate.wait)
+        try:
+            start = time.time()
+            executor.shutdown(0.3)
+            self.assertLess(time.time() - start, 0.6)
+        finally:
+            gate.set()
+
+    def test_cancelled_apps(self):
+        a = InMemoryDROP('a', 'a')
+        b = BarrierAppDROP('b', 'b')
+        b.executor = self.executor.for_session('s1')
+        b.addInput(a)
+        a.setCompleted()
+        self.assertEqual(1, self.executor.pending('s1'))
+        self.executor.shutdown(0)
+        self.assertEqual(AppDROPStates.ERROR, b.execStatus)
+        self.assertEqual(DROPStates.ERROR, b.status)
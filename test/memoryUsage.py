@@ -22,13 +22,31 @@
 """
 A small module that measures the average memory consumption of different
 DROP types. It was initially developed to address PRO-234.
+
+A per-DROP memory budget can be given via the -b/--budget option, in which
+case the program exits with a non-zero status if the average memory used by
+each DROP exceeds it. This way we can keep track of regressions in the
+DROPs' memory footprint.
 """
 
+import gc
 import importlib
 from optparse import OptionParser
 import sys
 
 import psutil
+from six.moves import range  # @UnresolvedImport
+
+
+# Default per-DROP budget (in bytes) for the DROP types we care the most about.
+# These are measured with a large number of instances (e.g., -i 1000000) and
+# include the storage of the DROP's oid/uid strings.
+DEFAULT_BUDGETS = {
+    'dfms.drop.NullDROP':        512,
+    'dfms.drop.InMemoryDROP':    640,
+    'dfms.drop.FileDROP':        768,
+    'dfms.drop.BarrierAppDROP': 1536,
+}
 
 
 def measure(n, droptype):
@@ -38,15 +56,16 @@ def measure(n, droptype):
     with the total amount of memory, user time and system time used during the
     creation of all the DROP instances
     """
+    gc.collect()
     p = psutil.Process()
     mem1 = p.memory_info()[0]
-    uTime1, sTime1 = p.cpu_times()
+    uTime1, sTime1 = p.cpu_times()[:2]
     drops = []
-    for i in xrange(n):
+    for i in range(n):
         uid = str(i)
         drops.append(droptype(uid, uid))
     mem2 = p.memory_info()[0]
-    uTime2, sTime2 = p.cpu_times()
+    uTime2, sTime2 = p.cpu_times()[:2]
 
     return mem2 - mem1, uTime2 - uTime1, sTime2 - sTime1
 
@@ -58,6 +77,8 @@ if __name__ == '__main__':
                       dest="instances", help = "Number of DROP instances to create and measure")
     parser.add_option("-t", "--type", action="store", type="string",
                       dest="type", help = "DROP type to instantiate")
+    parser.add_option("-b", "--budget", action="store", type="float",
+                      dest="budget", help = "Maximum average amount of bytes allowed per DROP. Defaults to a pre-defined value for some DROP types", default=None)
     (options, args) = parser.parse_args(sys.argv)
 
     if options.type is None:
@@ -80,4 +101,11 @@ if __name__ == '__main__':
         print("%d bytes used by %d %ss (%.2f bytes per DROP)" % (mem, n, droptype.__name__, memAvg))
         print("Total time:  %.2f msec (%.2f msec per DROP)" % (tTime, tTimeAvg))
         print("User time:   %.2f msec (%.2f msec per DROP)" % (uTime, uTimeAvg))
-        print("System time: %.2f msec (%.2f msec per DROP)" % (sTime, sTimeAvg))
\ No newline at end of file
+        print("System time: %.2f msec (%.2f msec per DROP)" % (sTime, sTimeAvg))
+
+    budget = options.budget
+    if budget is None:
+        budget = DEFAULT_BUDGETS.get(options.type, None)
+    if budget is not None and memAvg > budget:
+        sys.stderr.write("Memory budget exceeded: %.2f > %.2f bytes per DROP\n" % (memAvg, budget))
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,135 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the performance of reading data from NGAS with
+the `ngaslite` module against a local stand-in server. It compares many small
+RETRIEVEs with and without keep-alive connections being pooled, and a large
+RETRIEVE done over a single connection and in parallel segments.
+
+Real NGAS servers are not on localhost, so a latency can be added to each
+request and new connection with -l/--latency, and the bandwidth of each
+connection can be limited with -b/--bandwidth, to make the results more
+representative.
+"""
+
+from optparse import OptionParser
+import os
+import sys
+import time
+
+from six.moves import range  # @UnresolvedImport
+
+from dfms import ngaslite
+from test.test_io import NgasStandIn, NgasStandInHandler
+
+
+class SlowHandler(NgasStandInHandler):
+    """
+    A stand-in handler that adds a latency to new connections and requests,
+    and that writes at most `bandwidth` bytes per second on each connection
+    """
+    latency = 0
+    bandwidth = 0
+    def setup(self):
+        time.sleep(self.latency)
+        NgasStandInHandler.setup(self)
+        if self.bandwidth:
+            self.wfile = ThrottledFile(self.wfile, self.bandwidth)
+    def do_GET(self):
+        time.sleep(self.latency)
+        NgasStandInHandler.do_GET(self)
+
+class ThrottledFile(object):
+    def __init__(self, f, bandwidth):
+        self._f = f
+        self._bandwidth = bandwidth
+    def write(self, data):
+        view = memoryview(data)
+        chunk = max(self._bandwidth // 100, 1)
+        for i in range(0, len(view), chunk):
+            self._f.write(view[i:i + chunk])
+            time.sleep(len(view[i:i + chunk]) / float(self._bandwidth))
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+def measure_small(port, n, pooled):
+    """
+    Retrieves the small file `n` times, returning the number of requests per
+    second. If `pooled` is False no connection is kept alive.
+    """
+    maxIdle = ngaslite.MAX_IDLE_CONNECTIONS
+    ngaslite.MAX_IDLE_CONNECTIONS = maxIdle if pooled else 0
+    try:
+        start = time.time()
+        for _ in range(n):
+            desc = ngaslite.retrieve('localhost', 'small', port=port, timeout=60)
+            desc.read()
+            desc.close()
+        return n / (time.time() - start)
+    finally:
+        ngaslite.MAX_IDLE_CONNECTIONS = maxIdle
+
+def measure_large(port, size, parallelism, segmentSize):
+    """
+    Retrieves the large file, returning the number of bytes read per second
+    """
+    start = time.time()
+    desc = ngaslite.retrieve('localhost', 'large', port=port, timeout=60,
+                             parallelism=parallelism, segmentSize=segmentSize)
+    while desc.read(65536):
+        pass
+    desc.close()
+    return size / (time.time() - start)
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--requests", action="store", type="int",
+                      dest="requests", help = "Number of small RETRIEVEs. Defaults to 1000", default=1000)
+    parser.add_option("-S", "--size", action="store", type="int",
+                      dest="size", help = "Size of the large file in MB. Defaults to 256", default=256)
+    parser.add_option("-p", "--parallelism", action="store", type="int",
+                      dest="parallelism", help = "Number of parallel segments for the large RETRIEVE. Defaults to 4", default=4)
+    parser.add_option("-s", "--segment-size", action="store", type="int",
+                      dest="segmentSize", help = "Size of each segment in MB. Defaults to 16", default=16)
+    parser.add_option("-b", "--bandwidth", action="store", type="int",
+                      dest="bandwidth", help = "Maximum bandwidth of each connection in MB/s. Defaults to no limit", default=0)
+    parser.add_option("-l", "--latency", action="store", type="float",
+                      dest="latency", help = "Latency added to connections and requests, in ms. Defaults to 0", default=0)
+    (options, args) = parser.parse_args(sys.argv)
+
+    SlowHandler.latency = options.latency / 1000.
+    SlowHandler.bandwidth = options.bandwidth * 1024 * 1024
+    size = options.size * 1024 * 1024
+    with NgasStandIn() as server:
+        server.RequestHandlerClass = SlowHandler
+        server.contents['small'] = b'x' * 1024
+        server.contents['large'] = os.urandom(size)
+        port = server.server_address[1]
+
+        for pooled, name in ((False, 'new connections'), (True, 'pooled connections')):
+            rate = measure_small(port, options.requests, pooled)
+            print("%-20s: %.2f RETRIEVEs/s" % (name, rate))
+
+        for parallelism in (1, options.parallelism):
+            rate = measure_large(port, size, parallelism, options.segmentSize * 1024 * 1024)
+            print("%-20s: %.2f MB/s" % ('%d segment(s)' % parallelism, rate / 1024. / 1024.))
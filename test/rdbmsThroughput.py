@@ -0,0 +1,95 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the throughput of an RDBMSDrop backed by a sqlite
+database, comparing single-row inserts (with and without pooled connections)
+against insert_many, and the peak memory used by select against select_iter.
+"""
+
+from optparse import OptionParser
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from dfms.drop import RDBMSDrop, closeDBConnections
+
+
+def rows(n):
+    for i in range(n):
+        yield ('row%d' % i, i, i / 3.)
+
+def measure(what, n, f):
+    """
+    Runs `f` and returns the number of rows it processed per second, together
+    with the peak memory (in bytes) it allocated.
+    """
+    tracemalloc.start()
+    start = time.time()
+    f()
+    rate = n / (time.time() - start)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-30s: %10.0f rows/s, peak memory %8.2f MB" % (what, rate, peak / 1024. / 1024.))
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--rows", action="store", type="int",
+                      dest="rows", help = "Number of rows to bulk insert and select. Defaults to 1000000", default=1000000)
+    parser.add_option("-o", "--single-rows", action="store", type="int",
+                      dest="single_rows", help = "Number of rows to insert one at a time. Defaults to 2000", default=2000)
+    parser.add_option("-b", "--batchsize", action="store", type="int",
+                      dest="batchsize", help = "Number of rows bound or fetched at a time. Defaults to 10000", default=10000)
+    (options, args) = parser.parse_args(sys.argv)
+
+    fd, dbfile = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    with sqlite3.connect(dbfile) as conn:
+        conn.execute('CREATE TABLE t(name varchar(64), an_integer integer, a_real real)')
+    cols = ('name', 'an_integer', 'a_real')
+
+    try:
+        drop = RDBMSDrop('a', 'a', dbmodule='sqlite3', dbtable='t', dbparams={'database': dbfile})
+
+        def insert(pooled):
+            for name, i, r in rows(options.single_rows):
+                drop.insert({'name': name, 'an_integer': i, 'a_real': r})
+                if not pooled:
+                    closeDBConnections()
+
+        measure('insert (new connections)', options.single_rows, lambda: insert(False))
+        measure('insert (pooled connections)', options.single_rows, lambda: insert(True))
+        measure('insert_many', options.rows, lambda: drop.insert_many(rows(options.rows), columns=cols, batch_size=options.batchsize))
+
+        def select_iter():
+            for _ in drop.select_iter(batch_size=options.batchsize):
+                pass
+
+        total = options.rows + 2 * options.single_rows
+        measure('select', total, lambda: drop.select())
+        measure('select_iter', total, select_iter)
+    finally:
+        closeDBConnections()
+        os.unlink(dbfile)
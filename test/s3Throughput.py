@@ -0,0 +1,112 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the upload and download throughput of S3DROPs
+against a local S3 stand-in server, for different part sizes and
+concurrency levels.
+
+Real S3 endpoints are not on localhost, so a latency can be added to each
+request with -l/--latency, and the bandwidth of each connection can be
+limited with -b/--bandwidth, to make the results more representative.
+"""
+
+from optparse import OptionParser
+import os
+import sys
+import time
+
+from dfms import droputils
+from test.test_S3Drop import S3StandIn, S3StandInHandler, standin_drop
+
+
+class SlowHandler(S3StandInHandler):
+    """
+    A stand-in handler that adds a latency to each request, and that
+    transfers at most `bandwidth` bytes per second on each connection
+    """
+    latency = 0
+    bandwidth = 0
+
+    def _request(self):
+        time.sleep(self.latency)
+        return S3StandInHandler._request(self)
+
+    def _throttle(self, n):
+        if self.bandwidth:
+            time.sleep(n / float(self.bandwidth))
+
+    def _body(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        chunks = []
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 65536))
+            self._throttle(len(chunk))
+            remaining -= len(chunk)
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _reply(self, status, body=b'', headers=()):
+        self._throttle(len(body) if self.command != 'HEAD' else 0)
+        S3StandInHandler._reply(self, status, body, headers)
+
+def measure(server, data, partSize, concurrency):
+    """
+    Uploads and downloads `data`, returning the upload and download rates
+    """
+    drop = standin_drop(server, 'a', part_size=partSize, max_concurrency=concurrency)
+    start = time.time()
+    for i in range(0, len(data), 1024**2):
+        drop.write(data[i:i + 1024**2])
+    drop.setCompleted()
+    upload = len(data) / (time.time() - start)
+
+    start = time.time()
+    droputils.allDropContents(drop)
+    download = len(data) / (time.time() - start)
+    return upload, download
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-T", "--total", action="store", type="int",
+                      dest="total", help = "Size of the object in MB. Defaults to 128", default=128)
+    parser.add_option("-p", "--part-sizes", action="store", type="string",
+                      dest="partSizes", help = "Comma-separated part sizes in MB. Defaults to 5,8,16", default='5,8,16')
+    parser.add_option("-c", "--concurrency", action="store", type="string",
+                      dest="concurrency", help = "Comma-separated concurrency levels. Defaults to 1,4,8", default='1,4,8')
+    parser.add_option("-b", "--bandwidth", action="store", type="int",
+                      dest="bandwidth", help = "Maximum bandwidth of each connection in MB/s. Defaults to no limit", default=0)
+    parser.add_option("-l", "--latency", action="store", type="float",
+                      dest="latency", help = "Latency added to each request, in ms. Defaults to 0", default=0)
+    (options, args) = parser.parse_args(sys.argv)
+
+    SlowHandler.latency = options.latency / 1000.
+    SlowHandler.bandwidth = options.bandwidth * 1024 * 1024
+    data = os.urandom(options.total * 1024 * 1024)
+
+    with S3StandIn() as server:
+        server.RequestHandlerClass = SlowHandler
+        for partSize in [int(x) for x in options.partSizes.split(',')]:
+            for concurrency in [int(x) for x in options.concurrency.split(',')]:
+                upload, download = measure(server, data, partSize * 1024 * 1024, concurrency)
+                print("part size %3d MB, concurrency %2d: upload %8.2f MB/s, download %8.2f MB/s" %
+                      (partSize, concurrency, upload / 1024. / 1024., download / 1024. / 1024.))
@@ -0,0 +1,75 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the throughput of DROPs receiving many small
+writes, like those done by applications ingesting small records, with and
+without a write buffer, and when writing them in batches with writev.
+"""
+
+from optparse import OptionParser
+import sys
+import time
+
+from dfms.drop import FileDROP, InMemoryDROP
+
+
+def measure(droptype, records, write, **kwargs):
+    """
+    Writes all `records` into a new DROP of type `droptype` created with
+    `kwargs`, returning the number of records written per second.
+    """
+    drop = droptype('a', 'a', **kwargs)
+    start = time.time()
+    write(drop, records)
+    drop.setCompleted()
+    rate = len(records) / (time.time() - start)
+    drop.delete()
+    return rate
+
+def writeEach(drop, records):
+    for record in records:
+        drop.write(record)
+
+def writeBatches(drop, records, batch=1024):
+    for i in range(0, len(records), batch):
+        drop.writev(records[i:i + batch])
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-n", "--records", action="store", type="int",
+                      dest="records", help = "Number of records to write. Defaults to 1000000", default=1000000)
+    parser.add_option("-s", "--size", action="store", type="int",
+                      dest="size", help = "Size of each record in bytes. Defaults to 64", default=64)
+    parser.add_option("-b", "--buffersize", action="store", type="int",
+                      dest="buffersize", help = "Size of the write buffer in bytes. Defaults to 65536", default=65536)
+    (options, args) = parser.parse_args(sys.argv)
+
+    records = [b'x' * options.size] * options.records
+    for droptype in (FileDROP, InMemoryDROP):
+        for method, write, kwargs in (('write', writeEach, {}),
+                                      ('buffered write', writeEach, {'writeBufferSize': options.buffersize}),
+                                      ('writev', writeBatches, {}),
+                                      ('write, no checksum', writeEach, {'checksumMode': 'NONE'}),
+                                      ('buffered, no checksum', writeEach, {'checksumMode': 'NONE', 'writeBufferSize': options.buffersize})):
+            rate = measure(droptype, records, write, **kwargs)
+            print("%-12s %-22s: %10.0f records/s, %7.2f MB/s" % (droptype.__name__, method, rate, rate * options.size / 1024. / 1024.))
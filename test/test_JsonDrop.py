@@ -22,10 +22,14 @@
 """
 
 """
+import io
+import json
 import os
 import unittest
 
-from dfms.json_drop import JsonDROP
+from dfms.ddap_protocol import DROPStates
+from dfms.io import COMPRESSION_CODECS
+from dfms.json_drop import JsonDROP, _Scanner
 
 DIR = '/tmp/sdp_dfms'
 FILE_TEXT = '''
@@ -94,3 +98,92 @@ class TestJsonDROP(unittest.TestCase):
 
         spectral_windows = drop['Spectral Windows']
         self.assertEqual(len(spectral_windows['Spectral Windows']), 15)
+
+    def test_lookup(self):
+        drop = JsonDROP('oid', 'uid')
+        self.assertEqual(drop.lookup(('Spectral Windows', 'Spectral Windows', 3, 4)), '1037.000')
+        self.assertEqual(drop.lookup('Observer'), 'Jacqueline H. van Gorkom')
+        self.assertRaises(KeyError, drop.lookup, 'Not there')
+        self.assertTrue(os.path.isfile(drop.indexPath))
+
+    def test_array(self):
+        items = [{u'n': i, u'name': u'\u00e5ngstr\u00f6m %d' % i, u'l': [i] * (i % 5)} for i in range(1000)]
+        items += [12345, u'a string', None, True, 1.5e-3]
+        drop = JsonDROP('oid', 'array', dirname=DIR)
+        drop.write(json.dumps(items, indent=1).encode('utf-8'))
+        drop.setCompleted()
+        try:
+            # The index is built on first access
+            self.assertFalse(os.path.isfile(drop.indexPath))
+            self.assertEqual(items, list(drop.iterMembers()))
+            self.assertEqual(items[0], drop[0])
+            self.assertTrue(os.path.isfile(drop.indexPath))
+            self.assertEqual(items[500], drop[500])
+            self.assertEqual(items[-1], drop[-1])
+            self.assertEqual(items[3][u'name'], drop.lookup((3, u'name')))
+            self.assertEqual(items[10:20], drop[10:20])
+            self.assertRaises(IndexError, drop.__getitem__, len(items))
+            self.assertRaises(TypeError, drop.__getitem__, 'key')
+
+            # A new DROP pointing to the same file reuses the index
+            mtime = os.stat(drop.indexPath).st_mtime
+            drop2 = JsonDROP('oid', 'array', dirname=DIR)
+            self.assertEqual(items[999], drop2[999])
+            self.assertEqual(mtime, os.stat(drop.indexPath).st_mtime)
+        finally:
+            drop.delete()
+        self.assertFalse(os.path.isfile(drop.indexPath))
+
+    def test_unindexable(self):
+        # Scalars are parsed in full
+        for value in (42, u'x', None):
+            drop = JsonDROP('oid', 'scalar', dirname=DIR)
+            drop.write(json.dumps(value).encode('utf-8'))
+            drop.setCompleted()
+            try:
+                self.assertEqual(DROPStates.COMPLETED, drop.status)
+                self.assertEqual(value, drop.lookup(()))
+                self.assertFalse(os.path.isfile(drop.indexPath))
+            finally:
+                drop.delete()
+
+        # Compressed content is decompressed before being parsed
+        items = [{u'n': i} for i in range(100)]
+        drop = JsonDROP('oid', 'compressed', dirname=DIR, compression=COMPRESSION_CODECS[0].name)
+        drop.write(json.dumps(items).encode('utf-8'))
+        drop.setCompleted()
+        try:
+            self.assertEqual(items, list(drop.iterMembers()))
+            self.assertEqual(items[50], drop[50])
+            self.assertEqual(50, drop.lookup((50, u'n')))
+            self.assertFalse(os.path.isfile(drop.indexPath))
+        finally:
+            drop.delete()
+
+        # DROPs completed without content only fail when accessed
+        drop = JsonDROP('oid', 'empty', dirname=DIR)
+        drop.setCompleted()
+        self.assertEqual(DROPStates.COMPLETED, drop.status)
+        self.assertRaises(EnvironmentError, drop.__getitem__, 0)
+
+    def test_scanner_chunks(self):
+        # Values of all kinds crossing chunk boundaries
+        content = {u'a': 1234567, u'b\u00e9': [1, 2, {u'c': u'd\u00e9'}], u'e': u'x' * 10,
+                   u'f': -1.25e10, u'g': False, u'h': {}, u'i': []}
+        for text in (json.dumps(content, sort_keys=True, separators=(', ', ' : ')).encode('utf-8'),
+                     json.dumps(content, ensure_ascii=False).encode('utf-8')):
+            for chunkSize in (1, 2, 3, 7, 100):
+                scanner = _Scanner(io.BytesIO(text), chunkSize=chunkSize)
+                self.assertFalse(scanner.isArray)
+                self.assertEqual(content, {k: v for k, v, _, _ in scanner})
+
+                scanner = _Scanner(io.BytesIO(text), byteOffsets=True, chunkSize=chunkSize)
+                offsets = {k: (start, end) for k, _, start, end in scanner}
+                for k, (start, end) in offsets.items():
+                    self.assertEqual(content[k], json.loads(text[start:end].decode('utf-8')))
+
+        self.assertEqual([], list(_Scanner(io.BytesIO(b'[]'), chunkSize=1)))
+        self.assertEqual([], list(_Scanner(io.BytesIO(b' { } '), chunkSize=1)))
+        self.assertEqual([1, 2], [v for _, v, _, _ in _Scanner(io.BytesIO(b'[1, 2 ]'), chunkSize=1)])
+        for text in (b'1', b'[1, 2', b'[1 2]', b'{1: 2}', b'[1,]'):
+            self.assertRaises(ValueError, lambda: list(_Scanner(io.BytesIO(text), chunkSize=1)))
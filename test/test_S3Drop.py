@@ -19,16 +19,26 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
-from unittest.case import skipIf
 """
 Test the S3 Drop
 """
 # If the profile is not present in the current user's account
 # we simply skip the test
 
+import hashlib
+import os
+import re
+import threading
+import time
 import unittest
+from unittest.case import skipIf
 
 import boto3
+from six.moves import BaseHTTPServer  # @UnresolvedImport
+from six.moves import socketserver  # @UnresolvedImport
+import six.moves.urllib.parse as urlparse  # @UnresolvedImport
+
+from dfms import droputils
 from dfms.s3_drop import S3DROP
 
 
@@ -39,6 +49,188 @@ try:
 except:
     run_tests = False
 
+class S3StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles the subset of the S3 REST API used by S3IO, keeping buckets and
+    objects in memory. Requests are not authenticated.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def _request(self):
+        url = urlparse.urlparse(self.path)
+        parts = url.path.lstrip('/').split('/', 1)
+        bucket = parts[0]
+        key = urlparse.unquote(parts[1]) if len(parts) > 1 else None
+        query = urlparse.parse_qs(url.query, keep_blank_values=True)
+        with self.server.lock:
+            self.server.requests.append((self.command, key, 'Range' in self.headers))
+        return bucket, key, query
+
+    def _reply(self, status, body=b'', headers=()):
+        self.send_response(status)
+        for header, value in headers:
+            self.send_header(header, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _notFound(self, code):
+        self._reply(404, ('<?xml version="1.0" encoding="UTF-8"?><Error><Code>%s</Code></Error>' % code).encode('ascii'))
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def _etag(self, data):
+        return '"%s"' % hashlib.md5(data).hexdigest()
+
+    def do_HEAD(self):
+        bucket, key, _ = self._request()
+        if bucket not in self.server.buckets:
+            return self._notFound('NoSuchBucket')
+        if key is None:
+            return self._reply(200)
+        data = self.server.buckets[bucket].get(key)
+        if data is None:
+            return self._notFound('NoSuchKey')
+        self._reply(200, data, [('ETag', self._etag(data))])
+
+    def do_GET(self):
+        bucket, key, _ = self._request()
+        data = self.server.buckets.get(bucket, {}).get(key)
+        if data is None:
+            return self._notFound('NoSuchKey')
+        ranges = self.headers.get('Range')
+        if not ranges:
+            return self._reply(200, data)
+        start, end = [int(x) for x in ranges[len('bytes='):].split('-')]
+        end = min(end, len(data) - 1)
+        self._reply(206, data[start:end + 1], [('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))])
+
+    def do_PUT(self):
+        bucket, key, query = self._request()
+        data = self._body()
+        with self.server.lock:
+            if 'uploadId' in query:
+                self.server.uploads[query['uploadId'][0]][int(query['partNumber'][0])] = data
+            else:
+                self.server.buckets[bucket][key] = data
+        self._reply(200, headers=[('ETag', self._etag(data))])
+
+    def do_POST(self):
+        bucket, key, query = self._request()
+        body = self._body()
+        if 'uploads' in query:
+            with self.server.lock:
+                uploadId = str(len(self.server.uploads))
+                self.server.uploads[uploadId] = {}
+            result = '<InitiateMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key><UploadId>%s</UploadId></InitiateMultipartUploadResult>' % (bucket, key, uploadId)
+        else:
+            parts = self.server.uploads.pop(query['uploadId'][0])
+            numbers = [int(n) for n in re.findall(r'<PartNumber>(\d+)</PartNumber>', body.decode('ascii'))]
+            data = b''.join(parts[n] for n in numbers)
+            self.server.buckets[bucket][key] = data
+            result = '<CompleteMultipartUploadResult><Bucket>%s</Bucket><Key>%s</Key><ETag>%s</ETag></CompleteMultipartUploadResult>' % (bucket, key, self._etag(data))
+        self._reply(200, ('<?xml version="1.0" encoding="UTF-8"?>' + result).encode('ascii'))
+
+    def do_DELETE(self):
+        _, _, query = self._request()
+        self.server.uploads.pop(query['uploadId'][0], None)
+        self._reply(204)
+
+    def log_message(self, *args):
+        pass
+
+class S3StandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class S3StandIn(object):
+    """
+    Runs an S3StandInHandler-based HTTP server with a single bucket called
+    `bucket` on a background thread
+    """
+
+    def __enter__(self):
+        self.server = S3StandInServer(('localhost', 0), S3StandInHandler)
+        self.server.buckets = {'bucket': {}}
+        self.server.uploads = {}
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        self.server.endpoint_url = 'http://localhost:%d' % (self.server.server_address[1],)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        return self.server
+
+    def __exit__(self, typ, value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+def standin_drop(server, key, bucket='bucket', **kwargs):
+    return S3DROP(key, key, bucket=bucket, key=key, endpoint_url=server.endpoint_url,
+                  aws_access_key_id='dfms', aws_secret_access_key='dfms', **kwargs)
+
+class TestS3IO(unittest.TestCase):
+
+    def test_multipart_upload_and_ranged_reads(self):
+        """
+        Data is uploaded in parts while it is written, and read back with
+        concurrent ranged GETs
+        """
+        data = os.urandom(17 * 1024**2 + 123)
+        with S3StandIn() as server:
+            a = standin_drop(server, 'a', part_size=5 * 1024**2, max_concurrency=3)
+            for i in range(0, len(data), 1024**2):
+                a.write(data[i:i + 1024**2])
+
+            # The first parts are uploaded before completion
+            for _ in range(100):
+                if any(server.uploads.values()):
+                    break
+                time.sleep(0.05)
+            self.assertTrue(any(server.uploads.values()))
+            a.setCompleted()
+            self.assertEqual(data, server.buckets['bucket']['a'])
+            self.assertEqual(len(data), a.size())
+            self.assertEqual(data, droputils.allDropContents(a))
+            ranged = [r for r in server.requests if r[0] == 'GET' and r[2]]
+            self.assertEqual(4, len(ranged))
+
+    def test_small_object(self):
+        """
+        Objects smaller than a part are uploaded and read in a single request
+        """
+        with S3StandIn() as server:
+            a = standin_drop(server, 'a')
+            a.write(b'abc')
+            a.setCompleted()
+            self.assertEqual(b'abc', droputils.allDropContents(a))
+            self.assertEqual([], [r for r in server.requests if r[0] == 'POST'])
+
+    def test_exists(self):
+        """
+        exists() costs a single HEAD, and bucket existence is cached
+        """
+        with S3StandIn() as server:
+            server.buckets['bucket']['a'] = b'abc'
+            a = standin_drop(server, 'a')
+            self.assertTrue(a.exists())
+            self.assertEqual([('HEAD', 'a', False)], server.requests)
+            self.assertFalse(standin_drop(server, 'b').exists())
+            self.assertFalse(standin_drop(server, 'a', bucket='nobucket').exists())
+
+            del server.requests[:]
+            for key in ('c', 'd'):
+                c = standin_drop(server, key)
+                c.write(b'abc')
+                c.setCompleted()
+            self.assertEqual(1, len([r for r in server.requests if r[0] == 'HEAD']))
+
+            d = standin_drop(server, 'a', bucket='nobucket')
+            self.assertRaises(Exception, d.write, b'abc')
+
 class TestS3Drop(unittest.TestCase):
 
     @skipIf(not run_tests, "No profile found to run this test")
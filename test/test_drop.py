@@ -20,23 +20,29 @@
 #    MA 02111-1307  USA
 #
 
+import array
 import contextlib
 import os, unittest
 import random
 import shutil
 import sqlite3
+import subprocess
 import tempfile
+import time
 
 import six
 from six import BytesIO
 
 from dfms import droputils
-from dfms.ddap_protocol import DROPStates, ExecutionMode, AppDROPStates
+from dfms.ddap_protocol import DROPStates, ExecutionMode, AppDROPStates, \
+    ChecksumModes
 from dfms.drop import FileDROP, AppDROP, InMemoryDROP, \
-    NullDROP, BarrierAppDROP, \
-    DirectoryContainer, ContainerDROP, InputFiredAppDROP, RDBMSDrop
+    NullDROP, BarrierAppDROP, SharedMemoryDROP, \
+    DirectoryContainer, ContainerDROP, InputFiredAppDROP, RDBMSDrop, \
+    closeDBConnections
 from dfms.droputils import DROPWaiterCtx
 from dfms.exceptions import InvalidDropException
+from dfms.io import IOForURL, OpenMode, COMPRESSION_CODECS
 
 
 try:
@@ -132,6 +138,256 @@ class TestDROP(unittest.TestCase):
         self.assertEqual(a.checksum, test_crc)
         self.assertEqual(cChecksum, test_crc)
 
+    def test_preallocation(self):
+        """
+        Test that DROPs preallocate their storage when an expectedSize is
+        given, but that only the data actually written remains
+        """
+        tempDir = tempfile.mkdtemp()
+        try:
+            for dropType, kwargs in ((FileDROP, {'dirname': tempDir}), (InMemoryDROP, {})):
+                a = dropType('a', 'a', expectedSize=ONE_MB, **kwargs)
+                a.write(b'abc')
+                a.write(b'def')
+                self.assertEqual(DROPStates.WRITING, a.status)
+                a.setCompleted()
+                self.assertEqual(b'abcdef', droputils.allDropContents(a))
+                self.assertEqual(6, a.size)
+                if dropType is FileDROP:
+                    self.assertEqual(6, os.path.getsize(a.path))
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_fileDROP_access_options(self):
+        """
+        Test that FileDROPs keep their data intact regardless of the buffering,
+        posix_fadvise hints and O_DIRECT options they are given
+        """
+        data = os.urandom(3 * ONE_MB + 1234)
+        tempDir = tempfile.mkdtemp()
+        try:
+            for kwargs in ({'bufferSize': 0}, {'bufferSize': 1024**2, 'fadvise': 'sequential,dontneed'},
+                           {'directIO': True}, {'directIO': True, 'bufferSize': 10000, 'expectedSize': len(data)},
+                           {'directIO': True, 'fadvise': ['dontneed']}):
+                a = FileDROP('a', 'a', dirname=tempDir, **kwargs)
+                for i in range(0, len(data), 100000):
+                    a.write(data[i:i + 100000])
+                if 'expectedSize' not in kwargs:
+                    a.setCompleted()
+                self.assertEqual(len(data), os.path.getsize(a.path))
+                self.assertEqual(data, droputils.allDropContents(a))
+                desc = a.open()
+                self.assertEqual(data[:3], a.read(desc, 3))
+                a.close(desc)
+                a.delete()
+
+            self.assertRaises(InvalidDropException, FileDROP, 'a', 'a', dirname=tempDir, fadvise='fast')
+            self.assertRaises(InvalidDropException, FileDROP, 'a', 'a', dirname=tempDir, directIO='maybe')
+            for value, expected in (('false', False), ('False', False), ('0', False), ('', False),
+                                    ('true', True), ('Yes', True), (1, True), (None, False)):
+                a = FileDROP('a', 'a', dirname=tempDir, directIO=value)
+                self.assertIs(expected, a.getIO()._directIO)
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_write_buffer(self):
+        """
+        Test that small writes are coalesced by DROPs with a write buffer, and
+        that writev writes many buffers at once
+        """
+
+        class Recorder(AppDROP):
+            def initialize(self, **kwargs):
+                super(Recorder, self).initialize(**kwargs)
+                self.chunks = []
+            def dataWritten(self, uid, data):
+                self.chunks.append(bytes(data))
+
+        records = [os.urandom(random.randint(1, 50)) for _ in range(1000)]
+        data = b''.join(records)
+        tempDir = tempfile.mkdtemp()
+        try:
+            ref = FileDROP('ref', 'ref', dirname=tempDir)
+            for record in records:
+                ref.write(record)
+            ref.setCompleted()
+
+            a = FileDROP('a', 'a', dirname=tempDir, writeBufferSize=4096)
+            recorder = Recorder('r', 'r')
+            a.addStreamingConsumer(recorder)
+            a.write(records[0])
+            self.assertEqual(DROPStates.WRITING, a.status)
+            self.assertIsNone(a.size)
+            for record in records[1:]:
+                a.write(bytearray(record))
+            self.assertLess(a.size, len(data))
+            self.assertLess(len(recorder.chunks), len(records) // 10)
+            a.write(os.urandom(5000))
+            self.assertEqual(len(data) + 5000, a.size)
+            a.write(b'abc')
+            a.setCompleted()
+            self.assertEqual(data, droputils.allDropContents(a)[:len(data)])
+            self.assertEqual(len(data) + 5003, a.size)
+            self.assertEqual(droputils.allDropContents(a), b''.join(recorder.chunks))
+
+            # Data is flushed after some time, or when completing the DROP
+            b = FileDROP('b', 'b', dirname=tempDir, writeBufferSize=4096, writeFlushInterval=0.05)
+            b.write(b'abc')
+            self.assertIsNone(b.size)
+            for _ in range(100):
+                if b.size:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(3, b.size)
+            b.setCompleted()
+
+            # Data that fails to be flushed in the background is kept, and the
+            # error is raised by the next operation
+            class FailingDROP(InMemoryDROP):
+                failures = 1
+                def _writev(self, buffers):
+                    if self.failures:
+                        self.failures -= 1
+                        raise IOError("Disk full")
+                    return super(FailingDROP, self)._writev(buffers)
+
+            e = FailingDROP('e', 'e', writeBufferSize=4096, writeFlushInterval=0.01)
+            e.write(b'abc')
+            for _ in range(100):
+                if not e.failures:
+                    break
+                time.sleep(0.01)
+            self.assertRaises(IOError, e.write, b'def')
+            e.write(b'def')
+            e.setCompleted()
+            self.assertEqual(b'abcdef', droputils.allDropContents(e))
+            self.assertEqual(crc32(b'abcdef', 0), e.checksum)
+
+            c = InMemoryDROP('c', 'c', writeBufferSize=1024**2, expectedSize=len(data))
+            for record in records:
+                c.write(record)
+            self.assertEqual(DROPStates.COMPLETED, c.status)
+            self.assertEqual(ref.checksum, c.checksum)
+            self.assertEqual(data, droputils.allDropContents(c))
+
+            # writev with all kinds of buffers
+            d = FileDROP('d', 'd', dirname=tempDir)
+            self.assertEqual(len(data), d.writev([records[0], bytearray(records[1]), memoryview(data)[len(records[0]) + len(records[1]):]]))
+            d.setCompleted()
+            self.assertEqual(ref.checksum, d.checksum)
+            self.assertEqual(data, droputils.allDropContents(d))
+
+            # Large buffers have their CRC chained rather than joined
+            bigData = [os.urandom(100000) for _ in range(3)]
+            f = InMemoryDROP('f', 'f')
+            f.writev(bigData)
+            f.setCompleted()
+            self.assertEqual(crc32(b''.join(bigData), 0), f.checksum)
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_compression(self):
+        """
+        Test that DROPs compress their data transparently, that compressed data
+        can be read from any offset, and that their dataURLs can be resolved
+        """
+        data = b''.join(six.b('row %d of a table\n' % (i % 1000)) for i in range(100000)) + os.urandom(1000)
+        tempDir = tempfile.mkdtemp()
+        try:
+            for compression, codec in COMPRESSION_CODECS.items():
+                for dropType, kwargs in ((FileDROP, {'dirname': tempDir}), (InMemoryDROP, {})):
+                    a = dropType('a', 'a', compression=codec.name, compressionBlockSize=65536, **kwargs)
+                    a.write(data[:1000])
+                    a.write(memoryview(data)[1000:])
+                    a.setCompleted()
+                    self.assertEqual(len(data), a.size)
+                    self.assertEqual(data, droputils.allDropContents(a))
+                    self.assertTrue(a.dataURL.startswith(codec.name + '+'))
+
+                    desc = a.open()
+                    for offset in (0, 65535, 65536, 100000, len(data) - 10, len(data)):
+                        self.assertEqual(offset, a.seek(desc, offset))
+                        self.assertEqual(data[offset:offset + 70000], a.read(desc, 70000))
+                    a.seek(desc, -10, 2)
+                    self.assertEqual(data[-10:], a.read(desc, 100))
+                    a.seek(desc, 100000)
+                    self.assertEqual(data[100000:], a.read(desc, -1))
+                    self.assertEqual(b'', a.read(desc, -1))
+                    a.close(desc)
+
+                    if dropType is FileDROP:
+                        self.assertLess(os.path.getsize(a.path), len(data) // 2)
+                    with droputils.DROPFile(a) as f:
+                        self.assertEqual(data, f.read(len(data)))
+                    a.delete()
+
+            a = InMemoryDROP('a', 'a', compression=COMPRESSION_CODECS[0].name)
+            a.setCompleted()
+            self.assertEqual(b'', droputils.allDropContents(a))
+            self.assertRaises(InvalidDropException, InMemoryDROP, 'a', 'a', compression='rar')
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_checksum_modes(self):
+        """
+        Test that DROPs calculate their checksums inline, in the background or
+        not at all, depending on their checksumMode
+        """
+
+        buf = bytearray(os.urandom(1024))
+        expected = crc32(bytes(buf) * 2 + b'abc', 0)
+        for mode in (ChecksumModes.INLINE, ChecksumModes.BACKGROUND, 'background'):
+            a = InMemoryDROP('a', 'a', checksumMode=mode)
+            a.write(buf)
+            a.write(buf)
+            a.write(b'abc')
+            buf_copy = bytes(buf)
+            buf[:] = os.urandom(1024) # writers can reuse their buffers
+            a.setCompleted()
+            buf[:] = buf_copy
+            self.assertEqual(expected, a.checksum)
+            self.assertEqual(1024 * 2 + 3, a.size)
+
+        a = InMemoryDROP('a', 'a', checksumMode=ChecksumModes.NONE)
+        a.write(b'abc')
+        a.setCompleted()
+        self.assertIsNone(a.checksum)
+        self.assertIsNone(a.checksumType)
+        self.assertEqual(3, a.size)
+
+        self.assertRaises(InvalidDropException, InMemoryDROP, 'a', 'a', checksumMode='fast')
+
+    def test_write_buffers(self):
+        """
+        Test that objects supporting the buffer protocol can be written, and
+        that streaming consumers see their contents
+        """
+
+        class Collector(AppDROP):
+            def initialize(self, **kwargs):
+                super(Collector, self).initialize(**kwargs)
+                self.chunks = []
+            def dataWritten(self, uid, data):
+                self.chunks.append(bytes(data))
+
+        a = InMemoryDROP('a', 'a')
+        b = Collector('b', 'b')
+        a.addStreamingConsumer(b)
+
+        buf = bytearray(b'abcdefgh')
+        ints = array.array('i', [1, 2, 3])
+        a.write(buf)
+        a.write(memoryview(buf)[2:4])
+        a.write(ints)
+        buf[0:1] = b'z'
+        a.setCompleted()
+
+        expected = b'abcdefgh' + b'cd' + ints.tobytes()
+        self.assertEqual(expected, droputils.allDropContents(a))
+        self.assertEqual(expected, b''.join(b.chunks))
+        self.assertEqual(len(expected), a.size)
+        self.assertEqual(crc32(expected), a.checksum)
+
     def test_simple_chain(self):
         '''
         Simple test that creates a pipeline-like chain of commands.
@@ -627,6 +883,108 @@ class TestDROP(unittest.TestCase):
             f.write(' ')
         assertFiles(True, True, tempDir=tempDir)
 
+    def test_fileDROP_buffer(self):
+        """
+        Test that FileDROPs give access to their memory-mapped contents, and
+        that these can be used to copy them into other DROPs
+        """
+
+        tempDir = tempfile.mkdtemp()
+        try:
+            data = os.urandom(10000)
+            a = FileDROP('a', 'a', dirname=tempDir)
+            a.write(data)
+            a.setCompleted()
+
+            desc = a.open(mmap=True)
+            buf = a.buffer(desc)
+            self.assertTrue(buf.readonly)
+            self.assertEqual(data, buf.tobytes())
+            self.assertEqual(1, a._refCount)
+            sliced = buf[:10]
+            a.close(desc)
+            self.assertEqual(0, a._refCount)
+            self.assertEqual(data[:10], bytes(sliced))
+
+            b = InMemoryDROP('b', 'b')
+            droputils.copyDropContents(a, b, bufsize=3000)
+            b.setCompleted()
+            self.assertEqual(data, droputils.allDropContents(a))
+            self.assertEqual(data, droputils.allDropContents(b))
+            self.assertEqual(a.checksum, b.checksum)
+
+            # Empty files cannot be mapped, but can still be read
+            c = FileDROP('c', 'c', dirname=tempDir)
+            c.write(b'')
+            c.setCompleted()
+            self.assertEqual(b'', droputils.allDropContents(c))
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_sharedMemoryDROP(self):
+        """
+        Test that the data of SharedMemoryDROPs can be read from other
+        processes through their dataURL and path
+        """
+
+        data = os.urandom(10000)
+        a = SharedMemoryDROP('a', 'a')
+        a.write(data)
+        a.setCompleted()
+        self.assertEqual(data, droputils.allDropContents(a))
+        self.assertTrue(a.dataURL.startswith('shm://'))
+
+        io = IOForURL(a.dataURL)
+        io.open(OpenMode.OPEN_READ)
+        self.assertEqual(data, io.buffer().tobytes())
+        io.close()
+
+        self.assertEqual(data, subprocess.check_output(['cat', a.path]))
+
+        self.assertTrue(a.exists())
+        a.delete()
+        self.assertFalse(a.exists())
+
+    def test_inMemoryDROP_url(self):
+        """
+        Test that the dataURL of InMemoryDROPs can be resolved within the same
+        process, and that their data is read without copying it
+        """
+
+        data = os.urandom(10000)
+        a = InMemoryDROP('a', 'a')
+        a.write(data)
+        a.setCompleted()
+        self.assertTrue(a.dataURL.startswith('mem://'))
+
+        io = IOForURL(a.dataURL)
+        io.open(OpenMode.OPEN_READ, zeroCopy=True)
+        view = io.read(100)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(data[:100], view.tobytes())
+        self.assertEqual(data[-10:], io.read(10) if io.seek(-10, 2) else None)
+        self.assertEqual(data, io.buffer().tobytes())
+        io.close()
+        self.assertEqual(data[:100], view.tobytes())
+
+        io.open(OpenMode.OPEN_READ)
+        buf = bytearray(6000)
+        self.assertEqual(6000, io.readinto(buf))
+        self.assertEqual(4000, io.readinto(buf))
+        self.assertEqual(0, io.readinto(buf))
+        self.assertEqual(data[6000:], bytes(buf[:4000]))
+        io.close()
+
+        with droputils.DROPFile(a) as f:
+            self.assertEqual(data, f.read(len(data)))
+
+        # URLs of other processes, or of deleted DROPs, can't be resolved
+        url = a.dataURL
+        other = url.replace('/%d/' % os.getpid(), '/%d/' % (os.getpid() + 1))
+        self.assertIsNone(IOForURL(other))
+        a.delete()
+        self.assertIsNone(IOForURL(url))
+
     def test_directoryContainer(self):
         """
         A small, simple test for the DirectoryContainer DROP that checks it allows
@@ -759,6 +1117,37 @@ class TestDROP(unittest.TestCase):
         self.assertEqual(DROPStates.COMPLETED, a.status)
         self.assertEqual(AppDROPStates.FINISHED, a.execStatus)
 
+    def test_compact_drops(self):
+        """
+        Checks that DROPs don't carry a __dict__ and only create their
+        relationship containers when needed
+        """
+        for dropType in (NullDROP, InMemoryDROP, FileDROP):
+            a = dropType('a', 'a')
+            self.assertFalse(hasattr(a, '__dict__'))
+            self.assertEqual([], a.consumers)
+            self.assertEqual([], a.producers)
+            self.assertEqual([], a.streamingConsumers)
+            self.assertIsNone(a._consumers)
+            self.assertIsNone(a._producers)
+            self.assertIsNone(a._streamingConsumers)
+            self.assertIsNone(a._listeners)
+
+        # Relationships are still correctly established
+        a = InMemoryDROP('a', 'a')
+        b = BarrierAppDROP('b', 'b')
+        c = InMemoryDROP('c', 'c')
+        a.addConsumer(b)
+        b.addOutput(c)
+        self.assertEqual([b], a.consumers)
+        self.assertEqual([b], c.producers)
+        self.assertIsNone(a._producers)
+        self.assertRaises(Exception, a.addStreamingConsumer, b)
+
+        with DROPWaiterCtx(self, c):
+            a.setCompleted()
+        self.assertEqual(DROPStates.COMPLETED, c.status)
+
     def test_rdbms_drop(self):
 
         dbfile = 'test_rdbms_drop.db'
@@ -780,7 +1169,28 @@ class TestDROP(unittest.TestCase):
             res = a.select(columns=("an_integer",), condition="an_integer < 1")
             self.assertEqual(1, len(res))
             self.assertEqual(0, res[0][0])
+
+            # Bulk inserts, as dictionaries or as sequences of values
+            n = a.insert_many(({'a_string': 'd%d' % i, 'an_integer': i} for i in range(2, 50)), batch_size=7)
+            self.assertEqual(48, n)
+            n = a.insert_many((('s%d' % i, i) for i in range(50, 100)), columns=('a_string', 'an_integer'))
+            self.assertEqual(50, n)
+            self.assertEqual(0, a.insert_many([]))
+
+            # A failing bulk insert doesn't insert anything
+            rows = [('x1', 1000), ('x2', 1001), ('s50', 1002)]
+            self.assertRaises(sqlite3.IntegrityError, a.insert_many, rows, columns=('a_string', 'an_integer'))  # @UndefinedVariable
+            self.assertEqual(100, len(a.select()))
+
+            # Streaming results
+            res = list(a.select_iter(columns=("an_integer",), condition="an_integer >= {}", vals=(10,), batch_size=8))
+            self.assertEqual(list(range(10, 100)), sorted(r[0] for r in res))
+            it = a.select_iter(batch_size=8)
+            next(it)
+            it.close()
+            self.assertEqual(100, len(a.select()))
         finally:
+            closeDBConnections()
             os.unlink(dbfile)
 
 if __name__ == '__main__':
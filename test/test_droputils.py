@@ -25,12 +25,13 @@ Created on 20 Jul 2015
 @author: rtobar
 '''
 
+import os
 import unittest
 
 import six
 
 from dfms import droputils
-from dfms.drop import InMemoryDROP, FileDROP, \
+from dfms.drop import AppDROP, InMemoryDROP, FileDROP, \
     BarrierAppDROP, dropdict
 from dfms.droputils import DROPFile
 
@@ -156,7 +157,54 @@ class DropUtilsTest(unittest.TestCase):
             self.assertIsNotNone(f._io)
         self.assertFalse(drop.isBeingRead())
 
-    def test_BFSWithFiltering(self):
+    def test_copyDropContents(self):
+        """
+        Copies data between DROPs of different types, which takes the
+        different copy paths of copyDropContents
+        """
+        data = os.urandom(1024**2 + 17)
+        a = FileDROP('a', 'a')
+        a.write(data)
+        a.setCompleted()
+
+        # File to file: the kernel copies the data, and the checksum is reused
+        b = FileDROP('b', 'b')
+        droputils.copyDropContents(a, b)
+        b.setCompleted()
+        self.assertEqual(len(data), b.size)
+        self.assertEqual(a.checksum, b.checksum)
+        self.assertEqual(data, droputils.allDropContents(b))
+
+        # Memory to file and file to memory go through buffers
+        c = InMemoryDROP('c', 'c')
+        droputils.copyDropContents(b, c, bufsize=1000)
+        c.setCompleted()
+        d = FileDROP('d', 'd')
+        droputils.copyDropContents(c, d)
+        d.setCompleted()
+        for drop in c, d:
+            self.assertEqual(a.checksum, drop.checksum)
+            self.assertEqual(data, droputils.allDropContents(drop))
+
+        # Targets that need to see the data are written normally
+        e = FileDROP('e', 'e')
+        e.addStreamingConsumer(AppDROP('f', 'f'))
+        droputils.copyDropContents(a, e)
+        e.setCompleted()
+        g = FileDROP('g', 'g', checksumMode='NONE')
+        g.write(data)
+        g.setCompleted()
+        h = FileDROP('h', 'h')
+        droputils.copyDropContents(g, h)
+        h.setCompleted()
+        for drop in e, h:
+            self.assertEqual(a.checksum, drop.checksum)
+            self.assertEqual(data, droputils.allDropContents(drop))
+
+        for drop in a, b, d, e, g, h:
+            drop.delete()
+
+
         """
         Checks that the BFS works if the given function does filtering on the
         downstream DROPs.
@@ -214,4 +262,30 @@ class DropUtilsTest(unittest.TestCase):
         pg_spec_dropdicts = [dropdict(dropspec) for dropspec in pg_spec]
         roots = droputils.get_roots(pg_spec_dropdicts)
         self.assertEqual(2, len(roots))
-        self.assertListEqual(['A', 'B'], sorted(roots))
\ No newline at end of file
+        self.assertListEqual(['A', 'B'], sorted(roots))
+
+    def test_get_critical_path_lengths(self):
+        """
+        Checks the remaining critical path of each DROP of the graph. By default
+        only AppDROPs add to it, but the weights can also be customized
+        """
+        a, b, c, d, e, f, g, h, i, j = self._createGraph()
+        lengths = droputils.get_critical_path_lengths(a)
+        self.assertEqual(10, len(lengths))
+        self.assertEqual(3, lengths['a'])
+        self.assertEqual(3, lengths['b'])
+        self.assertEqual(2, lengths['c'])
+        self.assertEqual(2, lengths['d'])
+        self.assertEqual(1, lengths['e'])
+        self.assertEqual(0, lengths['f'])
+        self.assertEqual(2, lengths['g'])
+        self.assertEqual(1, lengths['h'])
+        self.assertEqual(1, lengths['i'])
+        self.assertEqual(0, lengths['j'])
+
+        # Now c weights more than b and g together
+        weights = {'b': 1, 'c': 5, 'g': 1, 'h': 1}
+        lengths = droputils.get_critical_path_lengths(a, lambda drop: weights.get(drop.uid, 0))
+        self.assertEqual(6, lengths['a'])
+        self.assertEqual(3, lengths['b'])
+        self.assertEqual(6, lengths['c'])
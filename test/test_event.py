@@ -0,0 +1,91 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import pickle
+import unittest
+
+from dfms.ddap_protocol import DROPStates
+from dfms.drop import NullDROP
+from dfms.event import EventFirer, StatusEvent
+
+
+class Recorder(object):
+    def __init__(self):
+        self.events = []
+    def handleEvent(self, e):
+        self.events.append(e)
+
+class TestEvent(unittest.TestCase):
+
+    def test_dispatch(self):
+
+        firer = EventFirer()
+        specific = Recorder()
+        catchall = Recorder()
+
+        # Nobody listening yet
+        firer._fireEvent('a', x=1)
+        self.assertEqual((), firer._listenersFor('a'))
+
+        firer.subscribe(specific, 'a')
+        firer.subscribe(catchall)
+        firer._fireEvent('a', x=1)
+        firer._fireEvent('b', x=2)
+        self.assertEqual(['a'], [e.type for e in specific.events])
+        self.assertEqual(['a', 'b'], [e.type for e in catchall.events])
+        self.assertEqual(1, specific.events[0].x)
+        self.assertEqual(2, catchall.events[1].x)
+
+        # Unsubscribing updates the listeners tuple
+        firer.unsubscribe(catchall)
+        firer._fireEvent('a', x=3)
+        firer._fireEvent('b', x=4)
+        self.assertEqual(2, len(specific.events))
+        self.assertEqual(2, len(catchall.events))
+        firer.unsubscribe(specific, 'a')
+        self.assertEqual((), firer._listenersFor('a'))
+
+        # Unsubscribing unknown listeners is a no-op
+        firer.unsubscribe(specific, 'a')
+        EventFirer().unsubscribe(specific)
+
+    def test_drop_events(self):
+
+        a = NullDROP('a', 'a')
+        status = Recorder()
+        completed = Recorder()
+        a.subscribe(status, 'status')
+        a.subscribe(completed, 'dropCompleted')
+        a.setCompleted()
+
+        self.assertEqual([DROPStates.COMPLETED], [e.status for e in status.events])
+        self.assertEqual([DROPStates.COMPLETED], [e.status for e in completed.events])
+        for e in status.events + completed.events:
+            self.assertEqual('a', e.uid)
+            self.assertEqual('a', e.oid)
+            self.assertIsInstance(e, StatusEvent)
+
+    def test_pickle(self):
+        e = StatusEvent('status', 'oid', 'uid', DROPStates.COMPLETED)
+        e.session_id = 'session'
+        e2 = pickle.loads(pickle.dumps(e, 2))
+        for attr in ('type', 'oid', 'uid', 'status', 'session_id'):
+            self.assertEqual(getattr(e, attr), getattr(e2, attr))
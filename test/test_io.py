@@ -19,9 +19,119 @@
 #    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
 #    MA 02111-1307  USA
 #
+import binascii
+import os
+import resource
+import threading
 import unittest
+
+from six.moves import BaseHTTPServer  # @UnresolvedImport
+from six.moves import socketserver  # @UnresolvedImport
+import six.moves.urllib.parse as urlparse  # @UnresolvedImport
+
+from dfms import droputils, ngaslite
+from dfms.drop import NgasDROP
 from dfms.io import NullIO, OpenMode
 
+
+class NgasStandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Handles QARCHIVE requests like an NGAS server would, but only keeping
+    track of the size and CRC of the data it receives, and RETRIEVE requests
+    (including ranged ones) for the files in the server's `contents`.
+    Connections are kept alive between requests.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        fileId = urlparse.parse_qs(url.query)['file_id'][0]
+        data = self.server.contents.get(fileId)
+        if data is None:
+            self.send_error(404)
+            return
+
+        status = 200
+        start, end = 0, len(data) - 1
+        ranges = self.headers.get('Range')
+        if ranges:
+            status = 206
+            start, end = [int(x) for x in ranges[len('bytes='):].split('-')]
+            end = min(end, len(data) - 1)
+
+        self.send_response(status)
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end, len(data)))
+        self.end_headers()
+        self.wfile.write(data[start:end + 1])
+
+    def do_POST(self):
+        url = urlparse.urlparse(self.path)
+        fileId = urlparse.parse_qs(url.query)['filename'][0]
+        server = self.server
+        server.received[fileId] = 0
+        crc = 0
+
+        def chunks():
+            if self.headers.get('Transfer-Encoding') == 'chunked':
+                while True:
+                    size = int(self.rfile.readline().strip(), 16)
+                    if not size:
+                        self.rfile.readline()
+                        return
+                    yield self.rfile.read(size)
+                    self.rfile.readline()
+            else:
+                remaining = int(self.headers.get('Content-Length'))
+                while remaining:
+                    chunk = self.rfile.read(min(remaining, 65536))
+                    remaining -= len(chunk)
+                    yield chunk
+
+        for chunk in chunks():
+            crc = binascii.crc32(chunk, crc)
+            server.received[fileId] += len(chunk)
+
+        server.files[fileId] = (server.received[fileId], crc)
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class NgasStandInServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+class NgasStandIn(object):
+    """
+    Runs an NgasStandInHandler-based HTTP server on a background thread
+    """
+
+    def __enter__(self):
+        self.server = NgasStandInServer(('localhost', 0), NgasStandInHandler)
+        self.server.received = {}
+        self.server.files = {}
+        self.server.contents = {}
+        self.server.connections = 0
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        return self.server
+
+    def __exit__(self, typ, value, traceback):
+        ngaslite.closeConnections()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
 class TestIO(unittest.TestCase):
 
     def test_invalidUseCases(self):
@@ -42,4 +152,74 @@ class TestIO(unittest.TestCase):
         io.close()
 
         # It's OK to close it again
-        io.close()
\ No newline at end of file
+        io.close()
+
+    def test_ngas_streaming_archive(self):
+        """
+        Checks that data written into an NgasDROP is streamed to the NGAS
+        server as it gets written, instead of being kept in memory until the
+        DROP is completed
+        """
+
+        chunk = b'x' * 65536
+        n = 1024 # 64 MB
+        with NgasStandIn() as server:
+            a = NgasDROP('a', 'a', ngasPort=server.server_address[1], ngasTimeout=10)
+            maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            crc = 0
+            for _ in range(n):
+                a.write(chunk)
+                crc = binascii.crc32(chunk, crc)
+
+            # Most of the data should already be on the server side
+            self.assertGreater(server.received['a'], (n - 64) * len(chunk))
+            a.setCompleted()
+
+            # ru_maxrss is in KB
+            rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - maxrss
+            self.assertLess(rss_growth, n * len(chunk) // 1024 // 4)
+            self.assertEqual((n * len(chunk), crc), server.files['a'])
+
+    def test_ngas_connection_pool(self):
+        """
+        Checks that successive archivings and retrievals to and from the same
+        NGAS server reuse the same connection
+        """
+        with NgasStandIn() as server:
+            port = server.server_address[1]
+            for i in range(10):
+                a = NgasDROP('a%d' % i, 'a%d' % i, ngasPort=port, ngasTimeout=10)
+                a.write(b'abc')
+                a.setCompleted()
+                server.contents[a.uid] = b'abc'
+                self.assertEqual(b'abc', droputils.allDropContents(a))
+            self.assertEqual(1, server.connections)
+
+            # Data that was left unread, or errors, don't return the connection to the pool
+            desc = ngaslite.retrieve('localhost', 'a0', port=port, timeout=10)
+            desc.read(1)
+            desc.close()
+            self.assertRaises(Exception, ngaslite.retrieve, 'localhost', 'b', port=port, timeout=10)
+            self.assertEqual(b'abc', ngaslite.retrieve('localhost', 'a0', port=port, timeout=10).read())
+            self.assertEqual(3, server.connections)
+
+    def test_ngas_parallel_retrieve(self):
+        """
+        Checks that files are read correctly when retrieved in parallel segments
+        """
+        data = os.urandom(1024**2 + 123)
+        with NgasStandIn() as server:
+            server.contents['a'] = data
+            port = server.server_address[1]
+            for parallelism, segmentSize in ((1, 4096), (4, 4096), (4, 65536), (3, 2*1024**2)):
+                a = NgasDROP('a', 'a', ngasPort=port, ngasTimeout=10,
+                             ngasRetrieveParallelism=parallelism,
+                             ngasRetrieveSegmentSize=segmentSize)
+                a.setCompleted()
+                self.assertEqual(data, droputils.allDropContents(a, bufsize=10000))
+
+            # Up to parallelism + 1 concurrent connections are used
+            self.assertLessEqual(server.connections, 5)
+
+            # Missing files are reported as errors
+            self.assertRaises(Exception, ngaslite.retrieve, 'localhost', 'b', port=port, timeout=10, parallelism=4)
@@ -0,0 +1,166 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import os
+import tempfile
+import time
+import unittest
+
+from dfms import droputils, process_pool
+from dfms.ddap_protocol import DROPStates, AppDROPStates
+from dfms.drop import BarrierAppDROP, FileDROP, InMemoryDROP
+from dfms.droputils import DROPWaiterCtx
+
+
+class PidApp(BarrierAppDROP):
+    """
+    Writes its inputs' data into all its outputs, followed by its PID
+    """
+
+    run_in_process = True
+
+    def run(self):
+        data = b''.join([droputils.allDropContents(i) for i in self.inputs])
+        data += str(os.getpid()).encode('ascii')
+        for o in self.outputs:
+            o.write(data)
+
+class SlowPidApp(PidApp):
+    def run(self):
+        time.sleep(1)
+        super(SlowPidApp, self).run()
+
+class FailingApp(BarrierAppDROP):
+    def run(self):
+        raise Exception("Failing on purpose")
+
+class TestProcessPool(unittest.TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        process_pool.shutdown()
+
+    def _test_app(self, app, expect_other_process=True):
+
+        a = InMemoryDROP('a', 'a')
+        b = FileDROP('b', 'b', dirname=tempfile.gettempdir())
+        c = InMemoryDROP('c', 'c')
+        app.addInput(a)
+        app.addOutput(b)
+        app.addOutput(c)
+
+        with DROPWaiterCtx(self, [b, c], 30):
+            a.write(b'data')
+            a.setCompleted()
+
+        self.assertEqual(AppDROPStates.FINISHED, app.execStatus)
+        for o in (b, c):
+            data = droputils.allDropContents(o)
+            self.assertEqual(DROPStates.COMPLETED, o.status)
+            self.assertTrue(data.startswith(b'data'))
+            self.assertEqual(len(data), o.size)
+            self.assertIsNotNone(o.checksum)
+
+            pid = int(data[4:])
+            if expect_other_process:
+                self.assertNotEqual(os.getpid(), pid)
+            else:
+                self.assertEqual(os.getpid(), pid)
+
+        self.assertEqual(droputils.allDropContents(b), droputils.allDropContents(c))
+        self.assertEqual(b.checksum, c.checksum)
+        b.delete()
+
+    def test_class_default(self):
+        self._test_app(PidApp('app', 'app'))
+
+    def test_per_drop(self):
+        self._test_app(PidApp('app', 'app', run_in_process=False), expect_other_process=False)
+
+    def test_failure(self):
+        a = InMemoryDROP('a', 'a')
+        app = FailingApp('app', 'app', run_in_process=True, n_tries=2)
+        b = InMemoryDROP('b', 'b')
+        app.addInput(a)
+        app.addOutput(b)
+
+        with DROPWaiterCtx(self, b, 30):
+            a.setCompleted()
+
+        self.assertEqual(AppDROPStates.ERROR, app.execStatus)
+        self.assertEqual(DROPStates.ERROR, b.status)
+
+    def test_node_managers(self):
+        """
+        Each Node Manager has its own pool, so shutting one down doesn't affect
+        the applications running in the pool of another one
+        """
+        from dfms.manager.node_manager import NodeManager
+        dm1 = NodeManager(useDLM=False, host='localhost', events_port=5753, rpc_port=6866)
+        dm2 = NodeManager(useDLM=False, host='localhost', events_port=5754, rpc_port=6867, max_processes=1)
+        try:
+            self.assertIsNot(dm1._process_pool, dm2._process_pool)
+            self.assertEqual(1, dm2._process_pool.max_processes)
+
+            a = InMemoryDROP('a', 'a')
+            app = SlowPidApp('app', 'app')
+            app.executor = dm2._executor.for_session('s1')
+            b = InMemoryDROP('b', 'b')
+            app.addInput(a)
+            app.addOutput(b)
+
+            with DROPWaiterCtx(self, b, 30):
+                a.setCompleted()
+                while app.execStatus != AppDROPStates.RUNNING:
+                    time.sleep(0.01)
+                dm1.shutdown()
+
+            self.assertEqual(AppDROPStates.FINISHED, app.execStatus)
+            self.assertNotEqual(os.getpid(), int(droputils.allDropContents(b)))
+        finally:
+            dm2.shutdown()
+
+    def test_pool_shutdown(self):
+        """
+        Applications waiting on a pool that is shut down fail instead of
+        waiting forever
+        """
+        from dfms.manager.executor import AppExecutor
+        pool = process_pool.ProcessPool(1)
+        executor = AppExecutor(1, pool)
+        try:
+            a = InMemoryDROP('a', 'a')
+            app = SlowPidApp('app', 'app')
+            app.executor = executor.for_session('s1')
+            b = InMemoryDROP('b', 'b')
+            app.addInput(a)
+            app.addOutput(b)
+
+            with DROPWaiterCtx(self, b, 30):
+                a.setCompleted()
+                while app.execStatus != AppDROPStates.RUNNING:
+                    time.sleep(0.01)
+                pool.shutdown()
+
+            self.assertEqual(AppDROPStates.ERROR, app.execStatus)
+            self.assertEqual(DROPStates.ERROR, b.status)
+        finally:
+            executor.shutdown(5)
@@ -0,0 +1,109 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+import threading
+import unittest
+
+from dfms.ddap_protocol import DROPStates, StreamingBufferPolicies
+from dfms.drop import AppDROP, InMemoryDROP
+
+
+class SlowConsumer(AppDROP):
+    """
+    Collects the data it receives, but only once its gate has been opened
+    """
+
+    def initialize(self, **kwargs):
+        super(SlowConsumer, self).initialize(**kwargs)
+        self.chunks = []
+        self.gate = threading.Event()
+        self.finished = threading.Event()
+        self.completed_after = None
+
+    def dataWritten(self, uid, data):
+        self.gate.wait()
+        self.chunks.append(bytes(data))
+
+    def dropCompleted(self, uid, drop_state):
+        self.completed_after = len(self.chunks)
+        self.finished.set()
+
+class TestStreamingChannels(unittest.TestCase):
+
+    def _write(self, policy, n=10, hwm=3):
+        a = InMemoryDROP('a', 'a', streamingHighWaterMark=hwm, streamingBufferPolicy=policy)
+        b = SlowConsumer('b', 'b')
+        a.addStreamingConsumer(b)
+
+        # Writing happens on a different thread so we can check whether the
+        # writer is blocked by the slow consumer or not
+        chunks = [str(i).encode('ascii') for i in range(n)]
+        def write():
+            buf = bytearray(1)
+            for chunk in chunks:
+                buf[:] = chunk
+                a.write(memoryview(buf))
+            a.setCompleted()
+        t = threading.Thread(target=write)
+        t.start()
+        t.join(1)
+        writer_blocked = t.is_alive()
+
+        b.gate.set()
+        t.join(10)
+        self.assertTrue(b.finished.wait(10))
+        self.assertEqual(DROPStates.COMPLETED, a.status)
+        self.assertEqual(len(b.chunks), b.completed_after)
+        return a, b, chunks, writer_blocked
+
+    def test_block(self):
+        a, b, chunks, writer_blocked = self._write(StreamingBufferPolicies.BLOCK)
+        self.assertTrue(writer_blocked)
+        self.assertEqual(chunks, b.chunks)
+        stats = a.streamingQueueStats['b']
+        self.assertEqual(0, stats['depth'])
+        self.assertLessEqual(stats['maxDepth'], 3)
+        self.assertEqual(0, stats['dropped'])
+
+    def test_drop(self):
+        a, b, chunks, writer_blocked = self._write('drop')
+        self.assertFalse(writer_blocked)
+        stats = a.streamingQueueStats['b']
+        self.assertGreater(stats['dropped'], 0)
+        self.assertEqual(len(chunks) - stats['dropped'], len(b.chunks))
+        self.assertEqual(chunks[:len(b.chunks)], b.chunks)
+
+    def test_spill(self):
+        a, b, chunks, writer_blocked = self._write(StreamingBufferPolicies.SPILL)
+        self.assertFalse(writer_blocked)
+        self.assertEqual(chunks, b.chunks)
+        stats = a.streamingQueueStats['b']
+        self.assertGreater(stats['spilled'], 0)
+        self.assertEqual(0, stats['dropped'])
+
+    def test_synchronous_by_default(self):
+        a = InMemoryDROP('a', 'a')
+        b = SlowConsumer('b', 'b')
+        b.gate.set()
+        a.addStreamingConsumer(b)
+        a.write(b'abc')
+        self.assertEqual([b'abc'], b.chunks)
+        self.assertEqual({}, a.streamingQueueStats)
@@ -0,0 +1,95 @@
+#
+#    ICRAR - International Centre for Radio Astronomy Research
+#    (c) UWA - The University of Western Australia, 2016
+#    Copyright by UWA (in the framework of the ICRAR)
+#    All rights reserved
+#
+#    This library is free software; you can redistribute it and/or
+#    modify it under the terms of the GNU Lesser General Public
+#    License as published by the Free Software Foundation; either
+#    version 2.1 of the License, or (at your option) any later version.
+#
+#    This library is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+#    Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public
+#    License along with this library; if not, write to the Free Software
+#    Foundation, Inc., 59 Temple Place, Suite 330, Boston,
+#    MA 02111-1307  USA
+#
+"""
+A small module that measures the throughput of AbstractDROP.write, comparing
+the old path (copying each chunk into a bytes object before writing it) with
+writing buffer-protocol objects directly, which avoids any copies.
+
+Data is written into a NullDROP by default so only the overhead of the DROP
+itself is measured; a streaming consumer can be attached with -s/--streaming.
+"""
+
+import importlib
+from optparse import OptionParser
+import sys
+import time
+
+from six.moves import range  # @UnresolvedImport
+
+from dfms.drop import AppDROP
+
+
+class NullConsumer(AppDROP):
+    """
+    A streaming consumer that only accounts for the data it receives
+    """
+    def initialize(self, **kwargs):
+        super(NullConsumer, self).initialize(**kwargs)
+        self.received = 0
+    def dataWritten(self, uid, data):
+        self.received += len(data)
+
+def measure(droptype, total, chunksize, copy, streaming):
+    """
+    Writes `total` bytes in chunks of `chunksize` bytes into a new DROP of type
+    `droptype`, returning the number of bytes written per second. If `copy` is
+    True the chunks are copied into a bytes object before they are written.
+    """
+    drop = droptype('a', 'a')
+    if streaming:
+        drop.addStreamingConsumer(NullConsumer('b', 'b'))
+
+    buf = bytearray(chunksize)
+    view = memoryview(buf)
+    n = total // chunksize
+    start = time.time()
+    if copy:
+        for _ in range(n):
+            drop.write(view.tobytes())
+    else:
+        for _ in range(n):
+            drop.write(view)
+    drop.setCompleted()
+    return n * chunksize / (time.time() - start)
+
+if __name__ == '__main__':
+
+    parser = OptionParser()
+    parser.add_option("-t", "--type", action="store", type="string",
+                      dest="type", help = "DROP type to write into. Defaults to dfms.drop.NullDROP", default='dfms.drop.NullDROP')
+    parser.add_option("-T", "--total", action="store", type="int",
+                      dest="total", help = "Total number of MB to write. Defaults to 1024", default=1024)
+    parser.add_option("-c", "--chunksize", action="store", type="int",
+                      dest="chunksize", help = "Size of each chunk in bytes. Defaults to 65536", default=65536)
+    parser.add_option("-s", "--streaming", action="store_true",
+                      dest="streaming", help = "Attach a streaming consumer to the DROP", default=False)
+    (options, args) = parser.parse_args(sys.argv)
+
+    parts = options.type.split('.')
+    modname = '.'.join(parts[:-1])
+    classname = parts[-1]
+    droptype = getattr(importlib.import_module(modname), classname)
+    total = options.total * 1024 * 1024
+
+    for copy, name in ((True, 'bytes copy'), (False, 'zero-copy')):
+        rate = measure(droptype, total, options.chunksize, copy, options.streaming)
+        print("%-10s: %.2f MB/s" % (name, rate / 1024. / 1024.))